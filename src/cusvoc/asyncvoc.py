@@ -0,0 +1,247 @@
+"""
+    This module provides asyncio counterparts of Vocabulary, Tester and PhoneticsAudioManager APIs.
+
+    All writes of a vocabulary run on a single writer thread, so they are serialized exactly as sqlite requires
+    (optionally coalesced into shared transactions, see concurrency.WriteQueue), while reads run on a pool of reader threads, each having its own connection. HTTP requests are sent
+    with an asynchronous client (httpx library), so fetching Pronunciation Clips doesn't occupy any thread.
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+__all__ = ['AsyncVocabulary', 'AsyncTester', 'AsyncPhoneticsAudioManager']
+
+# --- SYSTEM LIBS ---
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Any, Iterable, List
+import asyncio
+
+# --- PACKAGE LIBS ---
+
+from vocabulary import Vocabulary, LexemeNotFoundError, Lexeme
+from language import GrammaticalCategory, UsageLabel, normalize_lexeme
+from testvoc import Tester, TestQuestion
+from audiopron import PhoneticsAudioManager, PUBLIC_DICTIONARY_API_URL, extract_audio_url
+from concurrency import WriteQueue
+
+
+
+class AsyncVocabulary():
+    """
+        Asynchronous facade of a Vocabulary. Blocking calls are delegated to a single-writer executor and a reader pool.
+    """
+
+    DEF_READER_COUNT = 4
+
+    def __init__(self, vocabulary: Vocabulary, reader_count: int = DEF_READER_COUNT, coalesce_writes: bool = False) -> None:
+        """
+            If coalesce_writes is set, writes submitted close together are committed by a single transaction,
+            which saves a commit per write when many small writes (e.g. test answers) arrive at once. Writes which create
+            or remove Pronunciation Clips are never coalesced, see write().
+        """
+
+        self.vocabulary = vocabulary
+
+        self.__writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'{vocabulary.name}-writer')
+        self.__write_queue = WriteQueue(vocabulary=vocabulary) if coalesce_writes else None
+        self.__readers = ThreadPoolExecutor(max_workers=reader_count, thread_name_prefix=f'{vocabulary.name}-reader')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+    async def write(self, fun: Callable[..., Any], *args, coalesce: bool = True, **kwargs):
+        """
+            Runs the blocking function on the writer thread of this vocabulary. Functions with side effects outside the database
+            (e.g. files of Pronunciation Clips) must pass coalesce=False, they run in their own transaction once all writes
+            submitted before are committed.
+        """
+        if self.__write_queue is not None:
+            if coalesce:
+                return await asyncio.wrap_future(self.__write_queue.submit(fun, *args, **kwargs))
+
+            # an empty write completes only once the transaction of all writes queued before it is committed
+            await asyncio.wrap_future(self.__write_queue.submit(lambda: None))
+
+        return await asyncio.get_running_loop().run_in_executor(self.__writer, partial(self.__run, fun, *args, **kwargs))
+
+    async def read(self, fun: Callable[..., Any], *args, **kwargs):
+        """
+            Runs the blocking function on one of the reader threads of this vocabulary.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.__readers, partial(self.__run, fun, *args, **kwargs))
+
+    def __run(self, fun: Callable[..., Any], *args, **kwargs):
+        with self.vocabulary.bind():
+            return fun(*args, **kwargs)
+
+
+    async def close(self):
+        """
+            Waits for all pending calls and closes connections of the writer thread.
+        """
+        # readers finish first, closing the vocabulary closes the lookup snapshot they may be reading
+        await asyncio.get_running_loop().run_in_executor(None, partial(self.__readers.shutdown, wait=True))
+
+        if self.__write_queue is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.__write_queue.close)
+
+        await asyncio.get_running_loop().run_in_executor(self.__writer, self.vocabulary.close)
+
+        self.__writer.shutdown(wait=True)
+
+
+    # --- WRITES --- #
+
+    async def create_lexical_entry(self, lexeme: str, definition: str, category: GrammaticalCategory, usage_labels: UsageLabel | Iterable[UsageLabel] = None,
+                                   collocate: str = None, sentence: str = None, for_practice: bool = False):
+        return await self.write(self.vocabulary.create_lexical_entry, lexeme=lexeme, definition=definition, category=category, usage_labels=usage_labels,
+                                collocate=collocate, sentence=sentence, for_practice=for_practice)
+
+    async def delete_lexemes(self, ids: Iterable[int] = None, filter: Vocabulary.LexemeFilter = None):
+        # removes Pronunciation Clips of the lexemes
+        return await self.write(self.vocabulary.delete_lexemes, ids=ids, filter=filter, coalesce=False)
+
+    async def delete_lexical_entries(self, ids: Iterable[int] = None, filter: Vocabulary.EntryFilter = None):
+        return await self.write(self.vocabulary.delete_lexical_entries, ids=ids, filter=filter)
+
+    async def collect_garbage(self, batch_size: int = None):
+        return await self.write(self.vocabulary.collect_garbage, batch_size=batch_size, coalesce=False)
+
+    async def rebuild_lexeme_stats(self):
+        return await self.write(self.vocabulary.rebuild_lexeme_stats)
+
+
+    # --- READS --- #
+
+    async def lexeme_count(self):
+        return await self.read(self.vocabulary.lexeme_count)
+
+    async def lexical_entry_count(self):
+        return await self.read(self.vocabulary.lexical_entry_count)
+
+    async def lexical_entries(self, filter: Vocabulary.EntryFilter = None) -> List:
+        """
+            Returns a list of Lexical Entries with their lexemes, definitions, categories and collocates already loaded.
+        """
+        return await self.read(self.vocabulary.__lexical_entry__, filter=filter, to_list=True)
+
+    async def lexemes_table(self, filter: Vocabulary.LexemeFilter = None):
+        return await self.read(self.vocabulary.__lexeme__, filter=filter)
+
+    async def entries_table(self, filter: Vocabulary.EntryFilter = None):
+        return await self.read(self.vocabulary.__lexical_entry__, filter=filter)
+
+    async def overview(self):
+        return await self.read(self.vocabulary.__lexemes__)
+
+    async def learning_curve(self, entry_id: int = None):
+        return await self.read(self.vocabulary.learning_curve, entry_id=entry_id, to_list=True)
+
+
+
+class AsyncTester():
+    """
+        Asynchronous facade of a Tester. All calls change the state of tested entries, so they run on the writer thread.
+    """
+
+    def __init__(self, vocabulary: AsyncVocabulary, tester: Tester) -> None:
+        self.vocabulary = vocabulary
+        self.tester = tester
+
+    @classmethod
+    async def create(cls, vocabulary: AsyncVocabulary):
+        return cls(vocabulary=vocabulary, tester=await vocabulary.write(Tester, vocabulary=vocabulary.vocabulary))
+
+    async def test_vocabulary(self, number_of_tests: int, for_practice: int = 0, practice_mode: str = 'number', choice_count: int = 0,
+                             reverse: bool = False) -> List[TestQuestion]:
+        return await self.vocabulary.write(self.tester.test_vocabulary, number_of_tests=number_of_tests, for_practice=for_practice, practice_mode=practice_mode,
+                                           choice_count=choice_count, reverse=reverse)
+
+    async def submit_question(self, question: TestQuestion):
+        return await self.vocabulary.write(self.tester.submit_question, question=question)
+
+    async def submit_questions(self):
+        return await self.vocabulary.write(self.tester.submit_questions)
+
+    async def flush_attempts(self):
+        return await self.vocabulary.write(self.tester.flush_attempts)
+
+    async def clear_questions(self):
+        return await self.vocabulary.write(self.tester.clear_questions)
+
+
+
+class AsyncPhoneticsAudioManager():
+    """
+        Asynchronous facade of a PhoneticsAudioManager.
+
+        Audio is downloaded with httpx asynchronous client. Playback runs on its own thread, as the mixer is global.
+    """
+
+    DEF_TIMEOUT = 10
+
+    def __init__(self, vocabulary: AsyncVocabulary, audio_manager: PhoneticsAudioManager, timeout: float = DEF_TIMEOUT) -> None:
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError("AsyncPhoneticsAudioManager requires the httpx library!")
+
+        self.vocabulary = vocabulary
+        self.audio_manager = audio_manager
+
+        self.__client = httpx.AsyncClient(timeout=timeout, follow_redirects=True)
+        self.__player = ThreadPoolExecutor(max_workers=1, thread_name_prefix='player')
+
+    async def close(self):
+        await self.__client.aclose()
+        self.__player.shutdown(wait=True)
+
+
+    async def extract_audio_content_from_api(self, lexeme: str):
+        lexeme_response = await self.__client.get(PUBLIC_DICTIONARY_API_URL + lexeme)
+        lexeme_response.raise_for_status()
+
+        pronunciation_audio_response = await self.__client.get(extract_audio_url(lexeme_data=lexeme_response.json()[0]))
+        pronunciation_audio_response.raise_for_status()
+
+        return pronunciation_audio_response.content
+
+
+    async def create_PAC(self, lexeme_identifier: int | str):
+        if isinstance(lexeme_identifier, int):
+            lexeme: Lexeme = await self.vocabulary.read(Lexeme.get_or_none, Lexeme.id == lexeme_identifier)
+        else:
+            lexeme: Lexeme = await self.vocabulary.read(Lexeme.get_or_none, Lexeme.lookup_key == normalize_lexeme(lexeme_identifier))
+
+        if lexeme is None:
+            raise LexemeNotFoundError(f"Lexeme with ID or name '{lexeme_identifier}' not found.")
+
+        if lexeme.PAC_file_path:
+            return False
+
+        audio_content = await self.extract_audio_content_from_api(lexeme=lexeme.string)
+        await self.vocabulary.write(self.audio_manager.store_PAC, lexeme=lexeme, audio_content=audio_content, coalesce=False)
+
+        return True
+
+    async def delete_PAC(self, lexeme_identifier: int | str):
+        return await self.vocabulary.write(self.audio_manager.delete_PAC, lexeme_identifier=lexeme_identifier, coalesce=False)
+
+
+    async def play_PAC(self, lexeme_identifier: str):
+        lexeme: Lexeme = await self.vocabulary.read(Lexeme.get_or_none, Lexeme.id == lexeme_identifier if lexeme_identifier.isdigit() else Lexeme.lookup_key == normalize_lexeme(lexeme_identifier))
+
+        if lexeme is None:
+            raise LexemeNotFoundError(f"Lexeme with ID or name '{lexeme_identifier}' not found.")
+
+        if not lexeme.PAC_file_path:
+            return False
+
+        await asyncio.get_running_loop().run_in_executor(self.__player, self.audio_manager.play_clip, lexeme.PAC_file_path)
+        return True
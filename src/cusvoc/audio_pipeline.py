@@ -0,0 +1,148 @@
+"""
+    This module provides normalization of Pronunciation Clips by ffmpeg.
+
+    Downloaded clips come with various bitrates, silence padding and loudness. The pipeline trims silence at both ends,
+    normalizes loudness (EBU R128) and transcodes the clip into mono low-bitrate Opus in an Ogg container, which is
+    several times smaller than a typical mp3 clip and starts playing right away. The duration of a clip is read from
+    the granule position of the last Ogg page, so no other tool (e.g. ffprobe) is needed. Bulk jobs run the pipeline in
+    a process pool (see PhoneticsAudioManager.transcode_PACs()).
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+__all__ = ['OUTPUT_EXTENSION', 'AudioTranscoder', 'default_transcoder', 'ogg_opus_duration', 'normalize_audio', 'transcode_file']
+
+# --- SYSTEM LIBS ---
+
+from typing import Tuple
+import shutil
+import struct
+import subprocess
+
+
+DEF_BITRATE = '24k' # plenty for speech in Opus
+DEF_SAMPLE_RATE = 24000
+DEF_SILENCE_THRESHOLD = '-50dB'
+DEF_LOUDNESS = -16.0 # integrated loudness target, LUFS
+DEF_TRANSCODE_TIMEOUT = 60.0 # seconds
+
+OUTPUT_EXTENSION = '.ogg'
+OPUS_GRANULE_RATE = 48000 # granule positions of Opus streams count 48 kHz samples, whatever the sample rate is
+OGG_PAGE_HEADER = struct.Struct('<4sBBqIIIB') # capture pattern, version, type, granule position, serial, sequence, checksum, segment count
+
+Transcoded = Tuple[bytes, str, float | None] # content, file extension and duration in seconds
+
+
+
+class AudioTranscoder():
+    """
+        Trims, normalizes and transcodes audio clips by an ffmpeg subprocess. Instances are sent to worker processes.
+    """
+
+    def __init__(self, bitrate: str = DEF_BITRATE, sample_rate: int = DEF_SAMPLE_RATE, silence_threshold: str = DEF_SILENCE_THRESHOLD,
+                 loudness: float = DEF_LOUDNESS, timeout: float = DEF_TRANSCODE_TIMEOUT, executable: str = 'ffmpeg') -> None:
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        self.silence_threshold = silence_threshold
+        self.loudness = loudness
+        self.timeout = timeout
+        self.executable = executable
+
+    def available(self):
+        return shutil.which(self.executable) is not None
+
+    def filters(self):
+        # silence is removed from the start, then from the reversed clip, which trims its end
+        trim = f'silenceremove=start_periods=1:start_threshold={self.silence_threshold}'
+
+        return ','.join([trim, 'areverse', trim, 'areverse', f'loudnorm=I={self.loudness}:TP=-1.5:LRA=11'])
+
+    def transcode(self, content: bytes) -> Transcoded:
+        """
+            Returns the normalized clip, its extension and duration. The input format is detected by ffmpeg.
+        """
+
+        command = [self.executable, '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0',
+                   '-af', self.filters(), '-ac', '1', '-ar', str(self.sample_rate),
+                   '-c:a', 'libopus', '-b:a', self.bitrate, '-application', 'voip', '-f', 'ogg', 'pipe:1']
+
+        try:
+            completed = subprocess.run(command, input=content, capture_output=True, timeout=self.timeout, check=True)
+        except subprocess.CalledProcessError as e:
+            raise ValueError(f"ffmpeg failed: {e.stderr.decode('utf-8', errors='replace').strip() or e.returncode}")
+        except subprocess.TimeoutExpired:
+            raise ValueError(f"ffmpeg didn't finish in {self.timeout} seconds.")
+
+        return completed.stdout, OUTPUT_EXTENSION, ogg_opus_duration(completed.stdout)
+
+
+
+def default_transcoder():
+    """
+        Returns a transcoder with default settings, or None if ffmpeg isn't installed.
+    """
+
+    transcoder = AudioTranscoder()
+    return transcoder if transcoder.available() else None
+
+
+
+def ogg_opus_duration(content: bytes):
+    """
+        Returns duration of the Opus stream in seconds, or None if the content isn't one.
+    """
+
+    pre_skip = None
+    granule_position = None
+    position = 0
+
+    # pages are walked by their segment tables, a capture pattern inside a packet can't be mistaken for a page
+    while position + OGG_PAGE_HEADER.size <= len(content):
+        capture, _, _, granule, _, _, _, segment_count = OGG_PAGE_HEADER.unpack_from(content, position)
+
+        if capture != b'OggS':
+            break
+
+        segments_start = position + OGG_PAGE_HEADER.size
+        body_start = segments_start + segment_count
+
+        if pre_skip is None and content.startswith(b'OpusHead', body_start):
+            pre_skip = struct.unpack_from('<H', content, body_start + 10)[0]
+
+        if granule >= 0:
+            granule_position = granule
+
+        position = body_start + sum(content[segments_start:body_start])
+
+    if pre_skip is None or granule_position is None:
+        return None
+
+    return max(0, granule_position - pre_skip) / OPUS_GRANULE_RATE
+
+
+
+def normalize_audio(transcoder: AudioTranscoder, content: bytes, extension: str) -> Transcoded:
+    """
+        Returns the transcoded clip, or the provided one with unknown duration if ffmpeg can't process it.
+    """
+
+    try:
+        return transcoder.transcode(content)
+    except ValueError:
+        return content, extension, None
+
+
+
+def transcode_file(transcoder: AudioTranscoder, f_path: str) -> Tuple[bytes | None, float | None, str | None]:
+    """
+        Returns the normalized content of the audio file and its duration, or the reason of a failure. Runs in worker processes.
+    """
+
+    try:
+        with open(f_path, 'rb') as audio_file:
+            content, _, duration = transcoder.transcode(audio_file.read())
+
+        return content, duration, None
+    except Exception as e:
+        return None, None, str(e)
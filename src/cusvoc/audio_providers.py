@@ -0,0 +1,271 @@
+"""
+    This module provides sources of pronunciation audio of lexemes, tried in order by a provider chain.
+
+    The Public Dictionary API has no audio for many lexemes, mostly phrases, idioms and phrasal verbs, so the chain
+    falls back to a local text-to-speech engine (espeak-ng or piper), run as a subprocess. Synthesis works offline
+    and doesn't depend on the lexeme being a dictionary word. Bulk jobs run the chain in a process pool
+    (see PhoneticsAudioManager.create_PACs()), each worker handling one lexeme at a time.
+
+    Remote providers are guarded so a slow or failing upstream doesn't stall the chain: every request has a timeout,
+    a request without response within the hedge delay is duplicated and the first response wins, and a circuit breaker
+    skips a provider which keeps failing for a cooldown period. A missing pronunciation isn't a failure of the provider.
+    Base URLs of dictionary providers are configurable, e.g. for mirrors or local stub servers.
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+__all__ = ['TTS_ENGINES', 'AudioUnavailableError', 'CircuitBreaker', 'hedged', 'DictionaryApiProvider', 'LocalTTSProvider', 'ProviderChain',
+           'default_providers', 'fetch_audio']
+
+# --- SYSTEM LIBS ---
+
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, List, Set, Tuple
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+
+TTS_ENGINES = ['espeak-ng', 'espeak', 'piper']
+DEF_TTS_TIMEOUT = 30.0 # seconds a single synthesis may take
+DEF_REQUEST_TIMEOUT = 10.0 # seconds, of each request of a remote provider
+DEF_HEDGE_DELAY = 1.5 # seconds without response after which a request is duplicated
+DEF_HEDGE_COUNT = 1 # duplicates of a single request at most
+DEF_FAILURE_THRESHOLD = 3 # consecutive failures which open the circuit
+DEF_COOLDOWN = 60.0 # seconds the circuit stays open
+HEDGE_WORKER_COUNT = 16
+
+Audio = Tuple[bytes, str] # content and file extension
+
+
+
+class AudioUnavailableError(Exception):
+    """
+        Raised when a provider has no audio of a lexeme.
+    """
+    pass
+
+
+
+class CircuitBreaker():
+    """
+        Counts consecutive failures of a provider. Once the threshold is reached the circuit opens and calls are refused
+        for the cooldown, then a single trial call is let through, whose success closes the circuit again.
+
+        Not shared between processes, each worker of a bulk job keeps its own state.
+    """
+
+    def __init__(self, failure_threshold: int = DEF_FAILURE_THRESHOLD, cooldown: float = DEF_COOLDOWN) -> None:
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failure_count = 0
+        self.opened_at: float | None = None
+
+    def allow(self):
+        if self.opened_at is None:
+            return True
+
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            # half-open, the next failure opens the circuit right away
+            self.opened_at = None
+            self.failure_count = self.failure_threshold - 1
+            return True
+
+        return False
+
+    def record_success(self):
+        self.failure_count = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failure_count += 1
+
+        if self.failure_count >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+
+_hedge_executor: Tuple[int, ThreadPoolExecutor] | None = None
+
+def _executor():
+    # created per process, threads of an executor don't survive forking into workers of a bulk job
+    global _hedge_executor
+
+    if _hedge_executor is None or _hedge_executor[0] != os.getpid():
+        _hedge_executor = (os.getpid(), ThreadPoolExecutor(max_workers=HEDGE_WORKER_COUNT, thread_name_prefix='hedge'))
+
+    return _hedge_executor[1]
+
+
+
+def hedged(call: Callable, delay: float = DEF_HEDGE_DELAY, hedge_count: int = DEF_HEDGE_COUNT):
+    """
+        Returns the result of the first successful of the call and its duplicates. A duplicate is started whenever
+        no attempt finished within the delay, until there are hedge_count of them. If all attempts fail, the last
+        error is raised. Slower attempts are left to finish (or time out) in the background.
+    """
+
+    pending: Set[Future] = {_executor().submit(call)}
+    error: BaseException | None = None
+
+    while pending:
+        done, pending = wait(pending, timeout=delay if hedge_count > 0 else None, return_when=FIRST_COMPLETED)
+
+        if not done:
+            pending.add(_executor().submit(call))
+            hedge_count -= 1
+            continue
+
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+
+            error = future.exception()
+
+    raise error
+
+
+
+class DictionaryApiProvider():
+    """
+        Recorded pronunciations of the Public Dictionary API (mp3), or of an API of the same format at base_url.
+        Requests time out after timeout seconds and are hedged after hedge_delay seconds (None disables hedging).
+    """
+
+    def __init__(self, base_url: str = None, timeout: float = DEF_REQUEST_TIMEOUT, hedge_delay: float | None = DEF_HEDGE_DELAY) -> None:
+        # audiopron imports this module
+        from audiopron import PUBLIC_DICTIONARY_API_URL
+
+        self.base_url = base_url or PUBLIC_DICTIONARY_API_URL
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+        self.name = f'dictionary API ({self.base_url})'
+
+    def fetch(self, lexeme: str) -> Audio:
+        from audiopron import extract_audio_content_from_api, LexemeNotFoundError
+
+        call = lambda: extract_audio_content_from_api(lexeme=lexeme, base_url=self.base_url, timeout=self.timeout)
+
+        try:
+            return (call() if self.hedge_delay is None else hedged(call=call, delay=self.hedge_delay)), '.mp3'
+        except LexemeNotFoundError as e:
+            raise AudioUnavailableError(str(e))
+
+
+
+class LocalTTSProvider():
+    """
+        Pronunciations synthesized by a local text-to-speech engine (wav). The voice is a voice name for espeak engines
+        and a path of the voice model for piper, which can't synthesize without one.
+    """
+
+    def __init__(self, engine: str = 'espeak-ng', voice: str = None, timeout: float = DEF_TTS_TIMEOUT) -> None:
+        if engine not in TTS_ENGINES:
+            raise ValueError(f"Unsupported text-to-speech engine '{engine}', available engines: {', '.join(TTS_ENGINES)}")
+
+        self.engine = engine
+        self.voice = voice
+        self.timeout = timeout
+        self.name = engine
+
+    def available(self):
+        return shutil.which(self.engine) is not None and (self.engine != 'piper' or self.voice is not None)
+
+    def fetch(self, lexeme: str) -> Audio:
+        if not self.available():
+            raise AudioUnavailableError(f"Text-to-speech engine '{self.engine}' is not available.")
+
+        # the text is passed by stdin, so a lexeme can't be taken for an option
+        if self.engine == 'piper':
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                f_path = os.path.join(tmp_dir, 'lexeme.wav')
+                self.__run([self.engine, '--model', self.voice, '--output_file', f_path], text=lexeme)
+
+                with open(f_path, 'rb') as audio_file:
+                    return audio_file.read(), '.wav'
+
+        voice = ['-v', self.voice] if self.voice else []
+
+        return self.__run([self.engine, '--stdout', '--stdin', *voice], text=lexeme), '.wav'
+
+    def __run(self, command: List[str], text: str):
+        try:
+            completed = subprocess.run(command, input=text.encode('utf-8'), capture_output=True, timeout=self.timeout, check=True)
+        except subprocess.CalledProcessError as e:
+            raise AudioUnavailableError(f"{self.engine} failed: {e.stderr.decode('utf-8', errors='replace').strip() or e.returncode}")
+        except subprocess.TimeoutExpired:
+            raise AudioUnavailableError(f"{self.engine} didn't finish in {self.timeout} seconds.")
+
+        return completed.stdout
+
+
+
+class ProviderChain():
+    """
+        Returns audio of the first provider, in order of priority, which has some. Each provider has its own circuit breaker,
+        a provider is skipped while its circuit is open.
+    """
+
+    def __init__(self, providers: List, failure_threshold: int = DEF_FAILURE_THRESHOLD, cooldown: float = DEF_COOLDOWN) -> None:
+        self.providers = providers
+        self.breakers = [CircuitBreaker(failure_threshold=failure_threshold, cooldown=cooldown) for _ in providers]
+
+    def fetch(self, lexeme: str) -> Audio:
+        reasons: List[str] = []
+
+        for provider, breaker in zip(self.providers, self.breakers):
+            if not breaker.allow():
+                reasons.append(f"{provider.name}: skipped after repeated failures")
+                continue
+
+            try:
+                audio = provider.fetch(lexeme)
+            except AudioUnavailableError as e:
+                # the provider works, it only has no audio of the lexeme
+                breaker.record_success()
+                reasons.append(f"{provider.name}: {e}")
+                continue
+            except Exception as e:
+                breaker.record_failure()
+                reasons.append(f"{provider.name}: {e}")
+                continue
+
+            breaker.record_success()
+            return audio
+
+        raise AudioUnavailableError(f"No pronunciation audio available for lexeme '{lexeme}' ({'; '.join(reasons) or 'no providers'}).")
+
+
+
+def default_providers(tts_engine: str = None, tts_voice: str = None, dictionary_urls: List[str] = None, timeout: float = DEF_REQUEST_TIMEOUT,
+                      hedge_delay: float | None = DEF_HEDGE_DELAY):
+    """
+        Returns the chain of dictionary APIs at the provided base URLs (the Public Dictionary API by default), in order,
+        and the provided text-to-speech engine, or the first installed espeak engine if none is provided.
+    """
+
+    if tts_engine is None:
+        tts_engine = next((engine for engine in TTS_ENGINES[:2] if shutil.which(engine)), None)
+
+    providers = [DictionaryApiProvider(base_url=base_url, timeout=timeout, hedge_delay=hedge_delay) for base_url in (dictionary_urls or [None])]
+
+    if tts_engine is not None:
+        providers.append(LocalTTSProvider(engine=tts_engine, voice=tts_voice))
+
+    return ProviderChain(providers=providers)
+
+
+
+def fetch_audio(provider, lexeme: str) -> Tuple[bytes | None, str | None, str | None]:
+    """
+        Returns the audio and its extension, or the reason why there is none. Runs in worker processes.
+    """
+
+    try:
+        content, extension = provider.fetch(lexeme)
+        return content, extension, None
+    except Exception as e:
+        return None, None, str(e)
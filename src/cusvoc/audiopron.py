@@ -1,8 +1,15 @@
 
 from requests import get
-from urllib.error import HTTPError
+from urllib.parse import quote
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Tuple
+from contextlib import contextmanager
+from peewee import fn
+from datetime import datetime
 import tempfile
-import os, sys
+import threading
+import hashlib
+import io, os, sys
 
 # here we hide the messages printed by pygame when importing
 sys.stdout = open(os.devnull, 'w')
@@ -10,10 +17,21 @@ from pygame import mixer, time
 sys.stdout = sys.__stdout__ 
 
 
-from vocabulary import Vocabulary, LexemeNotFoundError, Lexeme
+from vocabulary import Vocabulary, LexemeNotFoundError, Lexeme, bound
+from models.pronunciation_clip import PronunciationClip
+from language import normalize_lexeme
+from audio_providers import default_providers, fetch_audio
+from audio_pipeline import OUTPUT_EXTENSION, normalize_audio, transcode_file
 
 
 PUBLIC_DICTIONARY_API_URL = "https://api.dictionaryapi.dev/api/v2/entries/en/"
+DEF_API_TIMEOUT = 10.0 # seconds, of each request
+DEF_WORKER_COUNT = os.cpu_count() or 1
+DEF_PAC_BATCH_SIZE = 100 # Pronunciation Clips stored by a single transaction of create_PACs()
+PAC_STORAGES = ['files', 'blobs']
+DEF_PAC_STORAGE = 'files'
+BLOB_CHUNK_SIZE = 1 << 16 # bytes written into a clip blob at once
+PAC_GC_GRACE_PERIOD = 3600.0 # seconds, newer files may belong to lexemes whose transactions haven't committed yet
 
 
 def play_audio_file(path: str):
@@ -31,8 +49,27 @@ def play_audio_file(path: str):
 
 
 
-def play_temp_audio_file(content):
-    with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_audio_file:
+def play_audio_stream(stream, namehint: str):
+    """
+        Plays audio from a file-like object, which is read by the player as it goes.
+    """
+    try:
+        mixer.init()
+        mixer.music.load(stream, namehint)
+
+        mixer.music.play()
+
+        while mixer.music.get_busy():
+            time.Clock().tick(10)
+    finally:
+        mixer.music.stop()
+        mixer.music.unload()
+        mixer.quit()
+
+
+
+def play_temp_audio_file(content, suffix: str = ".mp3"):
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp_audio_file:
         temp_audio_file.write(content)
         temp_audio_file.flush()
 
@@ -57,36 +94,77 @@ def play_temp_audio_file(content):
 
 
 
-def extract_audio_content_from_api(lexeme: str):
-    lexeme_response = get(url=PUBLIC_DICTIONARY_API_URL + lexeme)
+def extract_audio_url(lexeme_data: dict):
+    """
+        Returns URL of the first pronunciation audio found in lexeme data returned by the Public Dictionary API.
+    """
+    for phonetic in lexeme_data.get('phonetics', []):
+        if phonetic.get('audio'):
+            return phonetic['audio']
 
-    if lexeme_response.status_code == 200:
-        lexeme_response = lexeme_response.json()
-        lexeme_response = lexeme_response[0]
+    raise LexemeNotFoundError(f"No pronunciation audio available for lexeme '{lexeme_data.get('word')}'.")
 
-        pronunciation_audio_url = lexeme_response['phonetics'][1]['audio']
-        pronunciation_audio_response = get(pronunciation_audio_url)
 
-        
-        if pronunciation_audio_response.status_code != 200:
-            raise HTTPError(url=PUBLIC_DICTIONARY_API_URL + lexeme, code=lexeme_response.status_code)
-        
-        return pronunciation_audio_response.content
 
-    else:
-        raise HTTPError(url=PUBLIC_DICTIONARY_API_URL + lexeme, code=lexeme_response.status_code)
-    
+def extract_audio_content_from_api(lexeme: str, base_url: str = PUBLIC_DICTIONARY_API_URL, timeout: float = DEF_API_TIMEOUT):
+    """
+        Returns pronunciation audio of the lexeme from the Public Dictionary API (or a compatible one at base_url).
+        Raises LexemeNotFoundError if the API has no audio of the lexeme, requests exceptions if the API fails.
+    """
+    lexeme_response = get(url=base_url + quote(lexeme, safe=''), timeout=timeout)
+
+    if lexeme_response.status_code == 404:
+        raise LexemeNotFoundError(f"Lexeme '{lexeme}' not found in the dictionary.")
+
+    lexeme_response.raise_for_status()
+
+    pronunciation_audio_url = extract_audio_url(lexeme_data=lexeme_response.json()[0])
+    pronunciation_audio_response = get(pronunciation_audio_url, timeout=timeout)
+    pronunciation_audio_response.raise_for_status()
+
+    return pronunciation_audio_response.content
+
+
+
+
+def vocabulary_PAC_dir(PAC_files_dir: str, db_file_path: str):
+    """
+        Returns the PAC directory of the vocabulary, a subdirectory of PAC_files_dir named after its database file.
+        Each vocabulary has its own one, so collecting orphaned clips of one vocabulary never touches clips of another.
+    """
+
+    db_file_path = os.path.realpath(db_file_path)
+    name = f"{os.path.splitext(os.path.basename(db_file_path))[0]}-{hashlib.sha1(db_file_path.encode('utf-8')).hexdigest()[:8]}"
+
+    return os.path.join(PAC_files_dir, name) + os.sep
 
 
 
 class PhoneticsAudioManager():
 
-    def __init__(self, vocabulary: Vocabulary, PAC_dir: str):
+    def __init__(self, vocabulary: Vocabulary, PAC_dir: str, provider = None, transcoder = None, storage: str = DEF_PAC_STORAGE):
+        """
+            The provider supplies audio of new Pronunciation Clips, by default the dictionary API followed by a local
+            text-to-speech engine if one is installed (see audio_providers module). New clips are normalized by the transcoder
+            if one is provided (see audio_pipeline module).
+
+            New clips are stored according to the storage either as files in PAC directory, or as blobs in the database,
+            which travel with it (backups, copies) and are written and played incrementally. Clips of the other storage
+            are still played and can be moved by move_PACs().
+        """
+        if storage not in PAC_STORAGES:
+            raise ValueError(f"Unsupported storage of Pronunciation Clips '{storage}', available storages: {', '.join(PAC_STORAGES)}")
+
         self.vocabulary = vocabulary
+        self.provider = provider or default_providers()
+        self.transcoder = transcoder
+        self.storage = storage
         self.__PAC_dir = PAC_dir
+        self.__clip_transactions = threading.local() # files written by the open clip transactions of each thread, see __clip_transaction()
 
 
 
+    @bound
     def create_PAC(self, lexeme_identifier: int | str):
         lexeme: Lexeme = None
 
@@ -94,7 +172,7 @@ class PhoneticsAudioManager():
         if isinstance(lexeme_identifier, int):
             lexeme = Lexeme.select().where(Lexeme.id == lexeme_identifier).get()
         elif isinstance(lexeme_identifier, str):
-            lexeme = Lexeme.select().where(Lexeme.string == lexeme_identifier).get()
+            lexeme = Lexeme.select().where(Lexeme.lookup_key == normalize_lexeme(lexeme_identifier)).get()
         
         
 
@@ -106,34 +184,213 @@ class PhoneticsAudioManager():
 
    
 
-        audio_content = extract_audio_content_from_api(lexeme=lexeme.string)
-        file_path = self.__PAC_dir + lexeme.string + '.mp3'
-        open(file=file_path, mode='x')
+        audio_content, extension = self.provider.fetch(lexeme.string)
+        self.store_PAC(lexeme=lexeme, audio_content=audio_content, extension=extension)
+        
+        return True
+
 
-        with open(file=file_path, mode='wb') as audio_file:
-            audio_file.write(audio_content)
+    def create_PACs(self, lexeme_ids: List[int] = None, worker_count: int = DEF_WORKER_COUNT, batch_size: int = DEF_PAC_BATCH_SIZE,
+                    progress: Callable[[int, int], None] = None) -> Tuple[int, Dict[str, str]]:
+        """
+            Creates Pronunciation Clips of the provided lexemes, or of all lexemes, which have none yet. Audio is fetched
+            or synthesized, and normalized, by a process pool, clips are stored in batches, each by a single transaction.
+            Returns the number of created clips and reasons of failures keyed by lexeme. Progress is reported as (done, total).
+        """
 
-        lexeme.PAC_file_path = file_path
+        with self.vocabulary.bind():
+            query = Lexeme.select(Lexeme.id, Lexeme.string).where(Lexeme.PAC_file_path.is_null())
 
-        lexeme.save()
+            if lexeme_ids is not None:
+                query = query.where(Lexeme.id.in_(lexeme_ids))
 
-        
-        return True
+            lexemes: List[Tuple[int, str]] = list(query.order_by(Lexeme.id).tuples())
+
+        created_count = 0
+        failures: Dict[str, str] = {}
+        batch: List[Tuple[int, bytes, str, float | None]] = []
+
+        def store(batch: List[Tuple[int, bytes, str, float | None]]):
+            stored_count = 0
+
+            with self.vocabulary.bind(), self.__clip_transaction():
+                for lexeme_id, audio_content, extension, duration in batch:
+                    lexeme: Lexeme = Lexeme.get_or_none(Lexeme.id == lexeme_id)
+
+                    # the lexeme might have been removed or got a clip meanwhile
+                    if lexeme is None or lexeme.PAC_file_path:
+                        continue
+
+                    try:
+                        self.store_PAC(lexeme=lexeme, audio_content=audio_content, extension=extension, duration=duration, transcode=False)
+                    except Exception as e:
+                        failures[lexeme.string] = str(e)
+                        continue
+
+                    stored_count += 1
+
+            return stored_count
+
+        if not lexemes:
+            return created_count, failures
+
+        # each worker keeps its own provider, so circuit breakers of the chain outlive single lexemes
+        with ProcessPoolExecutor(max_workers=min(worker_count, len(lexemes)), initializer=_init_fetch_worker,
+                                 initargs=(self.provider, self.transcoder)) as executor:
+            results = executor.map(_fetch_PAC, [string for _, string in lexemes])
+
+            for done_count, ((lexeme_id, string), (audio_content, extension, duration, reason)) in enumerate(zip(lexemes, results), start=1):
+                if reason is not None:
+                    failures[string] = reason
+                else:
+                    batch.append((lexeme_id, audio_content, extension, duration))
+
+                if len(batch) == batch_size:
+                    created_count += store(batch)
+                    batch = []
+
+                if progress is not None:
+                    progress(done_count, len(lexemes))
+
+        if batch:
+            created_count += store(batch)
+
+        return created_count, failures
+
+
+    def transcode_PACs(self, worker_count: int = DEF_WORKER_COUNT, batch_size: int = DEF_PAC_BATCH_SIZE,
+                       progress: Callable[[int, int], None] = None) -> Tuple[int, int, Dict[str, str]]:
+        """
+            Normalizes existing Pronunciation Clip files which weren't yet by the transcoder, in a process pool (see audio_pipeline module).
+            Clips stored in the database were normalized when stored, unless the transcoder was missing, so they are left out.
+            Lexemes are updated in batches, each by a single transaction, files of the original clips are removed once it's committed.
+            Returns the number of transcoded clips, bytes saved and reasons of failures keyed by lexeme.
+        """
+
+        if self.transcoder is None:
+            raise ValueError("Pronunciation Clips can't be transcoded without a transcoder (ffmpeg).")
+
+        with self.vocabulary.bind():
+            lexemes: List[Tuple[int, str, str]] = list(Lexeme.select(Lexeme.id, Lexeme.string, Lexeme.PAC_file_path)
+                                                             .where(Lexeme.PAC_file_path.is_null(False) & Lexeme.PAC_duration.is_null() &
+                                                                    ~Lexeme.PAC_file_path.startswith(PronunciationClip.MARKER_PREFIX))
+                                                             .order_by(Lexeme.id)
+                                                             .tuples())
+
+        transcoded_count = 0
+        saved_size = 0
+        failures: Dict[str, str] = {}
+        batch: List[Tuple[int, str, bytes, float | None]] = []
+
+        def store(batch: List[Tuple[int, str, bytes, float | None]]):
+            nonlocal transcoded_count, saved_size
+            replaced: List[Tuple[str, int]] = []
+
+            with self.vocabulary.bind(), self.__clip_transaction():
+                for lexeme_id, f_path, audio_content, duration in batch:
+                    lexeme: Lexeme = Lexeme.get_or_none(Lexeme.id == lexeme_id)
+
+                    # the clip might have been removed or replaced meanwhile
+                    if lexeme is None or lexeme.PAC_file_path != f_path:
+                        continue
+
+                    transcoded_path = os.path.splitext(f_path)[0] + OUTPUT_EXTENSION
+
+                    if transcoded_path == f_path:
+                        transcoded_path = os.path.splitext(f_path)[0] + '.opus' + OUTPUT_EXTENSION
+
+                    try:
+                        self.__write_file(file_path=transcoded_path, audio_content=audio_content)
+                    except OSError as e:
+                        failures[lexeme.string] = str(e)
+                        continue
+
+                    lexeme.PAC_file_path = transcoded_path
+                    lexeme.PAC_size = len(audio_content)
+                    lexeme.PAC_duration = duration
+                    lexeme.save()
+
+                    replaced.append((f_path, len(audio_content)))
+
+            for f_path, size in replaced:
+                try:
+                    saved_size += os.path.getsize(f_path) - size
+                    os.remove(f_path)
+                except FileNotFoundError:
+                    pass
+
+            transcoded_count += len(replaced)
+
+        if not lexemes:
+            return transcoded_count, saved_size, failures
+
+        with ProcessPoolExecutor(max_workers=min(worker_count, len(lexemes))) as executor:
+            results = executor.map(transcode_file, [self.transcoder] * len(lexemes), [f_path for _, _, f_path in lexemes])
+
+            for done_count, ((lexeme_id, string, f_path), (audio_content, duration, reason)) in enumerate(zip(lexemes, results), start=1):
+                if reason is not None:
+                    failures[string] = reason
+                else:
+                    batch.append((lexeme_id, f_path, audio_content, duration))
+
+                if len(batch) == batch_size:
+                    store(batch)
+                    batch = []
+
+                if progress is not None:
+                    progress(done_count, len(lexemes))
+
+        if batch:
+            store(batch)
+
+        return transcoded_count, saved_size, failures
+
+
+    def fetch_audio(self, lexeme: str):
+        """
+            Returns audio of the lexeme and its file extension from the provider, without storing it.
+        """
+
+        return self.provider.fetch(lexeme)
+
+
+    @bound
+    def store_PAC(self, lexeme: Lexeme, audio_content: bytes, extension: str = '.mp3', duration: float = None, transcode: bool = True):
+        """
+            Saves the audio content as a Pronunciation Clip of the lexeme. The content is normalized by the transcoder first,
+            unless transcode is False (e.g. it already was), content which ffmpeg can't process is saved as it is.
+        """
+        if transcode and self.transcoder is not None:
+            audio_content, extension, duration = normalize_audio(transcoder=self.transcoder, content=audio_content, extension=extension)
+
+        with self.__clip_transaction():
+            lexeme.PAC_file_path = self.__write_clip(name=lexeme.string, audio_content=audio_content, extension=extension)
+            lexeme.PAC_size = len(audio_content)
+            lexeme.PAC_duration = duration
+
+            lexeme.save()
     
 
+    @bound
     def delete_PAC(self, lexeme_identifier: int | str):
         
         if isinstance(lexeme_identifier, int):
             lexeme: Lexeme = Lexeme.get(Lexeme.id == lexeme_identifier)
         elif isinstance(lexeme_identifier, str):
-            lexeme: Lexeme = Lexeme.get(Lexeme.string == lexeme_identifier)
+            lexeme: Lexeme = Lexeme.get(Lexeme.lookup_key == normalize_lexeme(lexeme_identifier))
 
 
         if lexeme.PAC_file_path:
-            os.remove(path=lexeme.PAC_file_path)
-            
-            lexeme.PAC_file_path = None
-            lexeme.save()
+            PAC_file_path = lexeme.PAC_file_path
+
+            with self.vocabulary.atomic():
+                lexeme.PAC_file_path = None
+                lexeme.PAC_size = None
+                lexeme.PAC_duration = None
+                lexeme.save()
+
+                self.__remove_clip(PAC_file_path=PAC_file_path)
+
             return True
         else:
             return False
@@ -141,6 +398,7 @@ class PhoneticsAudioManager():
 
         
         
+    @bound
     def play_PAC(self, lexeme_identifier: str):
         # lexeme_attr = None
         lexeme: Lexeme = None
@@ -152,7 +410,7 @@ class PhoneticsAudioManager():
             if not lexeme:
                 raise LexemeNotFoundError(f"Lexeme with ID '{lexeme_identifier}' not found.")
         else:
-            lexeme = Lexeme.select(Lexeme.string, Lexeme.PAC_file_path).where(Lexeme.string == lexeme_identifier).get_or_none()
+            lexeme = Lexeme.select(Lexeme.string, Lexeme.PAC_file_path).where(Lexeme.lookup_key == normalize_lexeme(lexeme_identifier)).get_or_none()
 
             if not lexeme:
                 raise LexemeNotFoundError(f"Lexeme with string '{lexeme_identifier}' not found.")
@@ -160,10 +418,209 @@ class PhoneticsAudioManager():
         
 
         if lexeme.PAC_file_path:
-            play_audio_file(path=lexeme.PAC_file_path)
+            self.play_clip(PAC_file_path=lexeme.PAC_file_path)
           
             return True
         
         return False
 
-    
\ No newline at end of file
+
+    @bound
+    def play_clip(self, PAC_file_path: str):
+        """
+            Plays the Pronunciation Clip of either storage. A blob is read in place into the buffer the player reads from,
+            without a temporary file (the player reads from its own thread, which can't use the blob handle itself).
+        """
+        if PronunciationClip.id_of(PAC_file_path) is None:
+            play_audio_file(path=PAC_file_path)
+            return
+
+        audio_content, extension = self.__read_clip(PAC_file_path=PAC_file_path)
+        play_audio_stream(stream=io.BytesIO(audio_content), namehint=extension)
+
+
+    def move_PACs(self, batch_size: int = DEF_PAC_BATCH_SIZE, progress: Callable[[int, int], None] = None) -> Tuple[int, Dict[str, str]]:
+        """
+            Moves Pronunciation Clips of the other storage into the storage of this manager. Lexemes are updated in batches,
+            each by a single transaction, files of moved clips are removed once it's committed.
+            Returns the number of moved clips and reasons of failures keyed by lexeme.
+        """
+
+        in_blobs = Lexeme.PAC_file_path.startswith(PronunciationClip.MARKER_PREFIX)
+
+        with self.vocabulary.bind():
+            lexeme_ids: List[int] = [lexeme_id for lexeme_id, in Lexeme.select(Lexeme.id)
+                                                                         .where(Lexeme.PAC_file_path.is_null(False) & (~in_blobs if self.storage == 'blobs' else in_blobs))
+                                                                         .order_by(Lexeme.id)
+                                                                         .tuples()]
+        moved_count = 0
+        failures: Dict[str, str] = {}
+
+        for start in range(0, len(lexeme_ids), batch_size):
+            moved_files: List[str] = []
+
+            with self.vocabulary.bind(), self.__clip_transaction():
+                for lexeme in Lexeme.select().where(Lexeme.id.in_(lexeme_ids[start:start + batch_size])):
+                    if (PronunciationClip.id_of(lexeme.PAC_file_path) is None) != (self.storage == 'blobs'):
+                        continue # moved meanwhile
+
+                    PAC_file_path = lexeme.PAC_file_path
+
+                    try:
+                        with self.__clip_transaction():
+                            audio_content, extension = self.__read_clip(PAC_file_path=PAC_file_path)
+
+                            lexeme.PAC_file_path = self.__write_clip(name=lexeme.string, audio_content=audio_content, extension=extension)
+                            lexeme.save()
+
+                            if self.storage == 'files':
+                                self.__remove_clip(PAC_file_path=PAC_file_path)
+                    except Exception as e:
+                        failures[lexeme.string] = str(e)
+                        continue
+
+                    if self.storage == 'blobs':
+                        moved_files.append(PAC_file_path)
+
+                    moved_count += 1
+
+            for f_path in moved_files:
+                if os.path.exists(f_path):
+                    os.remove(f_path)
+
+            if progress is not None:
+                progress(min(start + batch_size, len(lexeme_ids)), len(lexeme_ids))
+
+        return moved_count, failures
+
+
+    # --- CLIP STORAGE --- #
+
+    @contextmanager
+    def __clip_transaction(self):
+        """
+            Transaction (or savepoint if nested) which removes clip files written within it if it fails, or if the transaction
+            it is nested in fails later. Otherwise a rolled back clip would leave its file behind, blocking the name for good.
+        """
+        stack: List[List[str]] = self.__clip_transactions.__dict__.setdefault('stack', [])
+        written_files: List[str] = []
+        stack.append(written_files)
+
+        try:
+            with self.vocabulary.atomic():
+                yield
+        except BaseException:
+            for file_path in written_files:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            raise
+        else:
+            if len(stack) > 1:
+                # kept only if the enclosing transaction commits too
+                stack[-2].extend(written_files)
+        finally:
+            stack.pop()
+
+    def __write_file(self, file_path: str, audio_content: bytes):
+        # the file must not exist yet, it may be the clip of another lexeme
+        with open(file=file_path, mode='xb') as audio_file:
+            stack: List[List[str]] = self.__clip_transactions.__dict__.get('stack')
+
+            if stack:
+                stack[-1].append(file_path)
+
+            audio_file.write(audio_content)
+
+    def __open_blob(self, clip_id: int, readonly: bool):
+        # the connection of the current thread, which runs the current transaction
+        return self.vocabulary.database().connection().blobopen(PronunciationClip._meta.table_name, PronunciationClip.content.column_name, clip_id, readonly=readonly)
+
+    def __write_clip(self, name: str, audio_content: bytes, extension: str):
+        """
+            Writes the clip into the storage, returns its file path or marker.
+        """
+        if self.storage == 'blobs':
+            # the blob is allocated empty and filled incrementally, the content isn't copied into a statement parameter
+            clip_id = PronunciationClip.insert(content=fn.zeroblob(len(audio_content)), extension=extension).execute()
+            content = memoryview(audio_content)
+
+            with self.__open_blob(clip_id=clip_id, readonly=False) as blob:
+                for start in range(0, len(content), BLOB_CHUNK_SIZE):
+                    blob.write(content[start:start + BLOB_CHUNK_SIZE])
+
+            return PronunciationClip.marker(clip_id)
+
+        file_path = self.__PAC_dir + name + extension
+        self.__write_file(file_path=file_path, audio_content=audio_content)
+
+        return file_path
+
+    def __read_clip(self, PAC_file_path: str) -> Tuple[bytes, str]:
+        clip_id = PronunciationClip.id_of(PAC_file_path)
+
+        if clip_id is None:
+            with open(file=PAC_file_path, mode='rb') as audio_file:
+                return audio_file.read(), os.path.splitext(PAC_file_path)[1]
+
+        extension = PronunciationClip.select(PronunciationClip.extension).where(PronunciationClip.id == clip_id).scalar()
+
+        with self.__open_blob(clip_id=clip_id, readonly=True) as blob:
+            return blob.read(), extension
+
+    def __remove_clip(self, PAC_file_path: str):
+        clip_id = PronunciationClip.id_of(PAC_file_path)
+
+        if clip_id is not None:
+            PronunciationClip.delete().where(PronunciationClip.id == clip_id).execute()
+        elif os.path.exists(PAC_file_path):
+            os.remove(path=PAC_file_path)
+
+
+
+    @bound
+    def collect_orphan_PACs(self, grace_period: float = PAC_GC_GRACE_PERIOD):
+        """
+            Removes Pronunciation Clip files in PAC directory which are not assigned to any lexeme. The directory must belong
+            to this vocabulary only (see vocabulary_PAC_dir()). Files modified within the grace period are kept, other writers
+            (e.g. an import) store the file before the lexeme referencing it is committed.
+            Returns the number of removed files.
+        """
+        # the cutoff is taken first, a file written after the query below is newer than it
+        cutoff = datetime.now().timestamp() - grace_period
+        used_paths = {os.path.realpath(lexeme.PAC_file_path) for lexeme in
+                      Lexeme.select(Lexeme.PAC_file_path).where(Lexeme.PAC_file_path.is_null(False)).iterator()}
+        removed_count = 0
+
+        with os.scandir(self.__PAC_dir) as dir_entries:
+            for dir_entry in dir_entries:
+                if dir_entry.is_file() and dir_entry.stat().st_mtime < cutoff and os.path.realpath(dir_entry.path) not in used_paths:
+                    os.remove(dir_entry.path)
+                    removed_count += 1
+
+        return removed_count
+
+
+
+_worker_provider = None
+_worker_transcoder = None
+
+def _init_fetch_worker(provider, transcoder):
+    global _worker_provider, _worker_transcoder
+
+    _worker_provider, _worker_transcoder = provider, transcoder
+
+
+
+def _fetch_PAC(lexeme: str):
+    """
+        Returns audio of a new Pronunciation Clip, normalized if the worker has a transcoder, or the reason why there is none.
+        Runs in worker processes, see _init_fetch_worker().
+    """
+
+    audio_content, extension, reason = fetch_audio(provider=_worker_provider, lexeme=lexeme)
+    duration = None
+
+    if audio_content is not None and _worker_transcoder is not None:
+        audio_content, extension, duration = normalize_audio(transcoder=_worker_transcoder, content=audio_content, extension=extension)
+
+    return audio_content, extension, duration, reason
@@ -0,0 +1,183 @@
+"""
+    This module provides online backups, rotating snapshots and compaction of vocabulary database files.
+
+    Backups are taken while the vocabulary stays in use. VACUUM INTO copies a single consistent read snapshot,
+    which in WAL mode never blocks writers, the backup API copies pages in small steps instead, each step
+    holding the read lock only briefly (though it restarts whenever another connection writes in the meantime).
+    Snapshots can be compressed by zstd (zstandard library).
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+__all__ = ['BACKUP_METHODS', 'backup', 'snapshot', 'snapshots', 'compact']
+
+# --- SYSTEM LIBS ---
+
+from datetime import datetime
+from typing import Callable
+import os
+import re
+import sqlite3
+
+# --- PACKAGE LIBS ---
+
+from vocabulary import Vocabulary
+
+
+BACKUP_METHODS = ['vacuum', 'pages']
+DEF_BACKUP_METHOD = 'vacuum'
+DEF_BACKUP_STEP = 1024 # pages copied by a single step of the backup API
+DEF_SNAPSHOT_DIR_NAME = 'snapshots' # created next to the database file
+DEF_SNAPSHOT_COUNT = 7
+DEF_VACUUM_STEP = 1024 # free pages released by a single write transaction of compact()
+
+SNAPSHOT_SUFFIX = '.db'
+COMPRESSED_SUFFIX = '.zst'
+SNAPSHOT_TIME_FORMAT = '%Y%m%d-%H%M%S-%f' # sorts chronologically by name
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+
+def backup(vocabulary: Vocabulary, f_path: str, method: str = DEF_BACKUP_METHOD, step: int = DEF_BACKUP_STEP,
+           progress: Callable[[int, int], None] = None):
+    """
+        Writes a consistent copy of the vocabulary database into the provided file, which is replaced only when complete.
+
+        Method 'vacuum' (VACUUM INTO) also defragments the copy, method 'pages' (backup API) copies the given number of pages
+        per step and reports (remaining, total) page counts to the progress callback after each of them.
+    """
+
+    if method not in BACKUP_METHODS:
+        raise ValueError(f"Unknown backup method '{method}', available methods: {', '.join(BACKUP_METHODS)}")
+
+    if os.path.abspath(f_path) == os.path.abspath(vocabulary.db_file_path):
+        raise ValueError("Backup file must differ from the database file!")
+
+    tmp_path = f_path + '.tmp'
+
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    with vocabulary.bind():
+        database = vocabulary.database()
+
+        if method == 'vacuum':
+            database.execute_sql('VACUUM INTO ?', (tmp_path,))
+        else:
+            target = sqlite3.connect(tmp_path)
+
+            try:
+                database.connection().backup(target, pages=step, progress=(lambda status, remaining, total: progress(remaining, total)) if progress else None)
+            finally:
+                target.close()
+
+    os.replace(tmp_path, f_path)
+
+    return f_path
+
+
+
+def snapshots(vocabulary: Vocabulary, directory: str = None):
+    """
+        Returns paths of existing snapshots of the vocabulary, the oldest first.
+    """
+
+    directory = directory or _default_snapshot_dir(vocabulary=vocabulary)
+
+    if not os.path.isdir(directory):
+        return []
+
+    pattern = re.compile(re.escape(_snapshot_stem(vocabulary=vocabulary)) + r'-\d{8}-\d{6}-\d{6}' + re.escape(SNAPSHOT_SUFFIX) + f'({re.escape(COMPRESSED_SUFFIX)})?$')
+
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if pattern.match(name)]
+
+
+def snapshot(vocabulary: Vocabulary, directory: str = None, keep: int = DEF_SNAPSHOT_COUNT, compress: bool = False):
+    """
+        Backs up the vocabulary into a new timestamped file of the snapshot directory and removes the oldest snapshots,
+        so at most keep of them are left. Returns path of the new snapshot.
+    """
+
+    # the new snapshot is always kept
+    if keep < 1:
+        raise ValueError(f"Number of kept snapshots must be at least 1, not {keep}.")
+
+    if compress:
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("Compressed snapshots require the zstandard library!")
+
+    directory = directory or _default_snapshot_dir(vocabulary=vocabulary)
+    os.makedirs(directory, exist_ok=True)
+
+    f_path = os.path.join(directory, f'{_snapshot_stem(vocabulary=vocabulary)}-{datetime.now().strftime(SNAPSHOT_TIME_FORMAT)}{SNAPSHOT_SUFFIX}')
+    backup(vocabulary=vocabulary, f_path=f_path)
+
+    if compress:
+        tmp_path = f_path + COMPRESSED_SUFFIX + '.tmp'
+
+        with open(f_path, 'rb') as src_file, open(tmp_path, 'wb') as dst_file:
+            zstandard.ZstdCompressor(threads=-1).copy_stream(src_file, dst_file)
+
+        os.replace(tmp_path, f_path + COMPRESSED_SUFFIX)
+        os.remove(f_path)
+        f_path += COMPRESSED_SUFFIX
+
+    for old_path in snapshots(vocabulary=vocabulary, directory=directory)[:-keep]:
+        os.remove(old_path)
+
+    return f_path
+
+
+
+def compact(vocabulary: Vocabulary, step: int = DEF_VACUUM_STEP):
+    """
+        Returns free pages of the database file to the file system, step pages per write transaction (incremental vacuum),
+        so writers of other connections get their turn in between. Returns the number of released pages.
+
+        Database files created before incremental vacuum was enabled are converted by a single full VACUUM first,
+        which rewrites the whole file and holds the write lock meanwhile.
+    """
+
+    released_count = 0
+
+    with vocabulary.bind():
+        database = vocabulary.database()
+
+        if database.execute_sql('PRAGMA auto_vacuum').fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+            free_count = database.execute_sql('PRAGMA freelist_count').fetchone()[0]
+            database.execute_sql('PRAGMA auto_vacuum = INCREMENTAL')
+            database.execute_sql('VACUUM')
+            released_count += free_count
+
+        while True:
+            free_count = database.execute_sql('PRAGMA freelist_count').fetchone()[0]
+
+            if not free_count:
+                break
+
+            with vocabulary.atomic():
+                # each page is released by a single step of the statement, so all rows must be fetched
+                database.execute_sql(f'PRAGMA incremental_vacuum({int(step)})').fetchall()
+
+            remaining_count = database.execute_sql('PRAGMA freelist_count').fetchone()[0]
+
+            if remaining_count >= free_count:
+                break
+
+            released_count += free_count - remaining_count
+
+        # the released pages leave the file only once the write-ahead log is checkpointed
+        database.execute_sql('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    return released_count
+
+
+
+def _default_snapshot_dir(vocabulary: Vocabulary):
+    return os.path.join(os.path.dirname(os.path.abspath(vocabulary.db_file_path)), DEF_SNAPSHOT_DIR_NAME)
+
+def _snapshot_stem(vocabulary: Vocabulary):
+    return os.path.splitext(vocabulary.name)[0]
@@ -0,0 +1,180 @@
+"""
+    This module provides means for several writers (imports, tests, background jobs) sharing a single vocabulary file.
+
+    Write transactions are started with BEGIN IMMEDIATE, so the write lock is taken before any work is done
+    and a transaction never fails halfway because of another writer. If the lock isn't released within the busy timeout
+    of the connection, taking it is retried after a jittered exponential backoff. Small writes of a single process
+    can be additionally coalesced into shared transactions by a WriteQueue.
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+__all__ = ['RetryPolicy', 'is_locked_error', 'write_transaction', 'WriteQueue']
+
+# --- SYSTEM LIBS ---
+
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import dataclass
+from queue import Queue, Empty
+from threading import Thread
+from typing import Callable, Any, List
+import random
+import sys
+import time
+
+# --- EXTERNAL LIBS ---
+
+from peewee import Database, OperationalError
+
+
+
+@dataclass
+class RetryPolicy():
+    """
+        How many times and how long to wait for the write lock after the busy timeout of the connection elapsed.
+    """
+
+    attempts: int = 5
+    base_delay: float = 0.05
+    max_delay: float = 2.0
+
+    def delay(self, attempt: int):
+        # full jitter, writers which failed together don't retry together
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+
+def is_locked_error(e: Exception):
+    message = str(e).lower()
+    return isinstance(e, OperationalError) and ('locked' in message or 'busy' in message)
+
+
+
+@contextmanager
+def write_transaction(database: Database, policy: RetryPolicy = None):
+    """
+        Context manager of a write transaction started with BEGIN IMMEDIATE. Nested calls create savepoints.
+        Yields the peewee transaction object, so it can be rolled back explicitly.
+    """
+
+    if database.in_transaction():
+        with database.atomic() as savepoint:
+            yield savepoint
+        return
+
+    policy = policy or RetryPolicy()
+    attempt = 0
+
+    while True:
+        transaction = database.atomic(lock_type='IMMEDIATE')
+
+        try:
+            # the atomic block itself can't be rolled back explicitly, the transaction it entered can
+            handle = transaction.__enter__()
+            break
+        except OperationalError as e:
+            if not is_locked_error(e) or attempt >= policy.attempts:
+                raise
+
+            time.sleep(policy.delay(attempt))
+            attempt += 1
+
+    try:
+        yield handle
+    except BaseException:
+        if not transaction.__exit__(*sys.exc_info()):
+            raise
+    else:
+        transaction.__exit__(None, None, None)
+
+
+
+class WriteQueue():
+    """
+        Runs submitted writes of a vocabulary on a single thread, coalescing writes submitted close together
+        into one transaction (each of them in its own savepoint, so a failing write doesn't affect the others).
+
+        Writes are only durable once their futures complete. Writes with side effects outside the database
+        (e.g. removing Pronunciation Clips) should not be submitted, as the shared transaction commits later.
+    """
+
+    DEF_MAX_BATCH_SIZE = 64
+    DEF_MAX_DELAY = 0.01
+
+    def __init__(self, vocabulary, max_batch_size: int = DEF_MAX_BATCH_SIZE, max_delay: float = DEF_MAX_DELAY) -> None:
+        self.vocabulary = vocabulary
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+
+        self.__queue: Queue = Queue()
+        self.__thread = Thread(target=self.__run, name=f'{vocabulary.name}-write-queue', daemon=True)
+        self.__thread.start()
+
+
+    def submit(self, fun: Callable[..., Any], *args, **kwargs):
+        future = Future()
+        self.__queue.put((future, fun, args, kwargs))
+        return future
+
+    def close(self):
+        """
+            Waits for all submitted writes and closes the connection of the queue thread.
+        """
+        self.__queue.put(None)
+        self.__thread.join()
+
+
+    def __run(self):
+        with self.vocabulary.bind():
+            while True:
+                batch = [self.__queue.get()]
+
+                if batch[0] is None:
+                    break
+
+                # collects writes which arrive meanwhile, without delaying a lonely write by much
+                deadline = time.monotonic() + self.max_delay
+
+                while len(batch) < self.max_batch_size and batch[-1] is not None:
+                    try:
+                        batch.append(self.__queue.get(timeout=max(0, deadline - time.monotonic())))
+                    except Empty:
+                        break
+
+                closing = batch[-1] is None
+                self.__execute(batch=batch[:-1] if closing else batch)
+
+                if closing:
+                    break
+
+            self.vocabulary.close()
+
+    def __execute(self, batch: List):
+        results = []
+
+        try:
+            with self.vocabulary.atomic():
+                for future, fun, args, kwargs in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+
+                    try:
+                        with self.vocabulary.atomic():
+                            results.append((future, fun(*args, **kwargs), None))
+                    except Exception as e:
+                        results.append((future, None, e))
+
+        except Exception as e:
+            # the shared transaction failed to commit, none of the writes took place
+            for future, *_ in batch:
+                if future.running():
+                    future.set_exception(e)
+            return
+
+        for future, result, exception in results:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
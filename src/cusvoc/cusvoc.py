@@ -7,6 +7,8 @@
     d) cusvoc.vocabulary
     e) cusvoc.audiopron
     f) cusvoc.testvoc
+    g) cusvoc.exporters
+    h) cusvoc.sync
 
     Author: fimo_IT
     Version: 0.2.0
@@ -21,14 +23,24 @@ __version__ = '0.2.0'
 
 
 
-from enum import Enum
 import argparse
 import csv
 import os
 
+from prettytable import PrettyTable
+
 from vocabulary import Vocabulary
-from audiopron import PhoneticsAudioManager
+from audiopron import PhoneticsAudioManager, PAC_STORAGES, DEF_PAC_STORAGE
 from language import GrammaticalCategory, UsageLabel
+import exporters
+import sync
+import backup
+import watch
+from audio_providers import TTS_ENGINES, DEF_REQUEST_TIMEOUT, DEF_HEDGE_DELAY
+from importers.tsv import EFF, ENTRY_FILE_FIELDS, DEF_WORKER_COUNT, import_entry_file
+from importers.pipeline import FIELD_ALIASES
+from importers.anki import import_apkg_file
+from importers.json_deck import import_json_file
 
 
 # DEF_DB_PATH = '../../data/vocabulary.db'
@@ -47,72 +59,150 @@ PUBLIC_DICTIONARY_API_URL = "https://api.dictionaryapi.dev/api/v2/entries/en/" #
 
 
 DEF_IMPORT_FILE_PATH =  os.path.join(BASE_DIR, '../../data/imports/vocabulary.tsv')
+DEF_IMPORT_DIR_PATH = os.path.dirname(DEF_IMPORT_FILE_PATH)
 DEF_EXPORT_FILE_PATH =  os.path.join(BASE_DIR, '../../data/exports/vocabulary.tsv')
 DEF_FILE_DELIMITER = '\t'
+DEF_REJECT_FILE_SUFFIX = '.rejects.tsv'
+DEF_EXPORT_FORMAT = 'tsv'
+DECK_FILE_EXTENSIONS = ['.apkg', '.json']
 
-class EFF(Enum):
-    """
-        EFF stands for Entry File Field
-    """
-    ID = 'ID'
-    lexeme = 'lexeme'
-    definition = 'definition'
-    lexical_category = 'lexical_category'
-    collocate = 'collocate'
-    sentence = 'sentence'
-    for_practice = 'for_practice'
-    pac_file = 'pac_file'
 
-ENTRY_FILE_FIELDS = [field.value for field in EFF]
 
 
 
 
+def import_entries(vocabulary: Vocabulary, audio_manager: PhoneticsAudioManager, f_path: str = DEF_IMPORT_FILE_PATH):
 
+    reject_path = args.reject_file[0] if args.reject_file else f_path + DEF_REJECT_FILE_SUFFIX
+    extension = os.path.splitext(f_path)[1].lower()
 
-def import_entries(vocabulary: Vocabulary, audio_manager: PhoneticsAudioManager, f_path: str = DEF_IMPORT_FILE_PATH):
-    from cuslog import FunctionLogger
+    # decks are streamed in batches, the default category is used for entries without one
+    if extension in DECK_FILE_EXTENSIONS:
+        field_map = dict(item.split('=', 1) for item in args.field_map) if args.field_map else None
+        import_deck = import_apkg_file if extension == '.apkg' else import_json_file
 
-    with open(file=f_path, mode='r', encoding='utf-8') as src_file:
-        
-        # Create a CSV DictReader with the correct delimiter
-        reader = csv.DictReader(src_file, delimiter=args.delimiter, fieldnames=ENTRY_FILE_FIELDS)
-        
-        next(reader)
-        
-        # Iterate over each row in the CSV
-        for row in reader:
-            # print(vocabulary.__str__())
-            # print(row)
+        summary = import_deck(vocabulary=vocabulary,
+                              f_path=f_path,
+                              reject_path=reject_path,
+                              default_category=args.lexical_category,
+                              field_map=field_map,
+                              audio_manager=audio_manager)
+    else:
+        # rows are parsed and validated by a process pool, while a single writer inserts them into database
+        summary = import_entry_file(vocabulary=vocabulary,
+                                    f_path=f_path,
+                                    delimiter=args.delimiter,
+                                    reject_path=reject_path,
+                                    audio_manager=audio_manager,
+                                    worker_count=args.workers[0] if args.workers else DEF_WORKER_COUNT)
 
-            FunctionLogger.execute(fun=lambda: vocabulary.create_lexical_entry(
-                    lexeme=row[EFF.lexeme.value],
-                    definition=row[EFF.definition.value],
-                    category=GrammaticalCategory[row[EFF.lexical_category.value]],
-                    collocate=row[EFF.collocate.value] if row[EFF.collocate.value] else None,
-                    sentence=row[EFF.sentence.value] if row[EFF.sentence.value] else None,
-                    for_practice=bool(int(row[EFF.for_practice.value])) if row[EFF.for_practice.value] else False
-                ), end_msg="Operation successful!", exception_msg="Operation unsuccessful:", exception=Exception)#, exception=Exception, exception_msg="Operation unsuccessful: ")
+    print(f"Imported entries: {summary.imported}, rejected entries: {summary.rejected}")
 
-            # try:
-            #     vocabulary.create_lexical_entry(
-            #         lexeme=row[EFF.lexeme.value],
-            #         definition=row[EFF.definition.value],
-            #         category=GrammaticalCategory[row[EFF.lexical_category.value]],
-            #         collocate=row[EFF.collocate.value] if row[EFF.collocate.value] else None,
-            #         sentence=row[EFF.sentence.value] if row[EFF.sentence.value] else None,
-            #         for_practice=bool(int(row[EFF.for_practice.value])) if row[EFF.for_practice.value] else False
-            #     )
-            # except Exception as e:
-            #     raise e
-            
-            # PAC files are automatically created if required
-            if row['pac_file'] and int(row['pac_file']):
-                audio_manager.create_PAC(lexeme_identifier=row['lexeme'])
+    if summary.rejected or summary.PAC_failed:
+        print(f"Rejected rows were written into: {reject_path}")
+
+
+
+def watch_entries(vocabulary: Vocabulary, audio_manager: PhoneticsAudioManager, directory: str = DEF_IMPORT_DIR_PATH):
+
+    def print_ingested(name: str, summary):
+        print(f"{name}: imported entries: {summary.imported}, rejected entries: {summary.rejected}", flush=True)
+
+    def print_failed(name: str, e: Exception):
+        print(f"{name}: not ingested, retrying later: {e}", flush=True)
+
+    watcher = watch.ImportWatcher(vocabulary=vocabulary, directory=directory, delimiter=args.delimiter, reject_suffix=DEF_REJECT_FILE_SUFFIX,
+                                  audio_manager=audio_manager, poll_interval=args.poll_interval)
+
+    print(f"Watching {watcher.directory} for new entries, press Ctrl+C to stop.")
+
+    try:
+        watcher.run(on_ingest=print_ingested, on_error=print_failed)
+    except KeyboardInterrupt:
+        pass
+
+
+
+def sync_entries(vocabulary: Vocabulary, import_path: str = None, export_path: str = None):
+
+    # only changed rows are written, both ways
+    if import_path is not None:
+        reject_path = args.reject_file[0] if args.reject_file else import_path + DEF_REJECT_FILE_SUFFIX
+        summary = sync.import_changes(vocabulary=vocabulary, f_path=import_path, delimiter=args.delimiter, reject_path=reject_path, key=args.sync_key)
+
+        print(f"Created entries: {summary.created}, updated entries: {summary.updated}, unchanged entries: {summary.unchanged}, rejected entries: {summary.rejected}")
+
+        if summary.rejected:
+            print(f"Rejected rows were written into: {reject_path}")
+
+    if export_path is not None:
+        print(f"Exported changed entries: {sync.export_changes(vocabulary=vocabulary, f_path=export_path, delimiter=args.delimiter)}")
+
+
+
+def warn_near_duplicates(vocabulary: Vocabulary, definition: str):
+
+    try:
+        import dedupe
+    except ImportError:
+        return
+
+    similar = dedupe.similar_definitions(vocabulary=vocabulary, definition=definition, threshold=args.threshold[0] if args.threshold else dedupe.DEF_THRESHOLD)
+
+    for similar_definition in similar:
+        print(f'Warning: definition resembles an existing one: "{similar_definition}"')
+
+
+
+def print_migration_progress(migration, done_count: int, total_count: int):
+    print(f"\rMigrating {migration.version:04d} ({migration.name}): {done_count}/{total_count} rows", end="\n" if done_count == total_count else "", flush=True)
+
+def print_backup_progress(remaining: int, total: int):
+    print(f"\rCopied pages: {total - remaining}/{total}", end="", flush=True)
+
+def print_PAC_progress(done_count: int, total_count: int):
+    print(f"\rProcessed lexemes: {done_count}/{total_count}", end="\n" if done_count == total_count else "", flush=True)
+
+
+
+def deduplicate(vocabulary: Vocabulary):
+    import dedupe
+
+    threshold = args.threshold[0] if args.threshold else dedupe.DEF_THRESHOLD
+    clusters = dedupe.duplicate_definitions(vocabulary=vocabulary, threshold=threshold)
+
+    table = PrettyTable(field_names=['Cluster', 'Definition ID', 'Definition', 'Lexical Entries'])
+    table.max_width['Definition'] = 60
+
+    for index, cluster in enumerate(clusters, 1):
+        for definition_id, definition, entry_count in cluster:
+            table.add_row([index, definition_id, definition, entry_count])
+
+    print(f"\nNear-duplicate definitions:\n{table}\n")
+
+    sentence_clusters = dedupe.duplicate_sentences(vocabulary=vocabulary, threshold=threshold)
 
+    if sentence_clusters:
+        print("Lexical Entries with near-duplicate sentences: " + ", ".join(str(cluster) for cluster in sentence_clusters) + "\n")
 
+    if args.merge and clusters:
+        repointed_count, folded_count = dedupe.merge_definitions(vocabulary=vocabulary, clusters=[[definition_id for definition_id, *_ in cluster] for cluster in clusters])
+        print(f"Repointed entries: {repointed_count}, folded duplicate entries: {folded_count}")
 
-def export_entries(vocabulary: Vocabulary, f_path: str = DEF_EXPORT_FILE_PATH):
+
+
+def positive_int(value: str):
+    # argparse type of counts which must be at least 1
+    number = int(value)
+
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {value}")
+
+    return number
+
+
+
+def export_entries(vocabulary: Vocabulary, f_path: str = DEF_EXPORT_FILE_PATH, f_format: str = DEF_EXPORT_FORMAT):
 
     # file contains some content
     if os.path.exists(f_path) and os.stat(f_path).st_size:
@@ -125,23 +215,29 @@ def export_entries(vocabulary: Vocabulary, f_path: str = DEF_EXPORT_FILE_PATH):
                 break
             elif response == 'n':
                 return
+
+    if f_format != DEF_EXPORT_FORMAT:
+        getattr(exporters, 'export_' + f_format)(vocabulary=vocabulary, f_path=f_path)
+        return
         
     with open(file=f_path, mode='w', encoding='utf-8', newline="") as src_file:
         writer = csv.DictWriter(f=src_file, fieldnames=ENTRY_FILE_FIELDS, delimiter=args.delimiter)
         writer.writeheader()
         entries = vocabulary.__lexical_entry__(filter=None, to_list=True)
 
-        for index, entry in enumerate(entries, start=1):
-            writer.writerow({
-                EFF.ID.value : entry.id,
-                EFF.lexeme.value : entry.lexeme.string,
-                EFF.definition.value : entry.definition.definition,
-                EFF.lexical_category.value : entry.lexical_category.category,
-                EFF.collocate.value : entry.collocate.collocate if entry.collocate else "",
-                EFF.sentence.value : entry.sentence,
-                EFF.for_practice.value : int(entry.for_practice),
-                EFF.pac_file.value : 1 if entry.lexeme.PAC_file_path else 0
-            })
+        # related models are fetched lazily, so they must be read from the database of this vocabulary
+        with vocabulary.bind():
+            for index, entry in enumerate(entries, start=1):
+                writer.writerow({
+                    EFF.ID.value : entry.id,
+                    EFF.lexeme.value : entry.lexeme.string,
+                    EFF.definition.value : entry.definition.definition,
+                    EFF.lexical_category.value : entry.lexical_category.category,
+                    EFF.collocate.value : entry.collocate.collocate if entry.collocate else "",
+                    EFF.sentence.value : entry.sentence,
+                    EFF.for_practice.value : int(entry.for_practice),
+                    EFF.pac_file.value : 1 if entry.lexeme.PAC_file_path else 0
+                })
             
 
         
@@ -166,7 +262,8 @@ parser = argparse.ArgumentParser(
         USAGE EXAMPLES
             - Filter by column: --where "word LIKE 'apple%'
             - Add a new entry: -a -le apple -d "A fruit" -c noun
-            - Remove an entry: -r -le 42
+            - Remove entries: -e 42 43 -r
+            - Remove entries matching a filter: -e -r --where "test_count == 0"
 
         """
         )
@@ -178,7 +275,21 @@ parser = argparse.ArgumentParser(
 
 ## General Commands
 parser.add_argument('-db', '--database', metavar='PATH', nargs=1, default=DEF_DB_PATH, help="Sets the provided value as a relative path of the source database file.")
+parser.add_argument('--busy-timeout', metavar='SECONDS', type=float, default=Vocabulary.DEF_BUSY_TIMEOUT, help="Sets how long to wait for other processes writing into the same database file (e.g. an import running in another terminal).")
 parser.add_argument('-v', '--vocabulary', action='store_true', help="Prints vocabulary metadata to the console.")
+parser.add_argument('--gc', action='store_true', help="Removes definitions, collocates, labels and Pronunciation Clips no longer used by any entry or lexeme.")
+parser.add_argument('--dedupe', action='store_true', help="Prints clusters of near-duplicate definitions and sentences and updates the index of definitions used to warn about them when creating entries. Requires numpy library.")
+parser.add_argument('--merge', action='store_true', help="With --dedupe, repoints entries of each definition cluster to its most used definition.")
+parser.add_argument('--threshold', nargs=1, metavar='T', type=float, help="Minimum estimated similarity (0-1) of near-duplicate texts, default is 0.7.")
+parser.add_argument('--backup', metavar='PATH', nargs=1, help="Writes a consistent copy of the database into the provided file, while the vocabulary may stay in use.")
+parser.add_argument('--backup-method', choices=backup.BACKUP_METHODS, default=backup.DEF_BACKUP_METHOD, help="Copies the database either by VACUUM INTO (default, also defragments the copy) or page by page via the backup API.")
+parser.add_argument('--snapshot', metavar='DIR', nargs="*", help=f"Backs up the database into a new timestamped file of the provided directory, default is '{backup.DEF_SNAPSHOT_DIR_NAME}' next to the database file.")
+parser.add_argument('--keep', metavar='N', nargs=1, type=positive_int, help=f"With --snapshot, number of the newest snapshots kept, default is {backup.DEF_SNAPSHOT_COUNT}.")
+parser.add_argument('--zstd', action='store_true', help="With --snapshot, compresses the snapshot. Requires zstandard library.")
+parser.add_argument('--compact', action='store_true', help="Returns free pages of the database file to the file system in small steps (incremental vacuum).")
+parser.add_argument('--mmap-snapshot', action='store_true', help="Builds a compact read-only lookup snapshot next to the database file, used by read-heavy paths (e.g. multiple-choice tests) until the vocabulary changes.")
+parser.add_argument('--rebuild-stats', action='store_true', help="Recomputes the per-lexeme statistics table from all lexical entries and daily attempt statistics from the answer history.")
+parser.add_argument('--learning-curve', metavar='ID', nargs="*", help="Prints number of answers and average match rate per day, of the whole vocabulary or of the entry with provided ID.")
 
 
 
@@ -198,9 +309,17 @@ parser.add_argument('-s', '--sentence', nargs="*", help="Uses the value as a sen
 
 
 ### alternative 2: adding definition(s) via file
-parser.add_argument('--import-file', metavar='PATH', nargs="*", help="Loads entries from a source file (formats .tsv, .csv etc.). If no argument is provided, default path is used.")
+parser.add_argument('--import-file', metavar='PATH', nargs="*", help="Loads entries from a source file (formats .tsv, .csv etc., Anki decks .apkg and JSON arrays .json). If no argument is provided, default path is used.")
+parser.add_argument('--watch', metavar='DIR', nargs="?", const=DEF_IMPORT_DIR_PATH, help="Keeps importing new rows of Entry Files created or appended in the directory (data/imports by default) until interrupted. Rows already imported are never read again.")
+parser.add_argument('--poll-interval', metavar='SECONDS', type=float, default=watch.DEF_POLL_INTERVAL, help="Interval of scans of the watched directory where inotify isn't available.")
+parser.add_argument('--reject-file', metavar='PATH', nargs=1, help=f"Rows which couldn't be imported are written into this file, default is the imported file path with '{DEF_REJECT_FILE_SUFFIX}' appended.")
+parser.add_argument('--field-map', metavar='FIELD=NAME', nargs="+", help=f"Maps entry fields ({', '.join(FIELD_ALIASES)}) to field names of an imported .apkg or .json deck, whose fields are otherwise recognized by common names.")
+parser.add_argument('--workers', metavar='N', nargs=1, type=int, help="Number of processes parsing the imported file or creating Pronunciation Clips (--create-PACs), default is the number of CPUs.")
 parser.add_argument('--export-file', metavar='PATH', nargs="*")
+parser.add_argument('--export-format', choices=[DEF_EXPORT_FORMAT, *exporters.EXPORT_FORMATS], default=DEF_EXPORT_FORMAT, help="Format of the exported file. Formats other than tsv also include entry statistics and usage labels, arrow and parquet require pyarrow library.")
 
+parser.add_argument('--sync', action='store_true', help="With --import-file, only new or changed entries are written; with --export-file, only entries changed since the previous export into the same file are exported.")
+parser.add_argument('--sync-key', choices=['natural', 'id'], default='natural', help="Matches imported rows with local entries either by lexeme and definition (default) or by the ID column.")
 parser.add_argument('--delimiter', nargs=1, metavar='DELIMITER', default=DEF_FILE_DELIMITER, help=f"Uses the value as a delimiter for a file, default value is a tab.")
 
 ### filtering lexical entries
@@ -212,6 +331,16 @@ parser.add_argument('--where', nargs=1, metavar='"<COL> <OPERATOR> <VAL>"', requ
 ## Lexeme Command Set
 
 parser.add_argument('-l', '--lexeme', nargs="*", help="If no arguments are provided, '--where' is expected. If provided, args are joined and lexeme is searched by id if the args are digit, otherwise by string.")
+parser.add_argument('--create-PACs', action='store_true', help="Creates Pronunciation Clips of all lexemes without one, audio is fetched or synthesized (and normalized if ffmpeg is installed) by '--workers' processes.")
+parser.add_argument('--transcode-PACs', action='store_true', help="Trims silence, normalizes loudness and transcodes existing Pronunciation Clips into Opus, using '--workers' processes. Requires ffmpeg.")
+parser.add_argument('--raw-audio', action='store_true', help="Stores new Pronunciation Clips as they were received, without normalizing them by ffmpeg.")
+parser.add_argument('--PAC-storage', choices=PAC_STORAGES, default=DEF_PAC_STORAGE, help="Stores new Pronunciation Clips either as files (default) or as blobs in the database file, which are carried by its backups and copies.")
+parser.add_argument('--move-PACs', action='store_true', help="Moves Pronunciation Clips of the other storage into the one selected by '--PAC-storage'.")
+parser.add_argument('--tts-engine', choices=TTS_ENGINES, help="Local text-to-speech engine used for lexemes without audio in the dictionary, default is espeak-ng or espeak if installed.")
+parser.add_argument('--tts-voice', metavar='VOICE', help="Voice of the text-to-speech engine, a voice name for espeak and a path of a voice model for piper (required).")
+parser.add_argument('--dictionary-url', nargs='+', metavar='URL', help="Base URLs of dictionary APIs (of the Public Dictionary API format) tried in order, the lexeme is appended to them. Default is the Public Dictionary API.")
+parser.add_argument('--provider-timeout', metavar='SECONDS', type=float, default=DEF_REQUEST_TIMEOUT, help="Timeout of each request of a dictionary API.")
+parser.add_argument('--hedge-delay', metavar='SECONDS', type=float, default=DEF_HEDGE_DELAY, help="A request of a dictionary API without response within this delay is sent again and the first response is used, 0 disables it.")
 parser.add_argument('-p', '--pronunciation', action='store_true', help="Use with '-l'. If used along with -a, stores the audio locally, otherwise only plays from API.")
 # parser.add_argument('-api', action='store_true')
 
@@ -225,6 +354,8 @@ parser.add_argument('-r', '--remove', action='store_true', help="Flag indicates
 # Testing Command Set
 
 parser.add_argument("-t", '--test', nargs=1, metavar='N', type=int, help="Expects an integer representing the number of tested entries in a single test.")
+parser.add_argument('--choices', nargs=1, metavar='K', type=int, help="Turns the test into a multiple-choice one, each question offers K similar wrong lexemes. Requires numpy library.")
+parser.add_argument('--reverse', action='store_true', help="Asks for definitions of lexemes instead of lexemes of definitions. Requires numpy library.")
 parser.add_argument('--practice', nargs="*", metavar=' | N | N%', help="Integer represents number of allocated for-practice entries, if '%%' is appended, this represents proportion.")
 
 
@@ -235,6 +366,14 @@ args = parser.parse_args()
 
 if args.delimiter is None:
     args.delimiter = DEF_FILE_DELIMITER
+elif isinstance(args.delimiter, list):
+    args.delimiter = args.delimiter[0]
+
+if isinstance(args.database, list):
+    args.database = args.database[0]
+
+if args.field_map and any(item.split('=', 1)[0] not in FIELD_ALIASES or '=' not in item for item in args.field_map):
+    parser.error(f"'--field-map' expects FIELD=NAME pairs, where FIELD is one of: {', '.join(FIELD_ALIASES)}.")
 
 
 # Custom validation logic
@@ -275,7 +414,9 @@ def main():
     from vocabulary import Vocabulary, Lexeme
 
     from testvoc import Tester, TestQuestion
-    from audiopron import PhoneticsAudioManager, extract_audio_content_from_api, play_temp_audio_file
+    from audiopron import PhoneticsAudioManager, play_temp_audio_file, vocabulary_PAC_dir
+    from audio_providers import default_providers
+    from audio_pipeline import default_transcoder
     from cuslog import FunctionLogger
 
 
@@ -315,11 +456,19 @@ def main():
 
     
 
-    vocabulary = Vocabulary(db_file_path=args.database)
+    vocabulary = Vocabulary(db_file_path=args.database, busy_timeout=args.busy_timeout, migration_progress=print_migration_progress)
     database = vocabulary.database()
 
+    # clips of each vocabulary are kept apart, clips created before stay where their lexemes point to
+    PAC_dir = vocabulary_PAC_dir(PAC_files_dir=app_dir.__str__() + '/audio/PAC_files/', db_file_path=args.database)
+    os.makedirs(name=PAC_dir, exist_ok=True)
+
     tester = Tester(vocabulary=vocabulary)
-    audio_manager = PhoneticsAudioManager(vocabulary=vocabulary, PAC_dir=app_dir.__str__() + '/audio/PAC_files/')
+    audio_manager = PhoneticsAudioManager(vocabulary=vocabulary, PAC_dir=PAC_dir,
+                                          provider=default_providers(tts_engine=args.tts_engine, tts_voice=args.tts_voice, dictionary_urls=args.dictionary_url,
+                                                                     timeout=args.provider_timeout, hedge_delay=args.hedge_delay or None),
+                                          transcoder=None if args.raw_audio else default_transcoder(),
+                                          storage=args.PAC_storage)
 
     def process_where_args(args: str):
         for operator in Vocabulary.Filter.OPERATORS:
@@ -337,12 +486,20 @@ def main():
         lexeme = " ".join(args.lexeme)
 
 
-        if args.remove:
-            try:
-                vocabulary.delete_lexeme(string=lexeme)
-                print("Operation successful!")
-            except Exception as e:
-                print(f"Operation unsuccessful: {e}")
+        if args.remove and not args.pronunciation:
+            if args.where:
+                where_args = process_where_args(args=args.where[0])
+                deleted_count = FunctionLogger.execute(fun=lambda: vocabulary.delete_lexemes(filter=Vocabulary.LexemeFilter(field=where_args[0], value=where_args[1], operator=where_args[2])),
+                                                       exception=Exception, exception_msg="Operation unsuccessful:")
+            elif args.lexeme and all(arg.isdigit() for arg in args.lexeme):
+                deleted_count = FunctionLogger.execute(fun=lambda: vocabulary.delete_lexemes(ids=[int(arg) for arg in args.lexeme]),
+                                                       exception=Exception, exception_msg="Operation unsuccessful:")
+            else:
+                deleted_count = FunctionLogger.execute(fun=lambda: vocabulary.delete_lexemes(filter=Vocabulary.LexemeFilter(field='string', operator='==', value=f'"{lexeme}"')),
+                                                       exception=Exception, exception_msg="Operation unsuccessful:")
+
+            if deleted_count is not None:
+                print(f"Lexemes removed: {deleted_count}")
         
         elif args.all:
             print(vocabulary.__lexeme__(filter=None))
@@ -368,8 +525,8 @@ def main():
                         lexeme = Lexeme.get(Lexeme.id == lexeme).string
 
 
-                    content = extract_audio_content_from_api(lexeme=lexeme)
-                    play_temp_audio_file(content=content)
+                    content, extension = audio_manager.fetch_audio(lexeme=lexeme)
+                    play_temp_audio_file(content=content, suffix=extension)
         
         elif args.where:
             where_args = process_where_args(args=args.where[0])
@@ -385,8 +542,9 @@ def main():
         lexeme = " ".join(args.entry)
  
         if args.create:
+            warn_near_duplicates(vocabulary=vocabulary, definition=" ".join(args.definition))
             
-            FunctionLogger.execute(fun=vocabulary.create_lexical_entry(
+            FunctionLogger.execute(fun=lambda: vocabulary.create_lexical_entry(
                     lexeme=lexeme,
                     definition=" ".join(args.definition),
                     category=GrammaticalCategory[args.lexical_category],
@@ -420,7 +578,19 @@ def main():
 
                 
         elif args.remove:
-            pass
+            if args.where:
+                where_args = process_where_args(args=args.where[0])
+                deleted_count = FunctionLogger.execute(fun=lambda: vocabulary.delete_lexical_entries(filter=Vocabulary.EntryFilter(field=where_args[0], value=where_args[1], operator=where_args[2])),
+                                                       exception=Exception, exception_msg="Operation unsuccessful:")
+            elif args.entry and all(arg.isdigit() for arg in args.entry):
+                deleted_count = FunctionLogger.execute(fun=lambda: vocabulary.delete_lexical_entries(ids=[int(arg) for arg in args.entry]),
+                                                       exception=Exception, exception_msg="Operation unsuccessful:")
+            else:
+                deleted_count = None
+                print("Entries can be removed only by their IDs or with '--where'.")
+
+            if deleted_count is not None:
+                print(f"Lexical entries removed: {deleted_count}")
   
         
         elif args.all:
@@ -437,12 +607,20 @@ def main():
             else:
                 print(vocabulary.__lexical_entry__(filter=Vocabulary.EntryFilter(field='definition', operator='==', value=lexeme)))
     
+    elif args.sync and (args.import_file is not None or args.export_file is not None):
+        sync_entries(vocabulary=vocabulary,
+                     import_path=(args.import_file[0] if args.import_file else DEF_IMPORT_FILE_PATH) if args.import_file is not None else None,
+                     export_path=(args.export_file[0] if args.export_file else DEF_EXPORT_FILE_PATH) if args.export_file is not None else None)
+
+    elif args.watch is not None:
+        watch_entries(vocabulary=vocabulary, audio_manager=audio_manager, directory=args.watch)
+
     elif args.import_file is not None:
         import_entries(f_path=args.import_file[0] if args.import_file else DEF_IMPORT_FILE_PATH, audio_manager=audio_manager, vocabulary=vocabulary)
 
 
     elif args.export_file is not None:
-        export_entries(f_path=args.export_file[0] if args.export_file else DEF_EXPORT_FILE_PATH, vocabulary=vocabulary)
+        export_entries(f_path=args.export_file[0] if args.export_file else DEF_EXPORT_FILE_PATH, vocabulary=vocabulary, f_format=args.export_format)
    
     elif args.definition:
 
@@ -459,7 +637,84 @@ def main():
         if args.entry is None:
             print(vocabulary.__str__())
         elif not args.entry:
-            vocabulary.__lexemes__()
+            print(vocabulary.__lexemes__())
+
+    elif args.create_PACs:
+        created_count, failures = audio_manager.create_PACs(worker_count=args.workers[0] if args.workers else DEF_WORKER_COUNT, progress=print_PAC_progress)
+
+        for failed_lexeme, reason in failures.items():
+            print(f"Pronunciation Clip of '{failed_lexeme}' not created: {reason}")
+
+        print(f"Pronunciation Clips created: {created_count}, failed: {len(failures)}")
+
+    elif args.transcode_PACs:
+        result = FunctionLogger.execute(fun=lambda: audio_manager.transcode_PACs(worker_count=args.workers[0] if args.workers else DEF_WORKER_COUNT, progress=print_PAC_progress),
+                                        exception=Exception, exception_msg="Operation unsuccessful:")
+
+        if result is not None:
+            transcoded_count, saved_size, failures = result
+
+            for failed_lexeme, reason in failures.items():
+                print(f"Pronunciation Clip of '{failed_lexeme}' not transcoded: {reason}")
+
+            print(f"Pronunciation Clips transcoded: {transcoded_count}, failed: {len(failures)}, saved: {saved_size / 1024:.1f} KiB")
+
+    elif args.move_PACs:
+        result = FunctionLogger.execute(fun=lambda: audio_manager.move_PACs(progress=print_PAC_progress), exception=Exception, exception_msg="Operation unsuccessful:")
+
+        if result is not None:
+            moved_count, failures = result
+
+            for failed_lexeme, reason in failures.items():
+                print(f"Pronunciation Clip of '{failed_lexeme}' not moved: {reason}")
+
+            print(f"Pronunciation Clips moved into {args.PAC_storage}: {moved_count}, failed: {len(failures)}")
+
+    elif args.gc:
+        deleted_counts = FunctionLogger.execute(fun=vocabulary.collect_garbage, exception=Exception, exception_msg="Operation unsuccessful:")
+
+        if deleted_counts is not None:
+            for table_name, count in deleted_counts.items():
+                print(f"Orphaned rows removed from {table_name}: {count}")
+
+            print(f"Orphaned Pronunciation Clips removed: {audio_manager.collect_orphan_PACs()}")
+
+    elif args.dedupe:
+        deduplicate(vocabulary=vocabulary)
+
+    elif args.backup is not None:
+        f_path = FunctionLogger.execute(fun=lambda: backup.backup(vocabulary=vocabulary, f_path=args.backup[0], method=args.backup_method, progress=print_backup_progress),
+                                        exception=Exception, exception_msg="Operation unsuccessful:")
+
+        if f_path is not None:
+            print(f"\nDatabase backed up into: {f_path}")
+
+    elif args.snapshot is not None:
+        f_path = FunctionLogger.execute(fun=lambda: backup.snapshot(vocabulary=vocabulary, directory=args.snapshot[0] if args.snapshot else None,
+                                                                          keep=args.keep[0] if args.keep else backup.DEF_SNAPSHOT_COUNT, compress=args.zstd),
+                                        exception=Exception, exception_msg="Operation unsuccessful:")
+
+        if f_path is not None:
+            print(f"Snapshot created: {f_path}")
+
+    elif args.compact:
+        released_count = FunctionLogger.execute(fun=lambda: backup.compact(vocabulary=vocabulary), exception=Exception, exception_msg="Operation unsuccessful:")
+
+        if released_count is not None:
+            print(f"Released pages: {released_count}")
+
+    elif args.mmap_snapshot:
+        f_path = FunctionLogger.execute(fun=vocabulary.build_lookup_snapshot, exception=Exception, exception_msg="Operation unsuccessful:")
+
+        if f_path is not None:
+            print(f"Lookup snapshot built: {f_path} ({os.path.getsize(f_path)} bytes)")
+
+    elif args.rebuild_stats:
+        FunctionLogger.execute(fun=vocabulary.rebuild_lexeme_stats, exception=Exception, end_msg="Lexeme statistics rebuilt!", exception_msg="Operation unsuccessful:")
+        FunctionLogger.execute(fun=vocabulary.rebuild_attempt_stats, exception=Exception, end_msg="Daily attempt statistics rebuilt!", exception_msg="Operation unsuccessful:")
+
+    elif args.learning_curve is not None:
+        print(vocabulary.learning_curve(entry_id=int(args.learning_curve[0]) if args.learning_curve else None))
     
     elif args.test:
         
@@ -470,7 +725,7 @@ def main():
                 value = int(practice_val[:-1])
                 mode = 'percentage'
             elif practice_val.isdigit():
-                value = int(args.practice)
+                value = int(practice_val)
                 mode = 'count'
             else:
                 print("Invalid")
@@ -479,27 +734,42 @@ def main():
             mode=None
 
         
-        questions: List[TestQuestion] = tester.test_vocabulary(number_of_tests=args.test[0], for_practice=value, practice_mode=mode)
+        questions: List[TestQuestion] = tester.test_vocabulary(number_of_tests=args.test[0], for_practice=value, practice_mode=mode,
+                                                               choice_count=args.choices[0] if args.choices else 0, reverse=args.reverse)
 
         if not questions:
             print("No words in dictionary! At least 1 required for testing.\n")
         
         else:
-            print("Assign correct lexemes to the following definitions: ", end="\n\n")
+            print("Describe meanings of the following lexemes: " if args.reverse else "Assign correct lexemes to the following definitions: ", end="\n\n")
+
+            # answers submitted so far are saved even if the test is interrupted (Ctrl-C, end of input)
+            try:
+                for index, question in enumerate(questions):
+                    table = PrettyTable(field_names=['Expected Answer', 'Results', 'Sentence'])
+                    table.max_width['Expected Answer'] = 60
+
+                    print(f'{index + 1}. "{str(question.ask())}": ', end="")
 
-            for index, question in enumerate(questions):
-                table = PrettyTable(field_names=['Expected Answer', 'Results', 'Sentence'])
+                    if question.get_choices():
+                        print()
 
-                print(f'{index + 1}. "{str(question.ask())}": ', end="")
+                        for choice_index, choice in enumerate(question.get_choices(), 1):
+                            print(f'    {choice_index}) {choice}')
 
-                question.answer(lexeme=input(""))
+                        answer = input("Choice: ")
+                        question.answer(lexeme=question.get_choices()[int(answer) - 1] if answer.isdigit() and 0 < int(answer) <= len(question.get_choices()) else answer)
+                    else:
+                        question.answer(lexeme=input(""))
 
-                print("\nTEST RESULTS")
-                entry = tester.submit_question(question=question)
+                    print("\nTEST RESULTS")
+                    tester.submit_question(question=question)
                 
-                table.add_row([question.get_answer(), str(question.get_evaluation()) + "%", entry.sentence])
-                print(table)
-                print()
+                    table.add_row([question.get_answer(), str(question.get_evaluation()) + "%", question.get_sentence()])
+                    print(table)
+                    print()
+            finally:
+                tester.flush_attempts()
 
     else:
         print("Welcom to CusVoc Terminal. Use -h for printing help.")
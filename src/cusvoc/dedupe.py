@@ -0,0 +1,317 @@
+"""
+    This module provides detection and merging of near-duplicate definitions and sentences (numpy library).
+
+    Texts are normalized, split into character shingles and summarized by MinHash signatures. Signatures are split
+    into bands, texts sharing any band fall into the same LSH bucket, so candidates are found in roughly linear time
+    instead of comparing all pairs. Candidates are confirmed by the estimated Jaccard similarity of their shingles.
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+__all__ = ['MinHashIndex', 'definition_index', 'similar_definitions', 'duplicate_definitions', 'duplicate_sentences', 'merge_definitions']
+
+# --- SYSTEM LIBS ---
+
+from datetime import datetime
+from typing import Dict, List, Iterable
+import os
+import zlib
+
+# --- EXTERNAL LIBS ---
+
+import numpy as np
+from peewee import fn, JOIN
+
+# --- PACKAGE LIBS ---
+
+from vocabulary import Vocabulary
+from textvec import word_tokens
+
+from models.definition import Definition
+from models.lexical_entry import LexicalEntry
+from models.entry_label import EntryLabel
+from models.test_attempt import TestAttempt
+
+
+DEF_THRESHOLD = 0.7
+DEFINITION_INDEX_SUFFIX = '.minhash.npz' # the index of definitions is stored next to the database file
+SHINGLE_SIZE = 4
+PERMUTATION_COUNT = 64
+BAND_COUNT = 16 # 4 rows per band, pairs share a bucket with probability 1-(1-s^4)^16, ~0.64 at 0.5 and ~0.99 at 0.7 similarity
+
+_HASH_MASK = np.uint64(0xFFFFFFFF)
+_RNG = np.random.default_rng(seed=0x5EED) # fixed seed, stored signatures must stay comparable with new ones
+_MULTIPLIERS = _RNG.integers(1, 1 << 32, size=PERMUTATION_COUNT, dtype=np.uint64) | np.uint64(1)
+_INCREMENTS = _RNG.integers(0, 1 << 32, size=PERMUTATION_COUNT, dtype=np.uint64)
+
+
+
+def shingles(text: str):
+    normalized = " ".join(word_tokens(text))
+
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized}
+
+    return {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+def signature(text: str):
+    hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles(text)), dtype=np.uint64)
+    return ((_MULTIPLIERS[:, None] * hashes[None, :] + _INCREMENTS[:, None]) & _HASH_MASK).min(axis=1).astype(np.uint32)
+
+
+
+class MinHashIndex():
+    """
+        MinHash signatures of texts keyed by integer keys, optionally stored in a file and updated incrementally.
+    """
+
+    def __init__(self, f_path: str = None, threshold: float = DEF_THRESHOLD) -> None:
+        self.f_path = f_path
+        self.threshold = threshold
+
+        self.keys = np.empty(0, dtype=np.int64)
+        self.hashes = np.empty(0, dtype=np.int64) # crc32 of each text, changed texts are re-signed
+        self.signatures = np.empty((0, PERMUTATION_COUNT), dtype=np.uint32)
+
+        if f_path is not None and os.path.exists(f_path):
+            try:
+                with np.load(f_path) as data:
+                    if data['signatures'].shape[1] == PERMUTATION_COUNT:
+                        self.keys, self.hashes, self.signatures = data['keys'], data['hashes'], data['signatures']
+            except Exception:
+                # an unreadable index is treated as empty, all texts are signed again
+                pass
+
+
+    def update(self, texts: Dict[int, str]):
+        """
+            Synchronizes the index with the provided texts, only new or changed texts are signed.
+        """
+
+        text_hashes = {key: zlib.crc32(text.encode('utf-8')) for key, text in texts.items()}
+        kept = np.fromiter((text_hashes.get(int(key)) == int(text_hash) for key, text_hash in zip(self.keys, self.hashes)), dtype=bool, count=len(self.keys))
+
+        known = set(self.keys[kept].tolist())
+        new_keys = [key for key in texts if key not in known]
+
+        if kept.all() and not new_keys:
+            return 0
+
+        self.keys = np.concatenate([self.keys[kept], np.asarray(new_keys, dtype=np.int64)])
+        self.hashes = np.concatenate([self.hashes[kept], np.asarray([text_hashes[key] for key in new_keys], dtype=np.int64)])
+        self.signatures = np.concatenate([self.signatures[kept], np.asarray([signature(texts[key]) for key in new_keys], dtype=np.uint32).reshape(-1, PERMUTATION_COUNT)])
+
+        if self.f_path is not None:
+            # the file is replaced only when complete, a crash never leaves a torn index behind
+            tmp_path = self.f_path + '.tmp'
+
+            with open(tmp_path, 'wb') as index_file:
+                np.savez(index_file, keys=self.keys, hashes=self.hashes, signatures=self.signatures)
+
+            os.replace(tmp_path, self.f_path)
+
+        return len(new_keys)
+
+
+    def clusters(self):
+        """
+            Returns lists of keys of near-duplicate texts, only clusters of two or more keys are returned.
+        """
+
+        parents = np.arange(len(self.keys))
+
+        def find(i: int):
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+
+        for first, second in self.__candidate_pairs():
+            if (self.signatures[first] == self.signatures[second]).mean() >= self.threshold:
+                parents[find(first)] = find(second)
+
+        groups: Dict[int, List[int]] = {}
+
+        for row in range(len(self.keys)):
+            groups.setdefault(find(row), []).append(int(self.keys[row]))
+
+        return [keys for keys in groups.values() if len(keys) > 1]
+
+
+    def near_duplicates(self, text: str):
+        """
+            Returns keys of indexed texts similar to the provided one, without comparing it with all of them one by one.
+        """
+
+        if not len(self.keys):
+            return []
+
+        text_signature = signature(text)
+        rows_per_band = PERMUTATION_COUNT // BAND_COUNT
+
+        bands_match = (self.signatures == text_signature).reshape(len(self.keys), BAND_COUNT, rows_per_band).all(axis=2).any(axis=1)
+        candidates = np.flatnonzero(bands_match)
+        similar = (self.signatures[candidates] == text_signature).mean(axis=1) >= self.threshold
+
+        return [int(key) for key in self.keys[candidates[similar]]]
+
+
+    def __candidate_pairs(self):
+        rows_per_band = PERMUTATION_COUNT // BAND_COUNT
+        pairs = set()
+
+        for band in range(BAND_COUNT):
+            band_rows = np.ascontiguousarray(self.signatures[:, band * rows_per_band:(band + 1) * rows_per_band])
+            _, buckets = np.unique(band_rows.view(np.dtype((np.void, band_rows.dtype.itemsize * rows_per_band))).ravel(), return_inverse=True)
+
+            order = np.argsort(buckets, kind='stable')
+            bounds = np.flatnonzero(np.diff(buckets[order])) + 1
+
+            for bucket in np.split(order, bounds):
+                for i in range(1, len(bucket)):
+                    pairs.add((int(bucket[0]), int(bucket[i])))
+
+        return pairs
+
+
+
+def definition_index(vocabulary: Vocabulary, threshold: float = DEF_THRESHOLD):
+    """
+        Returns the MinHash index of all definitions, stored next to the database file and brought up to date.
+    """
+
+    index = MinHashIndex(f_path=vocabulary.db_file_path + DEFINITION_INDEX_SUFFIX, threshold=threshold)
+
+    with vocabulary.bind():
+        index.update(dict(Definition.select(Definition.id, Definition.definition).tuples()))
+
+    return index
+
+
+def similar_definitions(vocabulary: Vocabulary, definition: str, threshold: float = DEF_THRESHOLD):
+    """
+        Returns existing definitions similar to the provided one. The stored index is only queried, not brought up to date,
+        so a single insert doesn't read the whole definitions table. Definitions added since the index was last updated
+        (see definition_index()) aren't found, candidates whose text changed meanwhile are signed again.
+    """
+
+    index = MinHashIndex(f_path=vocabulary.db_file_path + DEFINITION_INDEX_SUFFIX, threshold=threshold)
+    candidate_ids = index.near_duplicates(definition)
+
+    if not candidate_ids:
+        return []
+
+    with vocabulary.bind():
+        candidates = list(Definition.select(Definition.id, Definition.definition)
+                                    .where(Definition.id.in_(candidate_ids) & (Definition.definition != definition))
+                                    .tuples())
+
+    stored_hashes = dict(zip(index.keys.tolist(), index.hashes.tolist()))
+    definition_signature = signature(definition)
+
+    return [candidate for candidate_id, candidate in candidates
+            if stored_hashes[candidate_id] == zlib.crc32(candidate.encode('utf-8')) or (signature(candidate) == definition_signature).mean() >= threshold]
+
+
+def duplicate_definitions(vocabulary: Vocabulary, threshold: float = DEF_THRESHOLD):
+    """
+        Returns clusters of near-duplicate definitions as lists of (definition id, definition, entry count), the most used first.
+    """
+
+    clusters = definition_index(vocabulary=vocabulary, threshold=threshold).clusters()
+
+    if not clusters:
+        return []
+
+    with vocabulary.bind():
+        ids = [definition_id for cluster in clusters for definition_id in cluster]
+        entry_counts = fn.COUNT(LexicalEntry.id)
+
+        rows = {definition_id: (definition_id, definition, entry_count)
+                for definition_id, definition, entry_count in (Definition.select(Definition.id, Definition.definition, entry_counts)
+                                                                         .join(LexicalEntry, JOIN.LEFT_OUTER, on=(LexicalEntry.definition == Definition.id))
+                                                                         .where(Definition.id.in_(ids))
+                                                                         .group_by(Definition.id)
+                                                                         .tuples())}
+
+    return [sorted((rows[definition_id] for definition_id in cluster if definition_id in rows), key=lambda row: (-row[2], row[0])) for cluster in clusters]
+
+
+def duplicate_sentences(vocabulary: Vocabulary, threshold: float = DEF_THRESHOLD):
+    """
+        Returns clusters of ids of Lexical Entries with near-duplicate sentences.
+    """
+
+    index = MinHashIndex(threshold=threshold)
+
+    with vocabulary.bind():
+        index.update(dict(LexicalEntry.select(LexicalEntry.id, LexicalEntry.sentence).where(LexicalEntry.sentence.is_null(False)).tuples()))
+
+    return index.clusters()
+
+
+def merge_definitions(vocabulary: Vocabulary, clusters: Iterable[List[int]]):
+    """
+        Repoints entries of each cluster of definition ids to its first definition in a single transaction.
+
+        If a lexeme ends up with several entries of the same definition, they are folded into one: test counters,
+        answer history and usage labels of the others are moved to it and the others are removed.
+        Returns the number of repointed and folded entries.
+    """
+
+    repointed_count = folded_count = 0
+
+    with vocabulary.bind(), vocabulary.atomic():
+        for cluster in clusters:
+            canonical_id, *other_ids = cluster
+
+            entries = list(LexicalEntry.select(LexicalEntry.id, LexicalEntry.lexeme, LexicalEntry.definition, LexicalEntry.test_count, LexicalEntry.match_sum)
+                                       .where(LexicalEntry.definition.in_(cluster))
+                                       .order_by(LexicalEntry.definition != canonical_id, LexicalEntry.test_count.desc(), LexicalEntry.id)
+                                       .tuples())
+
+            survivors: Dict[int, int] = {} # lexeme id -> id of the kept entry
+            folded: Dict[int, List[int]] = {} # id of the kept entry -> ids of folded entries
+
+            for entry_id, lexeme_id, definition_id, test_count, match_sum in entries:
+                if lexeme_id not in survivors:
+                    survivors[lexeme_id] = entry_id
+                else:
+                    folded.setdefault(survivors[lexeme_id], []).append(entry_id)
+
+            for survivor_id, duplicate_ids in folded.items():
+                totals = (LexicalEntry.select(fn.SUM(LexicalEntry.test_count), fn.SUM(LexicalEntry.match_sum))
+                                      .where(LexicalEntry.id.in_(duplicate_ids))
+                                      .tuples()
+                                      .get())
+
+                LexicalEntry.update({LexicalEntry.test_count: LexicalEntry.test_count + totals[0],
+                                     LexicalEntry.match_sum: LexicalEntry.match_sum + totals[1],
+                                     LexicalEntry.updated_at: datetime.now()}).where(LexicalEntry.id == survivor_id).execute()
+
+                TestAttempt.update(entry=survivor_id).where(TestAttempt.entry.in_(duplicate_ids)).execute()
+
+                # one entry at a time, so a label shared by several folded entries is moved only once
+                for duplicate_id in duplicate_ids:
+                    survivor_labels = EntryLabel.select(EntryLabel.label).where(EntryLabel.entry == survivor_id)
+                    EntryLabel.update(entry=survivor_id).where((EntryLabel.entry == duplicate_id) & EntryLabel.label.not_in(survivor_labels)).execute()
+
+                folded_count += vocabulary.delete_lexical_entries(ids=duplicate_ids)
+
+            # bulk updates skip LexicalEntry.save(), updated_at is set here, so delta sync and the distractor index see the change
+            repointed_count += (LexicalEntry.update({LexicalEntry.definition: canonical_id, LexicalEntry.updated_at: datetime.now()})
+                                            .where(LexicalEntry.id.in_(list(survivors.values())) & (LexicalEntry.definition != canonical_id))
+                                            .execute())
+
+            Definition.delete().where(Definition.id.in_(other_ids) &
+                                      ~fn.EXISTS(LexicalEntry.select(LexicalEntry.id).where(LexicalEntry.definition == Definition.id))).execute()
+
+        # daily rollups of folded entries were removed with them, their attempts now belong to the kept entries
+        if folded_count:
+            vocabulary.rebuild_attempt_stats()
+
+    vocabulary.clear_caches()
+
+    return repointed_count, folded_count
@@ -0,0 +1,175 @@
+"""
+    This module provides scoring of typed definitions, used by reverse tests (lexeme -> definition).
+
+    Term counts of all definitions are stored in a memory-mapped numpy matrix next to the database file, so an answer
+    is scored by TF-IDF cosine similarity with its expected definition using a single row of the matrix.
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+__all__ = ['DefinitionVectors']
+
+# --- SYSTEM LIBS ---
+
+from typing import Dict
+import os
+import zlib
+
+# --- EXTERNAL LIBS ---
+
+import numpy as np
+
+# --- PACKAGE LIBS ---
+
+from textvec import word_tokens, count_vectors, idf_weights
+
+from models.definition import Definition
+
+
+
+class DefinitionVectors():
+    """
+        Keeps term count vectors of definitions and document frequencies of their terms.
+
+        Definitions which were removed or whose text changed are only marked as dead, their rows are dropped
+        the next time new rows are appended. Models must be bound to the database of the indexed vocabulary when updating.
+    """
+
+    MATRIX_FILE_SUFFIX = '.definitions.npy'
+    META_FILE_SUFFIX = '.definitions.meta.npz'
+    DEF_DIMENSION = 2048
+    COPY_BATCH_SIZE = 4096
+
+    def __init__(self, db_file_path: str, dimension: int = DEF_DIMENSION) -> None:
+        self.matrix_path = db_file_path + self.MATRIX_FILE_SUFFIX
+        self.meta_path = db_file_path + self.META_FILE_SUFFIX
+        self.dimension = dimension
+
+        self.__matrix: np.ndarray = None
+        self.__ids: np.ndarray = None # definition id of each row, -1 for dead rows
+        self.__hashes: np.ndarray = None # crc32 of definition text of each row
+        self.__frequencies: np.ndarray = None # number of live definitions containing each hashed term
+        self.__rows: Dict[int, int] = {}
+
+
+    def score(self, definition_id: int, answer: str):
+        """
+            Returns cosine similarity between TF-IDF vectors of the answer and of the definition, between 0 and 1.
+        """
+
+        row = self.__rows.get(definition_id)
+
+        if row is None:
+            raise KeyError(f"Definition with ID '{definition_id}' is not indexed, update() must be called first.")
+
+        idf = idf_weights(document_frequencies=self.__frequencies, document_count=len(self.__rows))
+        answer_vector = count_vectors([word_tokens(answer)], dimension=self.dimension)[0] * idf
+        definition_vector = np.asarray(self.__matrix[row]) * idf
+
+        norm = np.linalg.norm(answer_vector) * np.linalg.norm(definition_vector)
+
+        return float(answer_vector @ definition_vector / norm) if norm else 0.0
+
+
+    def update(self):
+        """
+            Brings the vectors up to date with the definitions table. Returns the number of newly vectorized definitions.
+        """
+
+        if self.__matrix is None:
+            self.__load()
+
+        current: Dict[int, int] = {}
+        texts: Dict[int, str] = {}
+
+        for definition_id, definition in Definition.select(Definition.id, Definition.definition).tuples():
+            current[definition_id] = zlib.crc32(definition.encode('utf-8'))
+            texts[definition_id] = definition
+
+        # rows of removed or changed definitions die, their terms no longer count into document frequencies
+        dead_rows = [row for definition_id, row in self.__rows.items() if current.get(definition_id) != self.__hashes[row]]
+
+        for row in dead_rows:
+            self.__frequencies -= np.asarray(self.__matrix[row]) > 0
+            del self.__rows[int(self.__ids[row])]
+            self.__ids[row] = -1
+
+        new_ids = [definition_id for definition_id in current if definition_id not in self.__rows]
+
+        if new_ids:
+            new_rows = count_vectors((word_tokens(texts[definition_id]) for definition_id in new_ids), dimension=self.dimension)
+            self.__frequencies += (new_rows > 0).sum(axis=0)
+            self.__append(ids=np.asarray(new_ids, dtype=np.int64), hashes=np.asarray([current[definition_id] for definition_id in new_ids], dtype=np.int64), rows=new_rows)
+
+        if dead_rows or new_ids:
+            self.__save_meta()
+
+        return len(new_ids)
+
+
+    def __load(self):
+        if os.path.exists(self.matrix_path) and os.path.exists(self.meta_path):
+            try:
+                matrix = np.load(self.matrix_path, mmap_mode='r')
+
+                with np.load(self.meta_path) as meta:
+                    ids, hashes, frequencies = meta['ids'], meta['hashes'], meta['frequencies']
+                    matrix_stamp = meta['matrix_stamp']
+            except Exception:
+                # a torn or outdated file, the vectors are rebuilt
+                matrix = None
+
+            # the meta file is written after the matrix file, it belongs to another matrix if the writer didn't get to it
+            if matrix is not None and matrix.shape[1] == self.dimension and matrix_stamp.tolist() == self.__matrix_stamp(matrix):
+                self.__matrix = matrix
+                self.__ids, self.__hashes, self.__frequencies = ids, hashes, frequencies
+                self.__rows = {int(definition_id): row for row, definition_id in enumerate(self.__ids) if definition_id >= 0}
+                return
+
+        self.__matrix = np.empty((0, self.dimension), dtype=np.float32)
+        self.__ids = np.empty(0, dtype=np.int64)
+        self.__hashes = np.empty(0, dtype=np.int64)
+        self.__frequencies = np.zeros(self.dimension, dtype=np.float64)
+        self.__rows = {}
+
+
+    def __append(self, ids: np.ndarray, hashes: np.ndarray, rows: np.ndarray):
+        """
+            Rewrites the matrix file with live rows followed by the new ones, the file is replaced only when complete.
+        """
+
+        live = np.flatnonzero(self.__ids >= 0)
+        tmp_path = self.matrix_path + '.tmp.npy'
+
+        matrix = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(len(live) + len(rows), self.dimension))
+
+        for start in range(0, len(live), self.COPY_BATCH_SIZE):
+            batch = live[start:start + self.COPY_BATCH_SIZE]
+            matrix[start:start + len(batch)] = self.__matrix[batch]
+
+        matrix[len(live):] = rows
+        matrix.flush()
+        del matrix
+
+        self.__matrix = None
+        os.replace(tmp_path, self.matrix_path)
+
+        self.__matrix = np.load(self.matrix_path, mmap_mode='r')
+        self.__ids = np.concatenate([self.__ids[live], ids])
+        self.__hashes = np.concatenate([self.__hashes[live], hashes])
+        self.__rows = {int(definition_id): row for row, definition_id in enumerate(self.__ids)}
+
+
+    def __save_meta(self):
+        tmp_path = self.meta_path + '.tmp'
+
+        with open(tmp_path, 'wb') as meta_file:
+            np.savez(meta_file, ids=self.__ids, hashes=self.__hashes, frequencies=self.__frequencies,
+                     matrix_stamp=np.asarray(self.__matrix_stamp(self.__matrix), dtype=np.int64))
+
+        os.replace(tmp_path, self.meta_path)
+
+    def __matrix_stamp(self, matrix: np.ndarray):
+        # row count and modification time of the matrix file, each rewrite of the matrix changes the latter
+        return [matrix.shape[0], os.stat(self.matrix_path).st_mtime_ns if matrix.shape[0] else 0]
@@ -0,0 +1,159 @@
+"""
+    This module provides the index of distractors (plausible wrong answers) for multiple-choice tests.
+
+    Distractors of an entry are lexemes of other entries of the same lexical category with similar spelling
+    or similar definition. Neighbors of all entries are precomputed once (see textvec.NeighborIndex), stored next to
+    the database file and updated only with entries changed since the last update.
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+__all__ = ['DistractorIndex']
+
+# --- SYSTEM LIBS ---
+
+from typing import Dict, List, Iterable
+import os
+
+# --- EXTERNAL LIBS ---
+
+from peewee import fn
+
+# --- PACKAGE LIBS ---
+
+from lookup_snapshot import LookupSnapshot
+from textvec import DEF_DIMENSION, NeighborIndex, char_ngrams, word_tokens, count_vectors, normalize_rows
+
+from models.lexeme import Lexeme
+from models.definition import Definition
+from models.lexical_entry import LexicalEntry
+
+
+
+class DistractorIndex():
+    """
+        Keeps the most similar entries of each Lexical Entry. Models must be bound to the database of the indexed vocabulary.
+    """
+
+    FILE_SUFFIX = '.distractors.npz'
+    NEIGHBOR_COUNT = 16
+
+    def __init__(self, db_file_path: str, dimension: int = DEF_DIMENSION, neighbor_count: int = NEIGHBOR_COUNT) -> None:
+        self.f_path = db_file_path + self.FILE_SUFFIX
+        self.dimension = dimension
+        self.neighbor_count = neighbor_count
+
+        self.__index: NeighborIndex = None
+
+
+    @staticmethod
+    def vectorize(lexemes: List[str], definitions: List[str], dimension: int = DEF_DIMENSION):
+        """
+            Spelling (character trigrams of the lexeme) and meaning (words of the definition) contribute equally to the vector.
+        """
+
+        spelling = normalize_rows(count_vectors((char_ngrams(lexeme) for lexeme in lexemes), dimension=dimension))
+        meaning = normalize_rows(count_vectors((word_tokens(definition) for definition in definitions), dimension=dimension))
+
+        return normalize_rows(spelling + meaning)
+
+
+    def update(self):
+        """
+            Brings the index up to date with the database, only new, changed and removed entries are processed.
+            Returns the number of (re)indexed entries.
+        """
+
+        if self.__index is None:
+            if os.path.exists(self.f_path):
+                try:
+                    self.__index = NeighborIndex.load(f_path=self.f_path)
+                except Exception:
+                    # an unreadable index is rebuilt from scratch
+                    self.__index = None
+
+            if self.__index is None or self.__index.dimension != self.dimension or self.__index.neighbor_count != self.neighbor_count:
+                self.__index = NeighborIndex(dimension=self.dimension, neighbor_count=self.neighbor_count)
+
+        index = self.__index
+        watermark = index.attributes.get('watermark')
+
+        existing_ids = {entry_id for entry_id, in LexicalEntry.select(LexicalEntry.id).tuples()}
+        removed_ids = [int(key) for key in index.keys if int(key) not in existing_ids]
+
+        changed = (LexicalEntry.select(LexicalEntry.id, LexicalEntry.lexical_category, Lexeme.string, Definition.definition, LexicalEntry.updated_at)
+                               .join(Lexeme).switch(LexicalEntry)
+                               .join(Definition))
+
+        if watermark is not None:
+            changed = changed.where(LexicalEntry.updated_at > watermark)
+
+        rows = list(changed.tuples())
+
+        if not rows and not removed_ids:
+            return 0
+
+        index.remove(removed_ids + [entry_id for entry_id, *_ in rows])
+
+        if rows:
+            entry_ids, category_ids, lexemes, definitions, updated_ats = zip(*rows)
+            index.add(keys=entry_ids, groups=category_ids, vectors=self.vectorize(lexemes=list(lexemes), definitions=list(definitions), dimension=self.dimension))
+            index.attributes['watermark'] = max(str(updated_at) for updated_at in updated_ats if updated_at is not None)
+
+        index.save(f_path=self.f_path)
+
+        return len(rows)
+
+
+    def distractors(self, entry_ids: Iterable[int], count: int, snapshot: LookupSnapshot = None):
+        """
+            Returns up to count distractor lexemes for each of the provided entries, keyed by entry id.
+            Lexemes of the entries and all their neighbors are fetched by a single query, or read from the provided up-to-date
+            lookup snapshot. If an entry has too few distinct neighbors, random lexemes of its category are used instead.
+        """
+
+        neighbor_ids = {entry_id: self.__index.neighbors_of(entry_id) if self.__index is not None else [] for entry_id in entry_ids}
+        all_ids = set(neighbor_ids).union(*neighbor_ids.values())
+
+        if snapshot is not None:
+            lexemes: Dict[int, str] = snapshot.entry_lexemes(entry_ids=list(all_ids))
+        else:
+            lexemes: Dict[int, str] = dict(LexicalEntry.select(LexicalEntry.id, Lexeme.string)
+                                                       .join(Lexeme)
+                                                       .where(LexicalEntry.id.in_(list(all_ids)))
+                                                       .tuples())
+
+        distractors: Dict[int, List[str]] = {}
+
+        for entry_id in neighbor_ids:
+            lexeme = lexemes.get(entry_id)
+            choices: List[str] = []
+
+            for neighbor_id in neighbor_ids[entry_id]:
+                neighbor_lexeme = lexemes.get(neighbor_id)
+
+                if neighbor_lexeme is not None and neighbor_lexeme != lexeme and neighbor_lexeme not in choices:
+                    choices.append(neighbor_lexeme)
+
+                if len(choices) == count:
+                    break
+
+            if len(choices) < count:
+                choices.extend(self.__random_lexemes(entry_id=entry_id, exclude=[lexeme, *choices], count=count - len(choices)))
+
+            distractors[entry_id] = choices
+
+        return distractors
+
+
+    def __random_lexemes(self, entry_id: int, exclude: Iterable[str], count: int):
+        category = LexicalEntry.select(LexicalEntry.lexical_category).where(LexicalEntry.id == entry_id)
+
+        query = (Lexeme.select(Lexeme.string).distinct()
+                       .join(LexicalEntry, on=(LexicalEntry.lexeme == Lexeme.id))
+                       .where((LexicalEntry.lexical_category == category) & Lexeme.string.not_in(list(exclude)))
+                       .order_by(fn.Random())
+                       .limit(count))
+
+        return [string for string, in query.tuples()]
@@ -0,0 +1,143 @@
+"""
+    This module provides machine-readable exporters of Lexical Entries (NDJSON, Apache Arrow and Parquet).
+
+    Unlike the tabular Entry File export, rows are read directly from the sqlite cursor in batches, so no
+    model instances are created. Arrow and Parquet exports require the pyarrow library.
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+__all__ = ['EXPORT_FORMATS', 'EXPORT_COLUMNS', 'iter_entry_batches', 'export_ndjson', 'export_arrow', 'export_parquet']
+
+# --- SYSTEM LIBS ---
+
+from typing import Iterator, List, Tuple
+import json
+
+# --- PACKAGE LIBS ---
+
+from vocabulary import Vocabulary
+
+from models.lexeme import Lexeme
+from models.definition import Definition
+from models.lexical_category import LexicalCategoryModel
+from models.collocate import Collocate
+from models.lexical_entry import LexicalEntry
+from models.usage_label import UsageLabelModel
+from models.entry_label import EntryLabel
+
+
+EXPORT_FORMATS = ('ndjson', 'arrow', 'parquet')
+EXPORT_COLUMNS = ('id', 'lexeme', 'definition', 'lexical_category', 'collocate', 'sentence', 'for_practice', 'pac_file',
+                  'test_count', 'match_sum', 'tested_at', 'created_at', 'updated_at', 'labels')
+
+DEF_BATCH_SIZE = 10_000
+
+
+
+def _entry_query():
+    return f"""
+        SELECT e.id, l.string, d.definition, c.category, col.collocate, e.sentence, e.for_practice,
+               l.PAC_file_path IS NOT NULL, e.test_count, e.match_sum, e.tested_at, e.created_at, e.updated_at,
+               (SELECT group_concat(ul.label, ',')
+                FROM {EntryLabel._meta.table_name} AS el JOIN {UsageLabelModel._meta.table_name} AS ul ON ul.id = el.label_id
+                WHERE el.entry_id = e.id)
+        FROM {LexicalEntry._meta.table_name} AS e
+        JOIN {Lexeme._meta.table_name} AS l ON l.id = e.lexeme_id
+        JOIN {Definition._meta.table_name} AS d ON d.id = e.definition_id
+        JOIN {LexicalCategoryModel._meta.table_name} AS c ON c.id = e.lexical_category_id
+        LEFT OUTER JOIN {Collocate._meta.table_name} AS col ON col.id = e.collocate_id
+        ORDER BY e.id
+    """
+
+
+def iter_entry_batches(vocabulary: Vocabulary, batch_size: int = DEF_BATCH_SIZE) -> Iterator[List[Tuple]]:
+    """
+        Yields Lexical Entries as lists of raw tuples ordered as EXPORT_COLUMNS.
+    """
+
+    cursor = vocabulary.database().execute_sql(_entry_query())
+
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+
+            if not rows:
+                break
+
+            yield [row[:6] + (bool(row[6]), bool(row[7])) + row[8:13] + (row[13].split(',') if row[13] else [], ) for row in rows]
+    finally:
+        cursor.close()
+
+
+
+def export_ndjson(vocabulary: Vocabulary, f_path: str, batch_size: int = DEF_BATCH_SIZE):
+    """
+        Writes every Lexical Entry as a single JSON object per line.
+    """
+
+    with open(file=f_path, mode='w', encoding='utf-8') as dst_file:
+        for batch in iter_entry_batches(vocabulary=vocabulary, batch_size=batch_size):
+            dst_file.writelines(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n' for row in batch)
+
+
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('id', pa.int64()),
+        ('lexeme', pa.string()),
+        ('definition', pa.string()),
+        ('lexical_category', pa.string()),
+        ('collocate', pa.string()),
+        ('sentence', pa.string()),
+        ('for_practice', pa.bool_()),
+        ('pac_file', pa.bool_()),
+        ('test_count', pa.int64()),
+        ('match_sum', pa.float64()),
+        # sqlite stores datetimes as text, they are kept as such
+        ('tested_at', pa.string()),
+        ('created_at', pa.string()),
+        ('updated_at', pa.string()),
+        ('labels', pa.list_(pa.string())),
+    ])
+
+
+def _iter_record_batches(vocabulary: Vocabulary, batch_size: int):
+    import pyarrow as pa
+
+    schema = _arrow_schema()
+
+    for batch in iter_entry_batches(vocabulary=vocabulary, batch_size=batch_size):
+        columns = [list(column) for column in zip(*batch)]
+        yield pa.RecordBatch.from_arrays([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+
+
+def export_arrow(vocabulary: Vocabulary, f_path: str, batch_size: int = DEF_BATCH_SIZE):
+    """
+        Writes all Lexical Entries into an Arrow IPC file, one record batch per fetched cursor batch.
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError("Arrow export requires the pyarrow library!")
+
+    with pa.OSFile(f_path, 'wb') as sink, pa.ipc.new_file(sink, schema=_arrow_schema()) as writer:
+        for record_batch in _iter_record_batches(vocabulary=vocabulary, batch_size=batch_size):
+            writer.write_batch(record_batch)
+
+
+def export_parquet(vocabulary: Vocabulary, f_path: str, batch_size: int = DEF_BATCH_SIZE):
+    """
+        Writes all Lexical Entries into a Parquet file, one row group per fetched cursor batch.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export requires the pyarrow library!")
+
+    with pq.ParquetWriter(f_path, schema=_arrow_schema()) as writer:
+        for record_batch in _iter_record_batches(vocabulary=vocabulary, batch_size=batch_size):
+            writer.write_batch(record_batch)
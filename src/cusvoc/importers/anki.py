@@ -0,0 +1,160 @@
+"""
+    This module provides an importer of Anki decks (.apkg files).
+
+    An .apkg file is a zip archive holding a sqlite collection of notes, media files named by numbers and a JSON map
+    of those numbers to the original media names. The collection is extracted into a temporary file and its notes are read
+    by a cursor, batch by batch, media files are read from the archive only when they are stored as Pronunciation Clips.
+    Collections of the newest format (collection.anki21b) are compressed by zstd and not supported, such decks must be exported
+    with the 'Support older Anki versions' option.
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+__all__ = ['DEF_BATCH_SIZE', 'read_notes', 'import_apkg_file']
+
+# --- SYSTEM LIBS ---
+
+from typing import Dict, Iterator, List, Tuple
+import html
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import zipfile
+
+# --- PACKAGE LIBS ---
+
+from importers.pipeline import ImportedRow, RejectFile, ImportSummary, resolve_fields, deck_row, write_batches
+
+
+COLLECTION_NAMES = ('collection.anki21', 'collection.anki2') # the older one is only a placeholder in decks which have both
+MEDIA_MAP_NAME = 'media'
+FIELD_SEPARATOR = '\x1f'
+DEF_BATCH_SIZE = 500
+
+SOUND_PATTERN = re.compile(r'\[sound:([^\]]+)\]')
+TAG_PATTERN = re.compile(r'<[^>]*>')
+
+
+
+def _plain_text(value: str):
+    # fields are HTML, line breaks become spaces
+    return " ".join(html.unescape(TAG_PATTERN.sub(' ', SOUND_PATTERN.sub('', value))).split())
+
+
+def _field_names(collection: sqlite3.Connection) -> Dict[int, List[str]]:
+    """
+        Returns names of fields of each note type, ordered as the fields of notes.
+    """
+
+    if collection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'fields'").fetchone():
+        names: Dict[int, List[str]] = {}
+
+        for note_type_id, name in collection.execute('SELECT ntid, name FROM fields ORDER BY ntid, ord'):
+            names.setdefault(note_type_id, []).append(name)
+
+        return names
+
+    models = json.loads(collection.execute('SELECT models FROM col').fetchone()[0] or '{}')
+
+    return {int(model_id): [field['name'] for field in sorted(model['flds'], key=lambda field: field['ord'])] for model_id, model in models.items()}
+
+
+
+def read_notes(collection: sqlite3.Connection, field_map: Dict[str, str] = None) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """
+        Yields note numbers and values of the fields of an entry (see pipeline.resolve_fields()) of each note.
+        Audio value is the media name of the first sound of the audio field, or of any field if the audio field is missing.
+    """
+
+    field_names = _field_names(collection=collection)
+    resolved_fields: Dict[int, Dict[str, int]] = {}
+
+    for number, (note_type_id, fields) in enumerate(collection.execute('SELECT mid, flds FROM notes ORDER BY id'), start=1):
+        if note_type_id not in resolved_fields:
+            names = field_names.get(note_type_id, [])
+            positions = {name: position for position, name in enumerate(names)}
+
+            # decks without recognizable field names hold the lexeme and the definition in the first two fields
+            resolved = {field: positions[name] for field, name in resolve_fields(names=names, field_map=field_map).items() if name in positions}
+            resolved.setdefault('lexeme', 0)
+            resolved.setdefault('definition', 1)
+
+            resolved_fields[note_type_id] = resolved
+
+        values = fields.split(FIELD_SEPARATOR)
+        entry = {field: _plain_text(values[position]) for field, position in resolved_fields[note_type_id].items() if position < len(values) and field != 'audio'}
+
+        audio_position = resolved_fields[note_type_id].get('audio')
+        sounds = SOUND_PATTERN.findall(values[audio_position] if audio_position is not None and audio_position < len(values) else fields)
+        entry['audio'] = sounds[0] if sounds else None
+
+        yield number, entry
+
+
+
+def import_apkg_file(vocabulary, f_path: str, reject_path: str, default_category: str = None, field_map: Dict[str, str] = None, audio_manager = None,
+                     batch_size: int = DEF_BATCH_SIZE) -> ImportSummary:
+    """
+        Imports notes of the Anki deck into the vocabulary. Notes without a category field get the default category.
+        Sounds of notes are stored as Pronunciation Clips if an audio manager is provided.
+    """
+
+    source = os.path.basename(f_path)
+
+    with zipfile.ZipFile(f_path) as archive, tempfile.TemporaryDirectory() as tmp_dir, RejectFile(f_path=reject_path) as reject_file:
+        names = set(archive.namelist())
+        collection_name = next((name for name in COLLECTION_NAMES if name in names), None)
+
+        if collection_name is None:
+            raise ValueError(f"File '{f_path}' holds no collection of a supported format, export the deck with 'Support older Anki versions' option.")
+
+        collection_path = os.path.join(tmp_dir, collection_name)
+
+        with archive.open(collection_name) as src_file, open(collection_path, 'wb') as dst_file:
+            shutil.copyfileobj(src_file, dst_file)
+
+        try:
+            media_names: Dict[str, str] = {name: member for member, name in json.loads(archive.read(MEDIA_MAP_NAME)).items()} if MEDIA_MAP_NAME in names else {}
+        except ValueError:
+            media_names = {} # media map of the newest format isn't JSON
+
+        collection = sqlite3.connect(collection_path)
+        parse_rejections = 0
+
+        def batches():
+            nonlocal parse_rejections
+            batch: List[ImportedRow] = []
+
+            for number, values in read_notes(collection=collection, field_map=field_map):
+                if values.get('audio') not in media_names:
+                    values['audio'] = None
+
+                row, reason = deck_row(line=number, values=values, default_category=default_category, max_sentence_char_count=vocabulary.MAX_SENTENCE_CHAR_COUNT)
+
+                if row is None:
+                    reject_file.reject(source=source, line=number, reason=reason, row=FIELD_SEPARATOR.join(str(value) for value in values.values() if value))
+                    parse_rejections += 1
+                    continue
+
+                batch.append(row)
+
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+
+            if batch:
+                yield batch
+
+        try:
+            summary = write_batches(vocabulary=vocabulary, batches=batches(), reject_file=reject_file, source=source, audio_manager=audio_manager,
+                                    read_audio=lambda name: archive.read(media_names[name]))
+        finally:
+            collection.close()
+
+    summary.rejected += parse_rejections
+
+    return summary
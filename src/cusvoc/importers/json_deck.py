@@ -0,0 +1,174 @@
+"""
+    This module provides an importer of JSON decks: files holding a single array of objects, one object per entry.
+
+    The array is read incrementally, the decoder takes one object at a time from a buffer refilled by fixed-size chunks,
+    so memory use doesn't depend on the size of the file. Keys of objects are resolved like fields of other decks
+    (see pipeline.FIELD_ALIASES), an audio value is a path of an audio file, relative to the deck file and within its directory.
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+__all__ = ['DEF_BATCH_SIZE', 'DEF_CHUNK_SIZE', 'iter_array', 'import_json_file']
+
+# --- SYSTEM LIBS ---
+
+from typing import Any, Dict, Iterator, List, TextIO
+import json
+import os
+
+# --- PACKAGE LIBS ---
+
+from importers.pipeline import ImportedRow, RejectFile, ImportSummary, resolve_fields, deck_row, write_batches
+
+
+DEF_BATCH_SIZE = 500
+DEF_CHUNK_SIZE = 1 << 16 # characters read at once
+WHITESPACE = ' \t\r\n'
+
+
+
+def _text(value: Any):
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+def iter_array(src_file: TextIO, chunk_size: int = DEF_CHUNK_SIZE) -> Iterator[Any]:
+    """
+        Yields items of the JSON array the file consists of, without reading the whole file.
+    """
+
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+
+    def fill():
+        # drops the consumed part only when reading more, so the buffer isn't copied after every item
+        nonlocal buffer, position, eof
+        chunk = src_file.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    def skip(characters: str):
+        nonlocal position
+
+        while True:
+            while position < len(buffer) and buffer[position] in characters:
+                position += 1
+
+            if position < len(buffer) or eof:
+                return
+
+            fill()
+
+    skip(WHITESPACE)
+
+    if position >= len(buffer) or buffer[position] != '[':
+        raise ValueError("JSON deck must be an array of objects.")
+
+    position += 1
+    expects_item = True
+
+    while True:
+        skip(WHITESPACE)
+
+        if position >= len(buffer):
+            raise ValueError("Unexpected end of JSON deck.")
+
+        if buffer[position] == ']':
+            return
+
+        if buffer[position] == ',' and not expects_item:
+            position += 1
+            expects_item = True
+            continue
+
+        if not expects_item:
+            raise ValueError(f"Expected ',' or ']' in JSON deck, found '{buffer[position]}'.")
+
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+
+            # a number at the end of the buffer might continue in the next chunk
+            if end == len(buffer) and not eof:
+                fill()
+                continue
+
+            break
+
+        position = end
+        expects_item = False
+
+        yield item
+
+
+
+def import_json_file(vocabulary, f_path: str, reject_path: str, default_category: str = None, field_map: Dict[str, str] = None, audio_manager = None,
+                     batch_size: int = DEF_BATCH_SIZE, chunk_size: int = DEF_CHUNK_SIZE) -> ImportSummary:
+    """
+        Imports objects of the JSON deck into the vocabulary. Objects without a category get the default category.
+        Audio files of objects are stored as Pronunciation Clips if an audio manager is provided.
+    """
+
+    source = os.path.basename(f_path)
+    deck_dir = os.path.dirname(os.path.realpath(f_path))
+
+    def read_audio(path: str):
+        # decks come from third parties, their audio must not point at other files of the user
+        audio_path = os.path.realpath(os.path.join(deck_dir, path))
+
+        if os.path.commonpath([deck_dir, audio_path]) != deck_dir:
+            raise ValueError(f"Audio file '{path}' is outside the directory of the deck.")
+
+        with open(audio_path, 'rb') as audio_file:
+            return audio_file.read()
+
+    with open(f_path, mode='r', encoding='utf-8') as src_file, RejectFile(f_path=reject_path) as reject_file:
+        parse_rejections = 0
+
+        def batches():
+            nonlocal parse_rejections
+            batch: List[ImportedRow] = []
+            resolved: Dict[frozenset, Dict[str, str]] = {} # objects of a deck mostly share the same keys
+
+            for number, item in enumerate(iter_array(src_file=src_file, chunk_size=chunk_size), start=1):
+                if not isinstance(item, dict):
+                    reject_file.reject(source=source, line=number, reason="Item is not an object.", row=json.dumps(item, ensure_ascii=False))
+                    parse_rejections += 1
+                    continue
+
+                keys = frozenset(item)
+
+                if keys not in resolved:
+                    resolved[keys] = resolve_fields(names=keys, field_map=field_map)
+
+                values = {field: _text(item.get(key)) for field, key in resolved[keys].items()}
+                row, reason = deck_row(line=number, values=values, default_category=default_category, max_sentence_char_count=vocabulary.MAX_SENTENCE_CHAR_COUNT)
+
+                if row is None:
+                    reject_file.reject(source=source, line=number, reason=reason, row=json.dumps(item, ensure_ascii=False))
+                    parse_rejections += 1
+                    continue
+
+                batch.append(row)
+
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+
+            if batch:
+                yield batch
+
+        summary = write_batches(vocabulary=vocabulary, batches=batches(), reject_file=reject_file, source=source, audio_manager=audio_manager,
+                                read_audio=read_audio)
+
+    summary.rejected += parse_rejections
+
+    return summary
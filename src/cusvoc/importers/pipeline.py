@@ -0,0 +1,230 @@
+"""
+    This module provides the single-writer stage shared by all importers.
+
+    Importers produce batches of validated rows, the writer drains them into the vocabulary, one transaction per batch.
+    Rows which can't be imported are written into a reject file instead of being printed. Importers of decks with named
+    fields (Anki, JSON) share resolution of field names and validation of rows.
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+__all__ = ['ImportedRow', 'RejectFile', 'ImportSummary', 'FIELD_ALIASES', 'resolve_fields', 'validate_row', 'deck_row', 'write_batches']
+
+# --- SYSTEM LIBS ---
+
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, NamedTuple
+import csv
+
+# --- PACKAGE LIBS ---
+
+from vocabulary import Vocabulary
+from language import GrammaticalCategory, is_sentence, normalize_lexeme
+
+from models.lexeme import Lexeme
+
+
+# field of an entry -> lowercase names of deck fields holding it, the first present one is used
+FIELD_ALIASES: Dict[str, tuple] = {
+    'lexeme': ('lexeme', 'word', 'term', 'expression', 'vocabulary', 'front'),
+    'definition': ('definition', 'meaning', 'translation', 'gloss', 'back'),
+    'category': ('lexical_category', 'category', 'part of speech', 'part_of_speech', 'pos'),
+    'collocate': ('collocate',),
+    'sentence': ('sentence', 'example', 'example sentence', 'usage'),
+    'for_practice': ('for_practice',),
+    'audio': ('audio', 'sound', 'pronunciation')
+}
+
+
+
+class ImportedRow(NamedTuple):
+    """
+        A validated row, compact enough to be cheaply sent between processes.
+    """
+    line: int
+    lexeme: str
+    definition: str
+    category: str
+    collocate: str | None
+    sentence: str | None
+    for_practice: bool
+    pac_file: bool
+    audio: str | None = None # name of an audio file of the imported deck, stored as the Pronunciation Clip of the lexeme
+
+    def fields(self) -> List[str]:
+        """
+            Returns the row as fields of an Entry File (see importers.tsv.ENTRY_FILE_FIELDS), without an ID.
+        """
+        return ['', self.lexeme, self.definition, self.category, self.collocate or '', self.sentence or '', str(int(self.for_practice)), str(int(self.pac_file))]
+
+
+
+class RejectFile():
+    """
+        Tab-separated file of rejected rows with columns: source, line, reason and row.
+        The file is created only when the first row is rejected, unless append is set, rows are appended to an existing file.
+    """
+
+    FIELDS = ['source', 'line', 'reason', 'row']
+
+    def __init__(self, f_path: str, append: bool = False) -> None:
+        self.f_path = f_path
+        self.append = append
+        self.count = 0
+
+        self.__file = None
+        self.__writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def reject(self, source: str, line: int, reason: str, row: str):
+        if self.__file is None:
+            self.__file = open(file=self.f_path, mode='a' if self.append else 'w', encoding='utf-8', newline="")
+            self.__writer = csv.writer(self.__file, delimiter='\t')
+
+            if self.__file.tell() == 0:
+                self.__writer.writerow(self.FIELDS)
+
+        self.__writer.writerow([source, line, reason, row])
+        self.count += 1
+
+    def close(self):
+        if self.__file is not None:
+            self.__file.close()
+
+
+
+@dataclass
+class ImportSummary():
+    imported: int = 0
+    rejected: int = 0
+    PAC_failed: int = 0
+
+
+
+def resolve_fields(names: Iterable[str], field_map: Dict[str, str] = None):
+    """
+        Returns names of deck fields holding each field of an entry. Fields of the field_map override the aliases.
+    """
+
+    by_lowercase = {name.strip().lower(): name for name in names}
+    resolved: Dict[str, str] = {}
+
+    for field, aliases in FIELD_ALIASES.items():
+        for alias in aliases:
+            if alias in by_lowercase:
+                resolved[field] = by_lowercase[alias]
+                break
+
+    resolved.update(field_map or {})
+
+    return resolved
+
+
+def validate_row(lexeme: str, definition: str, category: str, sentence: str | None, max_sentence_char_count: int):
+    """
+        Returns the reason why the row can't be imported, or None if it's valid.
+    """
+
+    if not lexeme or not definition:
+        return "Missing lexeme or definition."
+    elif category not in GrammaticalCategory.__members__:
+        return f"Unknown lexical category '{category}'."
+    elif sentence and not is_sentence(sentence):
+        return "Argument 'sentence' is not a sentence!"
+    elif sentence and len(sentence) > max_sentence_char_count:
+        return "Provided sentence exceeds maximum limit of characters."
+
+    return None
+
+
+def deck_row(line: int, values: Dict[str, str], default_category: str, max_sentence_char_count: int):
+    """
+        Builds a row from values of the fields of an entry (see resolve_fields()). Returns the row and None,
+        or None and the reason of rejection. Sentences of foreign decks often aren't sentences in our sense, those are left out.
+    """
+
+    category = (values.get('category') or default_category or '').strip().upper().replace(' ', '_')
+    sentence = (values.get('sentence') or '').strip() or None
+
+    if sentence is not None and (not is_sentence(sentence) or len(sentence) > max_sentence_char_count):
+        sentence = None
+
+    lexeme = (values.get('lexeme') or '').strip()
+    definition = (values.get('definition') or '').strip()
+    reason = validate_row(lexeme=lexeme, definition=definition, category=category, sentence=sentence, max_sentence_char_count=max_sentence_char_count)
+
+    if reason is not None:
+        return None, reason
+
+    return ImportedRow(line=line, lexeme=lexeme, definition=definition, category=category, collocate=(values.get('collocate') or '').strip() or None,
+                       sentence=sentence, for_practice=str(values.get('for_practice') or '').strip().lower() in ('1', 'true'), pac_file=False,
+                       audio=values.get('audio') or None), None
+
+
+
+def write_batches(vocabulary: Vocabulary, batches: Iterable[List[ImportedRow]], reject_file: RejectFile, source: str, audio_manager = None,
+                  read_audio: Callable[[str], bytes] = None, on_batch: Callable[[], None] = None, delimiter: str = '\t') -> ImportSummary:
+    """
+        Drains batches of validated rows into the vocabulary. Each batch is written in a single transaction,
+        each row in its own savepoint, so a failing row is rejected without discarding the rest of the batch.
+
+        Pronunciation Clips of rows with pac_file flag are created after the batch is committed. Rows with an audio file
+        get it as their Pronunciation Clip instead, its content is read by the read_audio callback, one file at a time.
+        The on_batch callback is called within the transaction of each batch, so progress of the source can be recorded along with it.
+        Rejected rows are written as rows of an Entry File joined by the delimiter, so they can be fixed and imported again.
+    """
+
+    summary = ImportSummary()
+
+    for batch in batches:
+        PAC_rows: List[ImportedRow] = []
+
+        try:
+            with vocabulary.bind(), vocabulary.atomic():
+                for row in batch:
+                    try:
+                        vocabulary.create_lexical_entry(lexeme=row.lexeme,
+                                                        definition=row.definition,
+                                                        category=GrammaticalCategory[row.category],
+                                                        collocate=row.collocate,
+                                                        sentence=row.sentence,
+                                                        for_practice=row.for_practice)
+                    except Exception as e:
+                        reject_file.reject(source=source, line=row.line, reason=str(e), row=delimiter.join(row.fields()))
+                        summary.rejected += 1
+                        continue
+
+                    summary.imported += 1
+
+                    if row.pac_file or (row.audio and read_audio is not None):
+                        PAC_rows.append(row)
+
+                if on_batch is not None:
+                    on_batch()
+        except Exception:
+            # IDs of the rolled back rows might already be cached
+            vocabulary.clear_caches()
+            raise
+
+        if audio_manager is not None:
+            for row in PAC_rows:
+                try:
+                    if row.audio and read_audio is not None:
+                        with vocabulary.bind():
+                            lexeme: Lexeme = Lexeme.get(Lexeme.lookup_key == normalize_lexeme(row.lexeme))
+
+                        if not lexeme.PAC_file_path:
+                            audio_manager.store_PAC(lexeme=lexeme, audio_content=read_audio(row.audio))
+                    else:
+                        audio_manager.create_PAC(lexeme_identifier=row.lexeme)
+                except Exception as e:
+                    reject_file.reject(source=source, line=row.line, reason=f"Pronunciation Clip not created: {e}", row=delimiter.join(row.fields()))
+                    summary.PAC_failed += 1
+
+    return summary
@@ -0,0 +1,187 @@
+"""
+    This module provides a pipelined importer of Entry Files (.tsv, .csv etc.).
+
+    The file is split into byte ranges aligned to line breaks, a process pool parses and validates the ranges
+    and a single writer drains validated batches into the vocabulary while the following ranges are still parsed.
+    Rows of Entry Files must not contain line breaks.
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+__all__ = ['EFF', 'ENTRY_FILE_FIELDS', 'split_byte_ranges', 'parse_byte_range', 'import_entry_file']
+
+# --- SYSTEM LIBS ---
+
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from enum import Enum
+from typing import List, Tuple, Iterator
+import csv
+import io
+import os
+
+# --- PACKAGE LIBS ---
+
+from importers.pipeline import ImportedRow, RejectFile, ImportSummary, validate_row, write_batches
+
+
+
+class EFF(Enum):
+    """
+        EFF stands for Entry File Field
+    """
+    ID = 'ID'
+    lexeme = 'lexeme'
+    definition = 'definition'
+    lexical_category = 'lexical_category'
+    collocate = 'collocate'
+    sentence = 'sentence'
+    for_practice = 'for_practice'
+    pac_file = 'pac_file'
+
+ENTRY_FILE_FIELDS = [field.value for field in EFF]
+
+
+DEF_RANGE_SIZE = 1 << 20 # bytes parsed by a worker at once
+DEF_WORKER_COUNT = os.cpu_count() or 1
+
+Rejection = Tuple[int, str, str] # line, reason, row
+
+
+
+def split_byte_ranges(f_path: str, range_size: int = DEF_RANGE_SIZE, start: int = None, end: int = None) -> List[Tuple[int, int]]:
+    """
+        Splits the file, without its header line, into byte ranges of approximately range_size bytes.
+        Every range starts at the beginning of a line and ends after a line break or at the end of file.
+        Only the part between start and end is split if provided, start must be the beginning of a line.
+    """
+
+    ranges: List[Tuple[int, int]] = []
+
+    with open(file=f_path, mode='rb') as src_file:
+        if start is None:
+            src_file.readline()
+            start = src_file.tell()
+
+        limit = os.fstat(src_file.fileno()).st_size if end is None else end
+
+        while start < limit:
+            src_file.seek(min(start + range_size, limit))
+            src_file.readline()
+            range_end = min(src_file.tell(), limit)
+
+            ranges.append((start, range_end))
+            start = range_end
+
+    return ranges
+
+
+
+def parse_rows(lines: Iterator[str], first_line: int, delimiter: str, max_sentence_char_count: int) -> Tuple[List[ImportedRow], List[Rejection]]:
+    """
+        Parses and validates rows of an Entry File. Returns validated rows and rejected rows.
+    """
+
+    rows: List[ImportedRow] = []
+    rejections: List[Rejection] = []
+
+    for line, fields in enumerate(csv.reader(lines, delimiter=delimiter), start=first_line):
+        if not fields:
+            continue
+
+        fields += [''] * (len(ENTRY_FILE_FIELDS) - len(fields))
+        _, lexeme, definition, category, collocate, sentence, for_practice, pac_file = fields[:len(ENTRY_FILE_FIELDS)]
+        raw_row = delimiter.join(fields)
+
+        reason = validate_row(lexeme=lexeme, definition=definition, category=category, sentence=sentence, max_sentence_char_count=max_sentence_char_count)
+
+        if reason is not None:
+            rejections.append((line, reason, raw_row))
+        elif for_practice not in ('', '0', '1') or pac_file not in ('', '0', '1'):
+            rejections.append((line, "Flags for_practice and pac_file must be 0 or 1.", raw_row))
+        else:
+            rows.append(ImportedRow(line, lexeme, definition, category, collocate or None, sentence or None, for_practice == '1', pac_file == '1'))
+
+    return rows, rejections
+
+
+
+def parse_byte_range(f_path: str, start: int, end: int, delimiter: str, max_sentence_char_count: int) -> Tuple[List[ImportedRow], List[Rejection], int]:
+    """
+        Parses the byte range of the file. Line numbers are relative to the range, the number of lines is returned as well.
+        Runs in worker processes.
+    """
+
+    with open(file=f_path, mode='rb') as src_file:
+        src_file.seek(start)
+        content = src_file.read(end - start).decode('utf-8')
+
+    rows, rejections = parse_rows(lines=io.StringIO(content, newline=''), first_line=0, delimiter=delimiter, max_sentence_char_count=max_sentence_char_count)
+
+    return rows, rejections, content.count('\n') + (not content.endswith('\n'))
+
+
+
+def import_entry_file(vocabulary, f_path: str, delimiter: str, reject_path: str, audio_manager = None, worker_count: int = DEF_WORKER_COUNT,
+                      range_size: int = DEF_RANGE_SIZE) -> ImportSummary:
+    """
+        Imports the Entry File into the vocabulary. Rejected rows are written into the file at reject_path.
+    """
+
+    ranges = split_byte_ranges(f_path=f_path, range_size=range_size)
+    source = os.path.basename(f_path)
+
+    with RejectFile(f_path=reject_path) as reject_file:
+
+        parse_rejections: int = 0
+
+        def parsed_batches(results: Iterator[Tuple[List[ImportedRow], List[Rejection], int]]):
+            nonlocal parse_rejections
+            line_offset = 2 # line 1 is the header
+
+            for rows, rejections, line_count in results:
+                for line, reason, row in rejections:
+                    reject_file.reject(source=source, line=line + line_offset, reason=reason, row=row)
+
+                parse_rejections += len(rejections)
+
+                yield [row._replace(line=row.line + line_offset) for row in rows]
+                line_offset += line_count
+
+        if len(ranges) <= 1 or worker_count <= 1:
+            results = (parse_byte_range(f_path, start, end, delimiter, vocabulary.MAX_SENTENCE_CHAR_COUNT) for start, end in ranges)
+            summary = write_batches(vocabulary=vocabulary, batches=parsed_batches(results), reject_file=reject_file, source=source, audio_manager=audio_manager,
+                                    delimiter=delimiter)
+        else:
+            with ProcessPoolExecutor(max_workers=worker_count) as executor:
+                summary = write_batches(vocabulary=vocabulary, batches=parsed_batches(_parse_ahead(executor, f_path, ranges, delimiter, vocabulary.MAX_SENTENCE_CHAR_COUNT, worker_count)),
+                                        reject_file=reject_file, source=source, audio_manager=audio_manager, delimiter=delimiter)
+
+    summary.rejected += parse_rejections
+
+    return summary
+
+
+
+def _parse_ahead(executor: ProcessPoolExecutor, f_path: str, ranges: List[Tuple[int, int]], delimiter: str, max_sentence_char_count: int, worker_count: int):
+    """
+        Yields parsed ranges in order, keeping at most twice as many ranges in flight as there are workers,
+        so parsing overlaps with writing without buffering the whole file in memory.
+    """
+
+    pending = deque()
+    ranges = iter(ranges)
+
+    for start, end in ranges:
+        pending.append(executor.submit(parse_byte_range, f_path, start, end, delimiter, max_sentence_char_count))
+
+        if len(pending) >= 2 * worker_count:
+            break
+
+    while pending:
+        yield pending.popleft().result()
+
+        for start, end in ranges:
+            pending.append(executor.submit(parse_byte_range, f_path, start, end, delimiter, max_sentence_char_count))
+            break
@@ -5,7 +5,7 @@
     Version: 0.1.0
 """
 
-__all__ = ['ARTICLES', 'COLLOCATES', 'SENTENCE_TERMINALS', 'is_singleword', 'is_sentence', 'GrammaticalCategory', 'LanguageSyntaxError']
+__all__ = ['ARTICLES', 'COLLOCATES', 'SENTENCE_TERMINALS', 'is_singleword', 'is_sentence', 'normalize_lexeme', 'GrammaticalCategory', 'LanguageSyntaxError']
 __author__ = 'fimo_IT'
 __version__ = '0.1.0'
 
@@ -28,6 +28,20 @@ def is_sentence(string: str):
     return string is not None and len(string) > 2 and string[0].isupper() and string[-1] in SENTENCE_TERMINALS
 
 
+def normalize_lexeme(lexeme: str):
+    """
+        Returns the lookup key of the lexeme: casefolded, whitespace collapsed and a leading article stripped,
+        so 'Apple', ' apple ' and 'an apple' are the same lexeme. A lone article stays as it is.
+    """
+
+    words = lexeme.casefold().split()
+
+    if len(words) > 1 and words[0] in ARTICLES:
+        words = words[1:]
+
+    return ' '.join(words)
+
+
 
 class GrammaticalCategory(Enum):
     NOUN = 1
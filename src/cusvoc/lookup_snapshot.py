@@ -0,0 +1,288 @@
+"""
+    This module provides a compact read-only snapshot of lexemes, definitions and Lexical Entries for read-heavy paths.
+
+    The snapshot is a single binary file next to the database file, which is memory-mapped, so opening it costs no parsing
+    and lookups read integer arrays and string pools in place, without creating any model instances. A snapshot records
+    the data version of the vocabulary it was built from (see Vocabulary.data_version()) and is stale once that changes.
+
+    File layout (native byte order, all sections aligned to 8 bytes):
+
+        header                  magic, data version and sizes of the sections below
+        lexeme_ids              sorted ids of lexemes
+        lexeme_offsets          offsets of lexeme strings in the lexeme pool (one more than lexemes)
+        lexeme_order            rows of lexemes sorted by their UTF-8 lookup keys (see language.normalize_lexeme()), for lookups by string
+        definition_ids          sorted ids of definitions
+        definition_offsets      offsets of definitions in the definition pool (one more than definitions)
+        entry_ids               sorted ids of Lexical Entries
+        entry_lexemes           lexeme id of each entry
+        entry_definitions       definition id of each entry
+        entry_categories        lexical category id of each entry
+        entry_lexeme_order      rows of entries sorted by their lexeme ids, for lookups of entries of a lexeme
+        lexeme_pool             UTF-8 strings of lexemes
+        definition_pool         UTF-8 definitions
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+__all__ = ['LookupSnapshot']
+
+# --- SYSTEM LIBS ---
+
+from array import array
+from bisect import bisect_left
+from typing import List, Tuple
+import mmap
+import os
+import struct
+
+# --- PACKAGE LIBS ---
+
+from language import normalize_lexeme
+
+from models.lexeme import Lexeme
+from models.definition import Definition
+from models.lexical_entry import LexicalEntry
+
+
+
+class _KeyView():
+    """
+        Sequence of keys of rows in the provided order, so bisect can search it without building a list.
+    """
+
+    def __init__(self, order: memoryview, key) -> None:
+        self.order = order
+        self.key = key
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, index: int):
+        return self.key(self.order[index])
+
+
+
+class LookupSnapshot():
+    """
+        Memory-mapped snapshot of a vocabulary. Use build() to write one and open() or Vocabulary.lookup_snapshot() to read it.
+    """
+
+    FILE_SUFFIX = '.lookup'
+    MAGIC = b'CUSVOCL2'
+    HEADER = struct.Struct('=8s6q') # magic, data version, lexeme count, definition count, entry count, lexeme pool size, definition pool size
+    ITEM_SIZE = 8
+
+    def __init__(self, f_path: str) -> None:
+        self.f_path = f_path
+
+        with open(f_path, 'rb') as src_file:
+            self.__mmap = mmap.mmap(src_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.data_version, lexeme_count, definition_count, entry_count, lexeme_pool_size, definition_pool_size = self.HEADER.unpack_from(self.__mmap)
+
+        if magic != self.MAGIC:
+            self.__mmap.close()
+            raise ValueError(f"File '{f_path}' is not a lookup snapshot!")
+
+        view = memoryview(self.__mmap)
+        position = self.HEADER.size
+
+        def section(count: int, fmt: str = 'q'):
+            nonlocal position
+            size = count * self.ITEM_SIZE if fmt == 'q' else count
+            part = view[position:position + size]
+            position += _aligned(size)
+            return part.cast(fmt) if fmt == 'q' else part
+
+        self.__lexeme_ids = section(lexeme_count)
+        self.__lexeme_offsets = section(lexeme_count + 1)
+        self.__lexeme_order = section(lexeme_count)
+        self.__definition_ids = section(definition_count)
+        self.__definition_offsets = section(definition_count + 1)
+        self.__entry_ids = section(entry_count)
+        self.__entry_lexemes = section(entry_count)
+        self.__entry_definitions = section(entry_count)
+        self.__entry_categories = section(entry_count)
+        self.__entry_lexeme_order = section(entry_count)
+        self.__lexeme_pool = section(lexeme_pool_size, fmt='B')
+        self.__definition_pool = section(definition_pool_size, fmt='B')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.__entry_ids)
+
+
+    @classmethod
+    def path_of(cls, db_file_path: str):
+        return db_file_path + cls.FILE_SUFFIX
+
+    @classmethod
+    def open(cls, db_file_path: str):
+        """
+            Returns the snapshot of the provided database file, or None if it wasn't built yet (by this version).
+        """
+
+        f_path = cls.path_of(db_file_path)
+
+        try:
+            return cls(f_path) if os.path.exists(f_path) else None
+        except ValueError:
+            # written by another version, it has to be rebuilt
+            return None
+
+
+    @classmethod
+    def build(cls, db_file_path: str, data_version: int):
+        """
+            Writes the snapshot of the database the models are bound to, the file is replaced only when complete.
+            The data must be read within a single read transaction, together with the provided data version.
+        """
+
+        lexemes = list(Lexeme.select(Lexeme.id, Lexeme.string).order_by(Lexeme.id).tuples())
+        definitions = list(Definition.select(Definition.id, Definition.definition).order_by(Definition.id).tuples())
+        entries = list(LexicalEntry.select(LexicalEntry.id, LexicalEntry.lexeme, LexicalEntry.definition, LexicalEntry.lexical_category)
+                                   .order_by(LexicalEntry.id)
+                                   .tuples())
+
+        lexeme_strings = [string.encode('utf-8') for _, string in lexemes]
+        definition_strings = [definition.encode('utf-8') for _, definition in definitions]
+        lexeme_pool, definition_pool = b''.join(lexeme_strings), b''.join(definition_strings)
+
+        sections = [
+            array('q', (lexeme_id for lexeme_id, _ in lexemes)),
+            _offsets(lexeme_strings),
+            array('q', sorted(range(len(lexemes)), key=lambda row: normalize_lexeme(lexemes[row][1]).encode('utf-8'))),
+            array('q', (definition_id for definition_id, _ in definitions)),
+            _offsets(definition_strings),
+            array('q', (entry[0] for entry in entries)),
+            array('q', (entry[1] for entry in entries)),
+            array('q', (entry[2] for entry in entries)),
+            array('q', (entry[3] for entry in entries)),
+            array('q', sorted(range(len(entries)), key=lambda row: (entries[row][1], row))),
+            lexeme_pool,
+            definition_pool
+        ]
+
+        f_path = cls.path_of(db_file_path)
+        tmp_path = f_path + '.tmp'
+
+        with open(tmp_path, 'wb') as dst_file:
+            dst_file.write(cls.HEADER.pack(cls.MAGIC, data_version, len(lexemes), len(definitions), len(entries), len(lexeme_pool), len(definition_pool)))
+
+            for part in sections:
+                data = part.tobytes() if isinstance(part, array) else part
+                dst_file.write(data)
+                dst_file.write(b'\0' * (_aligned(len(data)) - len(data)))
+
+        os.replace(tmp_path, f_path)
+
+        return f_path
+
+
+    def close(self):
+        # views of the mapping must be released before it can be closed
+        for name in [attribute for attribute in vars(self) if attribute.startswith('_LookupSnapshot__') and attribute != '_LookupSnapshot__mmap']:
+            getattr(self, name).release()
+
+        self.__mmap.close()
+
+
+    # --- LOOKUPS --- #
+
+    def lexeme(self, lexeme_id: int):
+        row = _find(self.__lexeme_ids, lexeme_id)
+        return None if row is None else self.__lexeme_string(row)
+
+    def lexeme_id(self, string: str):
+        """
+            Returns id of the lexeme with the same lookup key as the provided string, or None.
+        """
+
+        key = normalize_lexeme(string).encode('utf-8')
+        strings = _KeyView(order=self.__lexeme_order, key=lambda row: normalize_lexeme(self.__lexeme_string(row)).encode('utf-8'))
+        index = bisect_left(strings, key)
+
+        if index < len(strings) and strings[index] == key:
+            return self.__lexeme_ids[self.__lexeme_order[index]]
+
+        return None
+
+    def definition(self, definition_id: int):
+        row = _find(self.__definition_ids, definition_id)
+
+        if row is None:
+            return None
+
+        return bytes(self.__definition_pool[self.__definition_offsets[row]:self.__definition_offsets[row + 1]]).decode('utf-8')
+
+    def entry(self, entry_id: int) -> Tuple[str, str, int] | None:
+        """
+            Returns lexeme, definition and lexical category id of the Lexical Entry, or None.
+        """
+
+        row = _find(self.__entry_ids, entry_id)
+
+        if row is None:
+            return None
+
+        return self.lexeme(self.__entry_lexemes[row]), self.definition(self.__entry_definitions[row]), self.__entry_categories[row]
+
+    def entry_lexemes(self, entry_ids: List[int]):
+        """
+            Returns lexemes of the provided Lexical Entries keyed by entry id, unknown entries are left out.
+        """
+
+        lexemes = {}
+
+        for entry_id in entry_ids:
+            row = _find(self.__entry_ids, entry_id)
+
+            if row is not None:
+                lexemes[entry_id] = self.lexeme(self.__entry_lexemes[row])
+
+        return lexemes
+
+    def entries_of(self, lexeme_id: int):
+        """
+            Returns ids of Lexical Entries of the lexeme.
+        """
+
+        lexeme_ids = _KeyView(order=self.__entry_lexeme_order, key=self.__entry_lexemes.__getitem__)
+        index = bisect_left(lexeme_ids, lexeme_id)
+        entry_ids: List[int] = []
+
+        while index < len(lexeme_ids) and lexeme_ids[index] == lexeme_id:
+            entry_ids.append(self.__entry_ids[self.__entry_lexeme_order[index]])
+            index += 1
+
+        return entry_ids
+
+
+    def __lexeme_bytes(self, row: int):
+        return bytes(self.__lexeme_pool[self.__lexeme_offsets[row]:self.__lexeme_offsets[row + 1]])
+
+    def __lexeme_string(self, row: int):
+        return self.__lexeme_bytes(row).decode('utf-8')
+
+
+
+def _aligned(size: int):
+    return (size + LookupSnapshot.ITEM_SIZE - 1) // LookupSnapshot.ITEM_SIZE * LookupSnapshot.ITEM_SIZE
+
+def _offsets(strings: List[bytes]):
+    offsets = array('q', [0])
+
+    for string in strings:
+        offsets.append(offsets[-1] + len(string))
+
+    return offsets
+
+def _find(ids: memoryview, key: int):
+    index = bisect_left(ids, key)
+    return index if index < len(ids) and ids[index] == key else None
@@ -0,0 +1,181 @@
+"""
+    This package provides versioned migrations of vocabulary database files.
+
+    Each migration is a module named mNNNN_<name>.py, where NNNN is its version. Migrations run in the order of their
+    versions and every run is recorded in the schema_migrations table. A migration module defines:
+
+        upgrade(database, migrator) - required, quick schema changes (e.g. adding a nullable column), run in one transaction
+        BACKFILL_TABLE, backfill(database, first_id, last_id) - optional, fills rows of the table, called for bounded id ranges
+        finalize(database) - optional, run after the backfill (e.g. creating a unique index of the backfilled column),
+                             may return a callback run once its transaction is committed (e.g. removing files)
+
+    Each backfill chunk is committed by its own write transaction together with the position reached, so other
+    writers get their turn in between and an interrupted backfill continues with the next chunk.
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+__all__ = ['Migration', 'MigrationRunner', 'discover_migrations']
+
+# --- SYSTEM LIBS ---
+
+from dataclasses import dataclass
+from datetime import datetime
+from types import ModuleType
+from typing import Callable, List
+import importlib
+import os
+import pkgutil
+import re
+
+# --- EXTERNAL LIBS ---
+
+from peewee import Database
+from playhouse.migrate import SqliteMigrator
+
+# --- PACKAGE LIBS ---
+
+from concurrency import RetryPolicy, write_transaction
+
+from models.schema_migration import SchemaMigration
+
+
+MODULE_PATTERN = re.compile(r'm(\d{4})_(\w+)$')
+DEF_BATCH_SIZE = 5000
+
+
+
+@dataclass
+class Migration():
+    version: int
+    name: str
+    module: ModuleType
+
+    def upgrade(self, database: Database):
+        self.module.upgrade(database, SqliteMigrator(database))
+
+    def has_backfill(self):
+        return hasattr(self.module, 'backfill')
+
+    def backfill(self, database: Database, first_id: int, last_id: int):
+        self.module.backfill(database, first_id, last_id)
+
+    def finalize(self, database: Database):
+        if hasattr(self.module, 'finalize'):
+            return self.module.finalize(database)
+
+        return None
+
+
+
+def discover_migrations():
+    """
+        Returns all migrations of this package ordered by their versions.
+    """
+
+    migrations: List[Migration] = []
+
+    for module_info in pkgutil.iter_modules([os.path.dirname(__file__)]):
+        match = MODULE_PATTERN.match(module_info.name)
+
+        if match is not None:
+            migrations.append(Migration(version=int(match.group(1)), name=match.group(2), module=importlib.import_module(f'{__name__}.{module_info.name}')))
+
+    return sorted(migrations, key=lambda migration: migration.version)
+
+
+
+class MigrationRunner():
+    """
+        Applies pending migrations to a database. Models must be bound to the database (see Vocabulary.bind()).
+
+        Progress of backfills is reported to the progress callback as (migration, done row count, total row count).
+    """
+
+    def __init__(self, database: Database, batch_size: int = DEF_BATCH_SIZE, retry_policy: RetryPolicy = None,
+                 progress: Callable[[Migration, int, int], None] = None) -> None:
+        self.database = database
+        self.batch_size = batch_size
+        self.retry_policy = retry_policy
+        self.progress = progress
+
+        self.migrations = discover_migrations()
+
+
+    def pending(self):
+        self.database.create_tables([SchemaMigration])
+        applied = {version for version, in SchemaMigration.select(SchemaMigration.version).where(SchemaMigration.applied_at.is_null(False)).tuples()}
+
+        return [migration for migration in self.migrations if migration.version not in applied]
+
+
+    def mark_applied(self):
+        """
+            Records all migrations as applied without running them, used for databases created with the current schema.
+        """
+
+        now = datetime.now()
+
+        with write_transaction(database=self.database, policy=self.retry_policy):
+            for migration in self.pending():
+                SchemaMigration.insert(version=migration.version, name=migration.name, started_at=now, applied_at=now).on_conflict_replace().execute()
+
+
+    def migrate(self):
+        """
+            Applies all pending migrations, returns their number.
+        """
+
+        pending = self.pending()
+
+        for migration in pending:
+            # records are read within write transactions, another process might have started or applied the migration meanwhile
+            with write_transaction(database=self.database, policy=self.retry_policy):
+                record = SchemaMigration.get_or_none(SchemaMigration.version == migration.version)
+
+                if record is None:
+                    migration.upgrade(database=self.database)
+                    record = SchemaMigration.create(version=migration.version, name=migration.name, started_at=datetime.now())
+
+            if record.applied_at is not None:
+                continue
+
+            if migration.has_backfill():
+                self.__backfill(migration=migration, record=record)
+
+            with write_transaction(database=self.database, policy=self.retry_policy):
+                if SchemaMigration.get(SchemaMigration.version == migration.version).applied_at is not None:
+                    continue
+
+                on_commit = migration.finalize(database=self.database)
+                SchemaMigration.update(applied_at=datetime.now()).where(SchemaMigration.version == migration.version).execute()
+
+            if on_commit is not None:
+                on_commit()
+
+        return len(pending)
+
+
+    def __backfill(self, migration: Migration, record: SchemaMigration):
+        table = migration.module.BACKFILL_TABLE
+        position = record.position
+
+        done_count, total_count = self.database.execute_sql(f'SELECT count(*) FILTER (WHERE id <= ?), count(*) FROM {table}', (position,)).fetchone()
+
+        while True:
+            last_id, chunk_count = self.database.execute_sql(f'SELECT max(id), count(*) FROM (SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT ?)',
+                                                             (position, self.batch_size)).fetchone()
+
+            if not chunk_count:
+                break
+
+            with write_transaction(database=self.database, policy=self.retry_policy):
+                migration.backfill(database=self.database, first_id=position + 1, last_id=last_id)
+                SchemaMigration.update(position=last_id).where(SchemaMigration.version == migration.version).execute()
+
+            position = last_id
+            done_count += chunk_count
+
+            if self.progress is not None:
+                self.progress(migration, done_count, max(total_count, done_count))
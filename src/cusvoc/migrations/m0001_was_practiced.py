@@ -0,0 +1,26 @@
+"""
+    Adds was_practiced flag of Lexical Entries (formerly the src/migrator.py script).
+
+    The flag is False for entries for practice, which weren't practiced in the current round yet, and NULL for other entries.
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+from peewee import Database, BooleanField
+from playhouse.migrate import SqliteMigrator, migrate
+
+
+BACKFILL_TABLE = 'lexical_entries'
+
+
+
+def upgrade(database: Database, migrator: SqliteMigrator):
+    if 'was_practiced' not in {column.name for column in database.get_columns(BACKFILL_TABLE)}:
+        # no default, so the column is added without rewriting the table, rows get their values by backfill()
+        migrate(migrator.add_column(table=BACKFILL_TABLE, column_name='was_practiced', field=BooleanField(null=True)))
+
+
+def backfill(database: Database, first_id: int, last_id: int):
+    database.execute_sql(f"""UPDATE {BACKFILL_TABLE} SET was_practiced = CASE WHEN for_practice THEN coalesce(was_practiced, 0) END
+                             WHERE id BETWEEN ? AND ?""", (first_id, last_id))
@@ -0,0 +1,127 @@
+"""
+    Adds normalized lookup_key of lexemes (see language.normalize_lexeme()) and its unique index.
+
+    Lexemes whose keys collide (e.g. 'Apple' and 'apple') are merged into the oldest of them before the index is created:
+    their Lexical Entries are moved to it and it takes over a Pronunciation Clip if it has none. Entries which would end up
+    with the same definition are folded into one, like in dedupe.merge_definitions(). Clips of the merged lexemes which
+    weren't taken over are removed after commit.
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+from datetime import datetime
+from functools import partial
+from typing import Dict, List
+import os
+
+from peewee import Database, CharField
+from playhouse.migrate import SqliteMigrator, migrate
+
+from language import normalize_lexeme
+
+
+BACKFILL_TABLE = 'lexemes'
+ENTRY_TABLE = 'lexical_entries'
+INDEX_NAME = 'lexeme_lookup_key' # the name peewee gives to the index of Lexeme.lookup_key
+
+# tables referring to Lexical Entries, the later ones might not exist yet in databases being migrated
+LABEL_TABLE = 'entry_labels'
+ATTEMPT_TABLE = 'test_attempts'
+DAILY_STATS_TABLE = 'daily_attempt_stats'
+CLIP_TABLE = 'pronunciation_clips'
+CLIP_MARKER_PREFIX = 'blob://' # see models.pronunciation_clip.PronunciationClip
+
+
+
+def upgrade(database: Database, migrator: SqliteMigrator):
+    if 'lookup_key' not in {column.name for column in database.get_columns(BACKFILL_TABLE)}:
+        migrate(migrator.add_column(table=BACKFILL_TABLE, column_name='lookup_key', field=CharField(null=True)))
+
+
+def backfill(database: Database, first_id: int, last_id: int):
+    rows = database.execute_sql(f'SELECT id, string FROM {BACKFILL_TABLE} WHERE id BETWEEN ? AND ?', (first_id, last_id)).fetchall()
+    database.cursor().executemany(f'UPDATE {BACKFILL_TABLE} SET lookup_key = ? WHERE id = ?', [(normalize_lexeme(string), lexeme_id) for lexeme_id, string in rows])
+
+
+def finalize(database: Database):
+    collisions = database.execute_sql(f"""SELECT lookup_key, min(id) FROM {BACKFILL_TABLE}
+                                          GROUP BY lookup_key HAVING count(*) > 1""").fetchall()
+
+    tables = set(database.get_tables())
+    now = str(datetime.now()) # the format of peewee DateTimeField
+    removed_PAC_file_paths: List[str] = []
+
+    for lookup_key, kept_id in collisions:
+        database.execute_sql(f"""UPDATE {BACKFILL_TABLE}
+                                 SET PAC_file_path = (SELECT PAC_file_path FROM {BACKFILL_TABLE}
+                                                      WHERE lookup_key = ? AND PAC_file_path IS NOT NULL ORDER BY id != ?, id LIMIT 1)
+                                 WHERE id = ?""", (lookup_key, kept_id, kept_id))
+
+        kept_PAC_file_path, = database.execute_sql(f'SELECT PAC_file_path FROM {BACKFILL_TABLE} WHERE id = ?', (kept_id,)).fetchone()
+        removed_PAC_file_paths.extend(PAC_file_path for PAC_file_path, in database.execute_sql(f"""SELECT PAC_file_path FROM {BACKFILL_TABLE}
+                                                                                                   WHERE lookup_key = ? AND id != ? AND PAC_file_path IS NOT NULL""",
+                                                                                                   (lookup_key, kept_id))
+                                      if PAC_file_path != kept_PAC_file_path)
+
+        # entries of the kept lexeme come first, so they survive folding of entries with the same definition
+        entries = database.execute_sql(f"""SELECT id, definition_id FROM {ENTRY_TABLE}
+                                           WHERE lexeme_id IN (SELECT id FROM {BACKFILL_TABLE} WHERE lookup_key = ?)
+                                           ORDER BY lexeme_id != ?, test_count DESC, id""", (lookup_key, kept_id)).fetchall()
+
+        survivors: Dict[int, int] = {} # definition id -> id of the kept entry
+
+        for entry_id, definition_id in entries:
+            if definition_id not in survivors:
+                survivors[definition_id] = entry_id
+            else:
+                _fold_entry(database=database, tables=tables, survivor_id=survivors[definition_id], duplicate_id=entry_id, now=now)
+
+        # raw updates skip LexicalEntry.save(), updated_at is set here, so delta sync and the distractor index see the change
+        database.execute_sql(f"""UPDATE {ENTRY_TABLE} SET lexeme_id = ?, updated_at = ?
+                                 WHERE lexeme_id IN (SELECT id FROM {BACKFILL_TABLE} WHERE lookup_key = ? AND id != ?)""", (kept_id, now, lookup_key, kept_id))
+        database.execute_sql(f'DELETE FROM {BACKFILL_TABLE} WHERE lookup_key = ? AND id != ?', (lookup_key, kept_id))
+
+    # clips stored in the database are removed along with their lexemes, files only once the removal is committed
+    clip_ids = [int(PAC_file_path[len(CLIP_MARKER_PREFIX):]) for PAC_file_path in removed_PAC_file_paths if PAC_file_path.startswith(CLIP_MARKER_PREFIX)]
+
+    if clip_ids and CLIP_TABLE in tables:
+        database.cursor().executemany(f'DELETE FROM {CLIP_TABLE} WHERE id = ?', [(clip_id,) for clip_id in clip_ids])
+
+    database.execute_sql(f'CREATE UNIQUE INDEX IF NOT EXISTS {INDEX_NAME} ON {BACKFILL_TABLE} (lookup_key)')
+
+    return partial(_remove_files, [PAC_file_path for PAC_file_path in removed_PAC_file_paths if not PAC_file_path.startswith(CLIP_MARKER_PREFIX)])
+
+
+def _fold_entry(database: Database, tables: set, survivor_id: int, duplicate_id: int, now: str):
+    """
+        Moves test counters, answer history and usage labels of the duplicate entry to the survivor and removes the duplicate.
+    """
+
+    database.execute_sql(f"""UPDATE {ENTRY_TABLE}
+                             SET test_count = test_count + (SELECT test_count FROM {ENTRY_TABLE} WHERE id = ?1),
+                                 match_sum = match_sum + (SELECT match_sum FROM {ENTRY_TABLE} WHERE id = ?1),
+                                 updated_at = ?3
+                             WHERE id = ?2""", (duplicate_id, survivor_id, now))
+
+    database.execute_sql(f"""UPDATE {LABEL_TABLE} SET entry_id = ?
+                             WHERE entry_id = ? AND label_id NOT IN (SELECT label_id FROM {LABEL_TABLE} WHERE entry_id = ?)""", (survivor_id, duplicate_id, survivor_id))
+    database.execute_sql(f'DELETE FROM {LABEL_TABLE} WHERE entry_id = ?', (duplicate_id,))
+
+    if ATTEMPT_TABLE in tables:
+        database.execute_sql(f'UPDATE {ATTEMPT_TABLE} SET entry_id = ? WHERE entry_id = ?', (survivor_id, duplicate_id))
+
+    if DAILY_STATS_TABLE in tables:
+        database.execute_sql(f"""INSERT INTO {DAILY_STATS_TABLE} (entry_id, day, attempt_count, score_sum)
+                                 SELECT ?, day, attempt_count, score_sum FROM {DAILY_STATS_TABLE} WHERE entry_id = ?
+                                 ON CONFLICT (entry_id, day) DO UPDATE SET attempt_count = attempt_count + excluded.attempt_count,
+                                                                           score_sum = score_sum + excluded.score_sum""", (survivor_id, duplicate_id))
+        database.execute_sql(f'DELETE FROM {DAILY_STATS_TABLE} WHERE entry_id = ?', (duplicate_id,))
+
+    database.execute_sql(f'DELETE FROM {ENTRY_TABLE} WHERE id = ?', (duplicate_id,))
+
+
+def _remove_files(f_paths: List[str]):
+    for f_path in f_paths:
+        if os.path.exists(f_path):
+            os.remove(f_path)
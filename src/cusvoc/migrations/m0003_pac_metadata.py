@@ -0,0 +1,35 @@
+"""
+    Adds size (bytes) and duration (seconds) of Pronunciation Clips of lexemes.
+
+    Sizes of existing clips are read from their files, durations are known only for clips normalized by the audio pipeline
+    (see audio_pipeline.py), so they stay NULL until the clips are transcoded.
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+import os
+
+from peewee import Database, IntegerField, FloatField
+from playhouse.migrate import SqliteMigrator, migrate
+
+
+BACKFILL_TABLE = 'lexemes'
+
+
+
+def upgrade(database: Database, migrator: SqliteMigrator):
+    columns = {column.name for column in database.get_columns(BACKFILL_TABLE)}
+
+    if 'PAC_size' not in columns:
+        migrate(migrator.add_column(table=BACKFILL_TABLE, column_name='PAC_size', field=IntegerField(null=True)))
+
+    if 'PAC_duration' not in columns:
+        migrate(migrator.add_column(table=BACKFILL_TABLE, column_name='PAC_duration', field=FloatField(null=True)))
+
+
+def backfill(database: Database, first_id: int, last_id: int):
+    rows = database.execute_sql(f"""SELECT id, PAC_file_path FROM {BACKFILL_TABLE}
+                                    WHERE id BETWEEN ? AND ? AND PAC_file_path IS NOT NULL""", (first_id, last_id)).fetchall()
+    database.cursor().executemany(f'UPDATE {BACKFILL_TABLE} SET PAC_size = ? WHERE id = ?',
+                                  [(os.path.getsize(f_path), lexeme_id) for lexeme_id, f_path in rows if os.path.isfile(f_path)])
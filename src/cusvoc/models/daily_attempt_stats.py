@@ -0,0 +1,58 @@
+from peewee import ForeignKeyField, IntegerField, FloatField
+
+from models.dynamic_model import DynamicModel
+from models.lexical_entry import LexicalEntry
+from models.test_attempt import TestAttempt
+
+
+
+class DailyAttemptStats(DynamicModel):
+    """
+        Number and score sum of test attempts of a single Lexical Entry per day (days since unix epoch, UTC).
+
+        Rows are maintained by an SQLite trigger on test_attempts table, so learning curves never scan the whole history.
+        Use rebuild() if the table ever gets out of sync.
+    """
+
+    entry = ForeignKeyField(LexicalEntry, backref='daily_stats', index=False)
+    day = IntegerField()
+
+    attempt_count = IntegerField(default=0)
+    score_sum = FloatField(default=0)
+
+    class Meta:
+        indexes = (
+            (('entry', 'day'), True),
+            (('day',), False),
+        )
+
+
+    @classmethod
+    def create_triggers(cls):
+        stats = cls._meta.table_name
+        attempts = TestAttempt._meta.table_name
+
+        cls._meta.database.execute_sql(f"""
+            CREATE TRIGGER IF NOT EXISTS {stats}_attempt_insert AFTER INSERT ON {attempts}
+            BEGIN
+                INSERT INTO {stats} (entry_id, day, attempt_count, score_sum) VALUES (NEW.entry_id, NEW.ts / 86400, 1, NEW.score)
+                ON CONFLICT (entry_id, day) DO UPDATE SET attempt_count = attempt_count + 1, score_sum = score_sum + excluded.score_sum;
+            END""")
+
+
+    @classmethod
+    def rebuild(cls):
+        """
+            Recomputes the whole table from test_attempts table.
+        """
+        stats = cls._meta.table_name
+        attempts = TestAttempt._meta.table_name
+
+        with cls._meta.database.atomic():
+            cls.delete().execute()
+            cls._meta.database.execute_sql(f"""
+                INSERT INTO {stats} (entry_id, day, attempt_count, score_sum)
+                SELECT entry_id, ts / 86400, COUNT(*), SUM(score)
+                FROM {attempts}
+                GROUP BY entry_id, ts / 86400
+            """)
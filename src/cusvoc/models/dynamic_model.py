@@ -1,21 +1,73 @@
-from peewee import Model, Database
+from contextlib import contextmanager
+from threading import local
+from peewee import Model, Database, DatabaseProxy
 import os, sys
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 
+
+class DatabaseRouter(DatabaseProxy):
+    """
+        A database proxy which routes queries to the database bound to the current thread.
+
+        Databases are bound via bind() context manager, bindings of different threads never interfere.
+        If no database is bound in the current thread, the default one set via initialize() is used.
+    """
+
+    __slots__ = ('_local', '_default')
+
+    def __init__(self):
+        self._local = local()
+        super().__init__()
+
+    def __setattr__(self, attr, value):
+        object.__setattr__(self, attr, value)
+
+    @property
+    def obj(self):
+        stack = getattr(self._local, 'stack', None)
+        return stack[-1] if stack else self._default
+
+    @obj.setter
+    def obj(self, db: Database):
+        self._default = db
+
+    @contextmanager
+    def bind(self, db: Database):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+
+        self._local.stack.append(db)
+
+        try:
+            yield db
+        finally:
+            self._local.stack.pop()
+
+
+
+DATABASE_ROUTER = DatabaseRouter()
+
+
+
 class DynamicModel(Model):
     """A base model that dynamically assigns the database."""
 
+    class Meta:
+        database = DATABASE_ROUTER
+
     @classmethod
     def set_database(cls, db: Database):
-        cls._meta.database = db
-    
+        # models are shared by all vocabularies, the database only becomes the default one of the router
+        DATABASE_ROUTER.initialize(db)
+
     @classmethod
     def set_table_name(cls, name: str):
-        cls._meta.table_name = name
+        if cls._meta.table_name != name:
+            cls._meta.table_name = name
 
     @classmethod
     def connect_db(cls, db: Database, table_name: str):  # Ensure cls is the first argument
         cls.set_database(db=db)  # Use cls instead of DynamicModel
-        cls.set_table_name(name=table_name)
\ No newline at end of file
+        cls.set_table_name(name=table_name)
@@ -0,0 +1,18 @@
+from peewee import CharField, IntegerField, DateTimeField
+
+from models.dynamic_model import DynamicModel
+
+
+
+class ImportedFile(DynamicModel):
+    """
+        Progress of a watched Entry File (see watch module): the byte offset and number of lines ingested so far
+        and a fingerprint of the ingested content, which tells an appended file from a replaced one.
+    """
+
+    path = CharField(primary_key=True)
+
+    offset = IntegerField(default=0)
+    line = IntegerField(default=0)
+    fingerprint = CharField()
+    ingested_at = DateTimeField()
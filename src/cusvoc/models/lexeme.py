@@ -1,9 +1,20 @@
-from peewee import CharField
+from peewee import CharField, IntegerField, FloatField
 
 from models.dynamic_model import DynamicModel
+from language import normalize_lexeme
 
 class Lexeme(DynamicModel):
     # owner = ForeignKeyField('Person', backref='lexemes')
     string = CharField(unique=True)
+    lookup_key = CharField(unique=True) # see language.normalize_lexeme(), all lookups by string use this column
     example_sentence = CharField(null=True)
-    PAC_file_path = CharField(null=True)
\ No newline at end of file
+    PAC_file_path = CharField(null=True)
+    PAC_size = IntegerField(null=True) # bytes
+    PAC_duration = FloatField(null=True) # seconds, known for clips normalized by audio_pipeline
+
+    def save(self, *args, **kwargs):
+        # kept in sync with the string on every write, instances selected without the string leave it alone
+        if self.string is not None:
+            self.lookup_key = normalize_lexeme(self.string)
+
+        return super(Lexeme, self).save(*args, **kwargs)
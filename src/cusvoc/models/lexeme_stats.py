@@ -0,0 +1,97 @@
+from peewee import ForeignKeyField, IntegerField, FloatField
+
+from models.dynamic_model import DynamicModel
+from models.lexeme import Lexeme
+from models.lexical_entry import LexicalEntry
+
+
+
+class LexemeStats(DynamicModel):
+    """
+        Summary of all Lexical Entries of a single Lexeme.
+
+        Rows are maintained by SQLite triggers on lexemes and lexical_entries tables, so reading the statistics
+        of the whole vocabulary requires no aggregation. Use rebuild() if the table ever gets out of sync.
+    """
+
+    lexeme = ForeignKeyField(Lexeme, primary_key=True, backref='stats')
+
+    entry_count = IntegerField(default=0)
+    total_test_count = IntegerField(default=0)
+    match_sum = FloatField(default=0)
+
+
+    @classmethod
+    def create_triggers(cls):
+        stats = cls._meta.table_name
+        lexemes = Lexeme._meta.table_name
+        entries = LexicalEntry._meta.table_name
+
+        triggers = [
+            f"""CREATE TRIGGER IF NOT EXISTS {stats}_lexeme_insert AFTER INSERT ON {lexemes}
+                BEGIN
+                    INSERT OR IGNORE INTO {stats} (lexeme_id, entry_count, total_test_count, match_sum) VALUES (NEW.id, 0, 0, 0);
+                END""",
+
+            f"""CREATE TRIGGER IF NOT EXISTS {stats}_lexeme_delete AFTER DELETE ON {lexemes}
+                BEGIN
+                    DELETE FROM {stats} WHERE lexeme_id = OLD.id;
+                END""",
+
+            f"""CREATE TRIGGER IF NOT EXISTS {stats}_entry_insert AFTER INSERT ON {entries}
+                BEGIN
+                    INSERT OR IGNORE INTO {stats} (lexeme_id, entry_count, total_test_count, match_sum) VALUES (NEW.lexeme_id, 0, 0, 0);
+                    UPDATE {stats}
+                    SET entry_count = entry_count + 1,
+                        total_test_count = total_test_count + NEW.test_count,
+                        match_sum = match_sum + NEW.match_sum
+                    WHERE lexeme_id = NEW.lexeme_id;
+                END""",
+
+            f"""CREATE TRIGGER IF NOT EXISTS {stats}_entry_delete AFTER DELETE ON {entries}
+                BEGIN
+                    UPDATE {stats}
+                    SET entry_count = entry_count - 1,
+                        total_test_count = total_test_count - OLD.test_count,
+                        match_sum = match_sum - OLD.match_sum
+                    WHERE lexeme_id = OLD.lexeme_id;
+                END""",
+
+            # updates of unrelated columns (e.g. was_tested flags) don't fire this trigger
+            f"""CREATE TRIGGER IF NOT EXISTS {stats}_entry_update AFTER UPDATE OF lexeme_id, test_count, match_sum ON {entries}
+                BEGIN
+                    UPDATE {stats}
+                    SET entry_count = entry_count - 1,
+                        total_test_count = total_test_count - OLD.test_count,
+                        match_sum = match_sum - OLD.match_sum
+                    WHERE lexeme_id = OLD.lexeme_id;
+                    INSERT OR IGNORE INTO {stats} (lexeme_id, entry_count, total_test_count, match_sum) VALUES (NEW.lexeme_id, 0, 0, 0);
+                    UPDATE {stats}
+                    SET entry_count = entry_count + 1,
+                        total_test_count = total_test_count + NEW.test_count,
+                        match_sum = match_sum + NEW.match_sum
+                    WHERE lexeme_id = NEW.lexeme_id;
+                END""",
+        ]
+
+        for trigger in triggers:
+            cls._meta.database.execute_sql(trigger)
+
+
+    @classmethod
+    def rebuild(cls):
+        """
+            Recomputes the whole table from lexemes and lexical_entries tables.
+        """
+        stats = cls._meta.table_name
+        lexemes = Lexeme._meta.table_name
+        entries = LexicalEntry._meta.table_name
+
+        with cls._meta.database.atomic():
+            cls.delete().execute()
+            cls._meta.database.execute_sql(f"""
+                INSERT INTO {stats} (lexeme_id, entry_count, total_test_count, match_sum)
+                SELECT l.id, COUNT(e.id), COALESCE(SUM(e.test_count), 0), COALESCE(SUM(e.match_sum), 0)
+                FROM {lexemes} AS l LEFT OUTER JOIN {entries} AS e ON e.lexeme_id = l.id
+                GROUP BY l.id
+            """)
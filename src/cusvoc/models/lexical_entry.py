@@ -28,7 +28,7 @@ class LexicalEntry(DynamicModel):
     was_practiced = BooleanField(null=True)
     
     created_at = DateTimeField()
-    updated_at = DateTimeField()
+    updated_at = DateTimeField(index=True) # used by delta sync exports
     tested_at = DateTimeField(null=True)
 
     def save(self, *args, **kwargs):
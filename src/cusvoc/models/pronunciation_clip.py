@@ -0,0 +1,37 @@
+from peewee import BlobField, CharField, Value
+
+from models.dynamic_model import DynamicModel
+
+
+
+class PronunciationClip(DynamicModel):
+    """
+        Audio of a Pronunciation Clip stored in the database (see PhoneticsAudioManager storage). A lexeme refers to its clip
+        by a marker in place of the file path, 'blob://<id>', so clips of both storages can coexist.
+    """
+
+    MARKER_PREFIX = 'blob://'
+
+    content = BlobField()
+    extension = CharField()
+
+
+    @classmethod
+    def marker(cls, clip_id: int):
+        return f'{cls.MARKER_PREFIX}{clip_id}'
+
+    @classmethod
+    def marker_expression(cls):
+        # the marker as an SQL expression, e.g. for matching lexemes with their clips
+        return Value(cls.MARKER_PREFIX).concat(cls.id)
+
+    @classmethod
+    def id_of(cls, PAC_file_path: str | None):
+        """
+            Returns id of the clip the path refers to, or None if it is a path of a file.
+        """
+
+        if PAC_file_path and PAC_file_path.startswith(cls.MARKER_PREFIX):
+            return int(PAC_file_path[len(cls.MARKER_PREFIX):])
+
+        return None
@@ -0,0 +1,20 @@
+from peewee import IntegerField, CharField, DateTimeField
+
+from models.dynamic_model import DynamicModel
+
+
+
+class SchemaMigration(DynamicModel):
+    """
+        Record of a migration of the vocabulary schema (see migrations package), one row per migration version.
+
+        A migration whose schema change is done, but whose backfill isn't complete yet, has no applied_at and
+        position holds the id of the last backfilled row, so an interrupted backfill continues where it stopped.
+    """
+
+    version = IntegerField(primary_key=True)
+    name = CharField()
+
+    position = IntegerField(default=0)
+    started_at = DateTimeField()
+    applied_at = DateTimeField(null=True)
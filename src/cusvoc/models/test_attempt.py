@@ -0,0 +1,32 @@
+from peewee import ForeignKeyField, IntegerField, SmallIntegerField, FloatField, TextField
+
+from models.dynamic_model import DynamicModel
+from models.lexical_entry import LexicalEntry
+
+
+
+class TestAttempt(DynamicModel):
+    """
+        Append-only history of answers, one row per submitted question.
+
+        Timestamps are unix seconds and scores are match ratios between 0 and 1. Mode is a set of MODE_* bit flags.
+        Rows are never updated, Tester inserts them in batches.
+    """
+
+    MODE_NORMAL = 0
+    MODE_PRACTICE = 1
+    MODE_CHOICE = 2
+    MODE_REVERSE = 4
+
+    # the (entry, ts) index below serves lookups by entry as well
+    entry = ForeignKeyField(LexicalEntry, backref='attempts', index=False)
+
+    ts = IntegerField()
+    score = FloatField()
+    mode = SmallIntegerField(default=MODE_NORMAL)
+    answer = TextField(null=True)
+
+    class Meta:
+        indexes = (
+            (('entry', 'ts'), False),
+        )
@@ -0,0 +1,51 @@
+from typing import Dict, List
+
+from peewee import CharField
+
+from models.dynamic_model import DynamicModel
+
+
+
+class VocabularyState(DynamicModel):
+    """
+        Key-value store of internal state of a vocabulary (e.g. sync watermarks).
+    """
+
+    DATA_VERSION_KEY = 'data_version'
+    PRACTICE_VERSION_KEY = 'practice_version'
+
+    key = CharField(primary_key=True)
+    value = CharField(null=True)
+
+
+    @classmethod
+    def get_value(cls, key: str, default: str = None):
+        state = cls.get_or_none(cls.key == key)
+        return state.value if state is not None else default
+
+    @classmethod
+    def set_value(cls, key: str, value: str):
+        cls.insert(key=key, value=value).on_conflict_replace().execute()
+
+
+    @classmethod
+    def create_data_version_triggers(cls, watched_columns: Dict[str, List[str]], key: str = DATA_VERSION_KEY):
+        """
+            Creates triggers incrementing the value of the key (data_version by default) whenever a row of the provided tables
+            is inserted or deleted, or any of the provided columns of a row is updated. Unlike PRAGMA data_version, the value persists
+            and is the same for all connections, so readers of derived data (e.g. lookup_snapshot) can tell it is stale.
+        """
+
+        state = cls._meta.table_name
+        increment = f"""INSERT INTO {state} (key, value) VALUES ('{key}', 1)
+                       ON CONFLICT (key) DO UPDATE SET value = value + 1;"""
+
+        # triggers of data_version keep their original names, so existing databases don't get them twice
+        prefix = state if key == cls.DATA_VERSION_KEY else f'{state}_{key}'
+
+        for table, columns in watched_columns.items():
+            for event in ['INSERT', 'DELETE', f"UPDATE OF {', '.join(columns)}"]:
+                cls._meta.database.execute_sql(f"""CREATE TRIGGER IF NOT EXISTS {prefix}_{table}_{event.split()[0].lower()} AFTER {event} ON {table}
+                                                   BEGIN
+                                                       {increment}
+                                                   END""")
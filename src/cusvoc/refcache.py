@@ -0,0 +1,120 @@
+"""
+    This module provides in-process caches used by Vocabulary to skip database round-trips when creating entries.
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+__all__ = ['LRUCache', 'ReferenceCache']
+
+# --- SYSTEM LIBS ---
+
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Hashable, Any
+
+# --- PACKAGE LIBS ---
+
+from models.lexical_category import LexicalCategoryModel
+from models.collocate import Collocate
+from models.usage_label import UsageLabelModel
+
+
+
+class LRUCache():
+    """
+        Bounded mapping which discards the least recently used item when full. Safe to share between threads.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.__items: OrderedDict = OrderedDict()
+        self.__lock = Lock()
+
+    def __len__(self):
+        return len(self.__items)
+
+    def __contains__(self, key: Hashable):
+        return key in self.__items
+
+    def get(self, key: Hashable, default: Any = None):
+        with self.__lock:
+            if key not in self.__items:
+                return default
+
+            self.__items.move_to_end(key)
+            return self.__items[key]
+
+    def put(self, key: Hashable, value: Any):
+        with self.__lock:
+            self.__items[key] = value
+            self.__items.move_to_end(key)
+
+            if len(self.__items) > self.max_size:
+                self.__items.popitem(last=False)
+
+    def clear(self):
+        with self.__lock:
+            self.__items.clear()
+
+
+
+class ReferenceCache():
+    """
+        Keeps IDs of lexical categories, collocates and usage labels keyed by their names.
+
+        These tables are seeded and rarely change, so they are loaded only once, on first access.
+        Call invalidate() after any write to them which did not go through this cache.
+        Models must be bound to the database of the owning Vocabulary when the cache is accessed.
+    """
+
+    def __init__(self) -> None:
+        self.__categories: Dict[str, int] = None
+        self.__collocates: Dict[str, int] = None
+        self.__labels: Dict[str, int] = None
+        self.__lock = Lock()
+
+    def __load(self):
+        with self.__lock:
+            categories = {category: id for id, category in LexicalCategoryModel.select(LexicalCategoryModel.id, LexicalCategoryModel.category).tuples()}
+            collocates = {collocate: id for id, collocate in Collocate.select(Collocate.id, Collocate.collocate).tuples()}
+            labels = {label: id for id, label in UsageLabelModel.select(UsageLabelModel.id, UsageLabelModel.label).tuples()}
+
+            self.__categories, self.__collocates, self.__labels = categories, collocates, labels
+
+        return categories, collocates, labels
+
+    def invalidate(self):
+        self.__categories = self.__collocates = self.__labels = None
+
+    # dicts are read into local variables first, another thread may invalidate the cache meanwhile
+
+    def category_id(self, category: str):
+        categories = self.__categories
+
+        if categories is None:
+            categories = self.__load()[0]
+
+        return categories[category]
+
+    def collocate_id(self, collocate: str):
+        collocates = self.__collocates
+
+        if collocates is None:
+            collocates = self.__load()[1]
+
+        return collocates.get(collocate)
+
+    def add_collocate(self, collocate: str, id: int):
+        collocates = self.__collocates
+
+        if collocates is not None:
+            collocates[collocate] = id
+
+    def label_id(self, label: str):
+        labels = self.__labels
+
+        if labels is None:
+            labels = self.__load()[2]
+
+        return labels[label]
@@ -0,0 +1,185 @@
+"""
+    This module provides incremental synchronization of vocabularies via Entry Files.
+
+    Exports write only entries updated since the previous export into the same file (a watermark is stored in the vocabulary).
+    Imports compare a hash of each row with the matching local entry and write only new or changed entries,
+    so importing the same file twice changes nothing. Removed entries are not synchronized.
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+__all__ = ['SyncSummary', 'export_changes', 'import_changes']
+
+# --- SYSTEM LIBS ---
+
+from dataclasses import dataclass
+from hashlib import blake2b
+from typing import Dict, Literal
+import csv
+import os
+
+# --- EXTERNAL LIBS ---
+
+from peewee import JOIN, Tuple, chunked
+
+# --- PACKAGE LIBS ---
+
+from vocabulary import Vocabulary
+from language import GrammaticalCategory, normalize_lexeme
+from importers.tsv import EFF, ENTRY_FILE_FIELDS
+from importers.pipeline import RejectFile
+
+from models.lexeme import Lexeme
+from models.definition import Definition
+from models.lexical_category import LexicalCategoryModel
+from models.collocate import Collocate
+from models.lexical_entry import LexicalEntry
+from models.vocabulary_state import VocabularyState
+
+
+WATERMARK_KEY_PREFIX = 'export_watermark:'
+DEF_BATCH_SIZE = 500
+
+
+
+@dataclass
+class SyncSummary():
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    rejected: int = 0
+
+
+
+def _entry_query():
+    return (LexicalEntry.select(LexicalEntry, Lexeme, Definition, LexicalCategoryModel, Collocate)
+                .join(Lexeme).switch(LexicalEntry)
+                .join(Definition).switch(LexicalEntry)
+                .join(LexicalCategoryModel).switch(LexicalEntry)
+                .join(Collocate, JOIN.LEFT_OUTER))
+
+
+def _row_hash(lexeme: str, definition: str, category: str, collocate: str | None, sentence: str | None, for_practice: bool):
+    # spellings of the same lexeme (see language.normalize_lexeme()) don't count as a change, they would be stored as the same lexeme anyway
+    content = '\x1f'.join([normalize_lexeme(lexeme), definition, category, collocate or '', sentence or '', '1' if for_practice else '0'])
+    return blake2b(content.encode('utf-8'), digest_size=16).digest()
+
+
+def _entry_hash(entry: LexicalEntry):
+    return _row_hash(lexeme=entry.lexeme.string,
+                     definition=entry.definition.definition,
+                     category=entry.lexical_category.category,
+                     collocate=entry.collocate.collocate if entry.collocate_id else None,
+                     sentence=entry.sentence,
+                     for_practice=entry.for_practice)
+
+
+
+def export_changes(vocabulary: Vocabulary, f_path: str, delimiter: str):
+    """
+        Writes entries updated after the watermark of this file into the file and moves the watermark.
+        The first export of a file writes all entries. Returns the number of exported entries.
+    """
+
+    watermark_key = WATERMARK_KEY_PREFIX + os.path.abspath(f_path)
+
+    with vocabulary.bind():
+        watermark = VocabularyState.get_value(watermark_key)
+        query = _entry_query().order_by(LexicalEntry.updated_at)
+
+        if watermark is not None:
+            query = query.where(LexicalEntry.updated_at > watermark)
+
+        exported_count = 0
+        last_updated_at = None
+
+        with open(file=f_path, mode='w', encoding='utf-8', newline="") as dst_file:
+            writer = csv.DictWriter(f=dst_file, fieldnames=ENTRY_FILE_FIELDS, delimiter=delimiter)
+            writer.writeheader()
+
+            for entry in query.iterator():
+                writer.writerow({
+                    EFF.ID.value : entry.id,
+                    EFF.lexeme.value : entry.lexeme.string,
+                    EFF.definition.value : entry.definition.definition,
+                    EFF.lexical_category.value : entry.lexical_category.category,
+                    EFF.collocate.value : entry.collocate.collocate if entry.collocate_id else "",
+                    EFF.sentence.value : entry.sentence,
+                    EFF.for_practice.value : int(entry.for_practice),
+                    EFF.pac_file.value : 1 if entry.lexeme.PAC_file_path else 0
+                })
+
+                exported_count += 1
+                last_updated_at = entry.updated_at
+
+        # the watermark moves only after the file was written successfully
+        if last_updated_at is not None:
+            VocabularyState.set_value(watermark_key, str(last_updated_at))
+
+    return exported_count
+
+
+
+def import_changes(vocabulary: Vocabulary, f_path: str, delimiter: str, reject_path: str, key: Literal['natural', 'id'] = 'natural',
+                   batch_size: int = DEF_BATCH_SIZE):
+    """
+        Upserts entries of the Entry File into the vocabulary, skipping rows equal to their local entries.
+
+        Rows are matched with local entries either by their lexeme and definition ('natural' key),
+        or by the exported ID column ('id' key), in which case lexeme and definition of a local entry can change as well.
+    """
+
+    summary = SyncSummary()
+    source = os.path.basename(f_path)
+
+    with open(file=f_path, mode='r', encoding='utf-8', newline="") as src_file, RejectFile(f_path=reject_path) as reject_file, vocabulary.bind():
+        reader = csv.DictReader(src_file, delimiter=delimiter, fieldnames=ENTRY_FILE_FIELDS)
+        next(reader)
+
+        for batch in chunked(enumerate(reader, start=2), batch_size):
+            if key == 'id':
+                ids = [int(row[EFF.ID.value]) for _, row in batch if row[EFF.ID.value].isdigit()]
+                local_entries: Dict = {entry.id: entry for entry in _entry_query().where(LexicalEntry.id.in_(ids))}
+            else:
+                natural_keys = [(normalize_lexeme(row[EFF.lexeme.value]), row[EFF.definition.value]) for _, row in batch]
+                local_entries: Dict = {(entry.lexeme.lookup_key, entry.definition.definition): entry
+                                       for entry in _entry_query().where(Tuple(Lexeme.lookup_key, Definition.definition).in_(natural_keys))}
+
+            try:
+                with vocabulary.atomic():
+                    for line, row in batch:
+                        try:
+                            collocate = row[EFF.collocate.value] or None
+                            sentence = row[EFF.sentence.value] or None
+                            for_practice = row[EFF.for_practice.value] == '1'
+                            category = GrammaticalCategory[row[EFF.lexical_category.value]]
+
+                            if key == 'id':
+                                entry = local_entries.get(int(row[EFF.ID.value])) if row[EFF.ID.value].isdigit() else None
+                            else:
+                                entry = local_entries.get((normalize_lexeme(row[EFF.lexeme.value]), row[EFF.definition.value]))
+
+                            if entry is None:
+                                vocabulary.create_lexical_entry(lexeme=row[EFF.lexeme.value], definition=row[EFF.definition.value], category=category,
+                                                                collocate=collocate, sentence=sentence, for_practice=for_practice)
+                                summary.created += 1
+
+                            elif _entry_hash(entry=entry) != _row_hash(lexeme=row[EFF.lexeme.value], definition=row[EFF.definition.value], category=category.name,
+                                                                        collocate=collocate, sentence=sentence, for_practice=for_practice):
+                                vocabulary.update_lexical_entry(ID=entry.id, lexeme=row[EFF.lexeme.value], definition=row[EFF.definition.value], category=category,
+                                                                collocate=collocate, sentence=sentence, for_practice=for_practice)
+                                summary.updated += 1
+
+                            else:
+                                summary.unchanged += 1
+
+                        except Exception as e:
+                            reject_file.reject(source=source, line=line, reason=str(e), row=delimiter.join(str(value) for value in row.values()))
+                            summary.rejected += 1
+            except Exception:
+                # IDs of the rolled back rows might already be cached
+                vocabulary.clear_caches()
+                raise
+
+    return summary
@@ -1,13 +1,17 @@
 import Levenshtein
 from typing import List, Dict, Literal
+from peewee import fn, Case
 import random
-from peewee import _transaction
 from datetime import datetime
+import time
 
-from vocabulary import Vocabulary, ContraintViolationError
+from vocabulary import Vocabulary, ContraintViolationError, bound
+from weighted_sampler import WeightedSampler
 
+from models.lexeme import Lexeme
+from models.definition import Definition
 from models.lexical_entry import LexicalEntry
-# from models.lexeme import Lexeme
+from models.test_attempt import TestAttempt
 
 
 def get_match_ratio(user_input, correct_lexeme, threshold=0.8):
@@ -40,20 +44,32 @@ class QuestionNotFound(Exception):
 
 
 class TestQuestion():
-
-    def __init__(self, meaning: str, lexeme: str, mode: Literal['normal', 'for_practice'] = 'normal') -> None:
+    """
+        A single question of a test. It carries everything needed for grading, so answering and submitting it
+        doesn't touch the database, results are written back by Tester in batches.
+    """
+
+    __slots__ = ('__entry_id', '__definition_id', '__meaning', '__lexeme', '__sentence', '__mode', '__is_reversed', '__choices',
+                 '__answer', '__is_submitted', '__evaluation', '__match_ratio')
+
+    def __init__(self, meaning: str, lexeme: str, mode: Literal['normal', 'for_practice'] = 'normal', entry_id: int = None, sentence: str = None,
+                 definition_id: int = None, is_reversed: bool = False) -> None:
+        """
+            A reversed question asks for the meaning of the lexeme instead of the lexeme of the meaning.
+        """
+        self.__entry_id = entry_id
+        self.__definition_id = definition_id
+        self.__is_reversed = is_reversed
         self.__meaning = meaning
-        # self.__lexeme = lexeme
-        self.__answer = None
         self.__lexeme = lexeme
-        self.__is_submitted = False
-        self.__evaluation: float = None
+        self.__sentence = sentence
         self.__mode = mode
+        self.__choices: List[str] = None
 
-        
-    
-    # def get_instance_id(self):
-    #     return self.__meaning.get_id()
+        self.__answer = None
+        self.__is_submitted = False
+        self.__evaluation: float = None
+        self.__match_ratio: float = None
 
 
 
@@ -71,38 +87,64 @@ class TestQuestion():
         if not self.__is_submitted:
             return None
         
-        return self.__lexeme
+        return self.__meaning if self.__is_reversed else self.__lexeme
+
+    def get_user_answer(self):
+        return self.__answer
     
     def ask(self):
-        return self.__meaning
+        return self.__lexeme if self.__is_reversed else self.__meaning
+
+    def is_reversed(self):
+        return self.__is_reversed
+
+    def get_definition_id(self):
+        return self.__definition_id
+
+    def get_entry_id(self):
+        return self.__entry_id
+
+    def get_sentence(self):
+        return self.__sentence
 
-    # def get_question(self):
-    #     return self.__lexeme
+    def set_choices(self, distractors: List[str]):
+        """
+            Turns the question into a multiple-choice one, the expected lexeme is placed among the distractors at random.
+        """
+        self.__choices = [*distractors, self.__lexeme]
+        random.shuffle(self.__choices)
+
+    def get_choices(self):
+        return self.__choices
         
         
     def evaluate(self, match_ratio: float):
         if not self.__is_submitted:
             return False
 
-        self.__evaluation = match_ratio
+        self.__match_ratio = match_ratio
+        self.__evaluation = round(match_ratio * 100, 2)
         return True
     
     def get_evaluation(self):
         return self.__evaluation
+
+    def get_match_ratio(self):
+        return self.__match_ratio
     
     def get_mode(self):
         return self.__mode
 
-    
-
-
-
-
-
 
 
 class Tester():
     MAX_QUESTION_BUFFER_SIZE = 1000
+    ATTEMPT_FLUSH_SIZE = 50 # answers are written into test_attempts table in batches of this size
+
+    # weights of for-practice entries, see __get_practice_questions()
+    PRACTICE_MIN_WEIGHT = 0.05 # well-known entries are still asked now and then
+    PRACTICE_RECENCY_DAYS = 30.0 # entries not tested for this long (or never) have their weight doubled
+    PRACTICE_REBUILD_AGE = 3600.0 # seconds, weights of the sampler are recomputed at least this often as entries age
 
     ############# CONSTRUCTOR #############
 
@@ -115,7 +157,11 @@ class Tester():
 
                                                     # expected lexeme, sentence
         # self.__pending_questions: Dict[TestQuestion, tuple[str, str]] = {}
-        self.__question_buffer: Dict[TestQuestion, tuple[LexicalEntry, Literal['clear', 'set']]] = {}
+        self.__question_buffer: Dict[TestQuestion, Literal['clear', 'set']] = {}
+        self.__attempt_buffer: List[tuple[TestQuestion, int]] = [] # submitted questions and unix times of their submission
+        self.__distractor_index = None # created on first multiple-choice test
+        self.__definition_vectors = None # created on first reverse test
+        self.__sampler: WeightedSampler = None # created on first test with for-practice entries
 
         self.__clear_was_tested_flag()
 
@@ -128,67 +174,90 @@ class Tester():
         self.__question_buffer.clear()
 
 
+    @bound
     def submit_questions(self):
         
-        
-        # try:
-            for question  in self.__question_buffer.keys():
-                
-                self.submit_question(question=question)
+        for question in list(self.__question_buffer.keys()):
+            self.submit_question(question=question)
 
+        self.flush_attempts()
 
-            
-    def submit_question(self, question: TestQuestion):
 
-        if not question in self.__question_buffer:
-            raise QuestionNotFound(message="Provided question not found in question buffer!")
-        
-        question.submit()
-        # question.
+    @bound
+    def flush_attempts(self):
+        """
+            Writes all submitted answers into the test_attempts table and adds them to test counters of their entries, in a single transaction.
+            Must be called at the end of a testing session, otherwise up to ATTEMPT_FLUSH_SIZE answers stay unsaved.
+        """
 
-         
-        
+        if not self.__attempt_buffer:
+            return 0
 
-        entry, op = self.__question_buffer[question]
-    
-        match_ratio, accepted = get_match_ratio(user_input=question.get_answer(), correct_lexeme=entry.lexeme.string)
+        # entry id -> number of answers, sum of their match ratios, time of the last answer
+        counters: Dict[int, List] = {}
 
-        with _transaction(db=self.vocabulary.database()):
-            # entry: LexicalEntry = LexicalEntry.get_by_id(question.get_instance_id())
-            # entry = self.__question_buffer[question]
-        
-            entry.test_count += 1
+        for question, ts in self.__attempt_buffer:
+            counter = counters.setdefault(question.get_entry_id(), [0, 0.0, ts])
+            counter[0] += 1
+            counter[1] += question.get_match_ratio()
+            counter[2] = max(counter[2], ts)
 
-            if question.get_mode() == 'normal':
-                entry.was_tested = True 
-            else:
-                entry.was_practiced = True
+        with self.vocabulary.atomic():
+            practice_version = self.vocabulary.practice_version()
+
+            TestAttempt.insert_many([{'entry': question.get_entry_id(),
+                                      'ts': ts,
+                                      'score': question.get_match_ratio(),
+                                      'mode': (TestAttempt.MODE_NORMAL if question.get_mode() == 'normal' else TestAttempt.MODE_PRACTICE) |
+                                              (TestAttempt.MODE_CHOICE if question.get_choices() else 0) |
+                                              (TestAttempt.MODE_REVERSE if question.is_reversed() else 0),
+                                      'answer': question.get_user_answer()} for question, ts in self.__attempt_buffer]).execute()
+
+            # only the changed columns are written, counters are incremented by the database itself
+            for entry_id, (test_count, match_sum, ts) in counters.items():
+                LexicalEntry.update({LexicalEntry.test_count: LexicalEntry.test_count + test_count,
+                                     LexicalEntry.match_sum: LexicalEntry.match_sum + match_sum,
+                                     LexicalEntry.tested_at: datetime.fromtimestamp(ts)}).where(LexicalEntry.id == entry_id).execute()
+
+            self.__update_practice_sampler(entry_ids=list(counters), practice_version=practice_version)
+
+        attempt_count = len(self.__attempt_buffer)
+        self.__attempt_buffer.clear()
+
+        self.__clear_was_tested_flag()
 
+        return attempt_count
 
-            entry.match_sum += match_ratio
-            entry.tested_at = datetime.now()
 
-            entry.save()
+            
+    @bound
+    def submit_question(self, question: TestQuestion):
+        """
+            Grades the answer of the question. The result is written into database by the next flush_attempts() call.
+        """
 
+        if not question in self.__question_buffer:
+            raise QuestionNotFound(message="Provided question not found in question buffer!")
+        
+        question.submit()
 
-        # self.__cursor.execute("""
-        #     UPDATE lexical_entries
-        #     SET test_count = test_count + 1,
-        #         tested = 1,
-        #         total_match_ratio = total_match_ratio + ?
-        #     WHERE id = ?
-        #     """, (match_ratio, question.get_instance_id()))
+        if question.get_choices():
+            # a chosen distractor is wrong, however similar its spelling is
+            match_ratio = 1.0 if question.get_user_answer() == question.get_answer() else 0.0
+        elif question.is_reversed():
+            match_ratio = max(0.0, self.__definition_vectors.score(definition_id=question.get_definition_id(), answer=question.get_user_answer() or ""))
+        else:
+            match_ratio, accepted = get_match_ratio(user_input=question.get_user_answer() or "", correct_lexeme=question.get_answer())
 
-        # self.conn.commit()
+        question.evaluate(match_ratio=match_ratio)
 
         self.__question_buffer.pop(question)
+        self.__attempt_buffer.append((question, int(time.time())))
 
-        self.__clear_was_tested_flag()
+        if len(self.__attempt_buffer) >= self.ATTEMPT_FLUSH_SIZE:
+            self.flush_attempts()
 
-        question.evaluate(match_ratio=round(match_ratio * 100, 2))
-        return entry
-    
-        # return correct_answer, match_ratio, sentence
+        return question
 
 
 
@@ -259,78 +328,96 @@ class Tester():
     # def __weighted_choice(self, entries, weights):
     #     return random.choices(entries, weights=weights, k=1)[0]
     
-    def __create_question(self, entry: LexicalEntry, undo_op: Literal['clear', 'set']):
-        question = TestQuestion(meaning=entry.definition.definition, lexeme=entry.lexeme.string)
-        self.__question_buffer[question] = (entry, undo_op)
+    def __create_question(self, entry_id: int, definition_id: int, lexeme: str, definition: str, sentence: str, mode: Literal['normal', 'for_practice'],
+                          is_reversed: bool, undo_op: Literal['clear', 'set']):
+        question = TestQuestion(meaning=definition, lexeme=lexeme, mode=mode, entry_id=entry_id, sentence=sentence, definition_id=definition_id, is_reversed=is_reversed)
+        self.__question_buffer[question] = undo_op
         return question
 
 
-    def __get_questions(self, count: int, field_name: Literal['was_tested', 'was_practiced']):
+    def __get_questions(self, count: int, field_name: Literal['was_tested', 'was_practiced'], selected_ids: List[int], is_reversed: bool = False):
         field = getattr(LexicalEntry, field_name)
-        # print(field)
-        # print(f"Entries: {len(LexicalEntry.select())}")
-        candidate_entries = LexicalEntry.select().where(LexicalEntry.for_practice == True) if field_name == 'was_practiced' else LexicalEntry.select()
+        mode: Literal['normal', 'for_practice'] = 'for_practice' if field_name == 'was_practiced' else 'normal'
 
-        questions: List[TestQuestion] = []
-        
-        print(count)
-        # print(f"Entries: {len(candidate_entries)}")
+        # everything a question needs is fetched by a single query, no related rows are loaded later
+        candidate_entries = (LexicalEntry.select(LexicalEntry.id, LexicalEntry.definition, Lexeme.string, Definition.definition, LexicalEntry.sentence)
+                             .join(Lexeme).switch(LexicalEntry)
+                             .join(Definition))
+
+        if field_name == 'was_practiced':
+            candidate_entries = candidate_entries.where(LexicalEntry.for_practice == True)
 
-        if len(candidate_entries) < count:
+        if candidate_entries.count() < count:
             raise ContraintViolationError(message="Required test amount exceeds the number of entries for practice in database.")
-        # print(count)
+
+        questions: List[TestQuestion] = []
         undo_op: Literal['clear', 'set'] = 'clear'
         
         while count:
-            # for_practice_entries.wher
-            untested_candidates = list(candidate_entries.where(field == False))
-            print(untested_candidates)
-            for entry in untested_candidates:
-                if field == 'was_practiced':
-                    entry.was_practiced = True
-                else:
-                    entry.was_tested = True
-            
-            LexicalEntry.bulk_update(untested_candidates, fields=[field])
+            untested_candidates = list(candidate_entries.where((field == False) & LexicalEntry.id.not_in(selected_ids))
+                                                        .order_by(fn.Random())
+                                                        .limit(count)
+                                                        .tuples())
 
+            ids = [entry_id for entry_id, *_ in untested_candidates]
 
-            # candidates.extend(untested_for_practice_entries)
+            if ids:
+                LexicalEntry.update({field: True}).where(LexicalEntry.id.in_(ids)).execute()
 
-            # if len(entries) < expected_entry_count:
-            #     raise ContraintViolationError(message="Required test amount exceeds the number of entries for practice in database.")
+            for entry_id, definition_id, lexeme, definition, sentence in untested_candidates:
+                questions.append(self.__create_question(entry_id=entry_id, definition_id=definition_id, lexeme=lexeme, definition=definition, sentence=sentence,
+                                                        mode=mode, is_reversed=is_reversed, undo_op=undo_op))
 
-            random.shuffle(untested_candidates)
-
-            actual_entry_count = min(count, len(untested_candidates))
+            selected_ids.extend(ids)
+            count -= len(untested_candidates)
             
-            # number_of_tests -= actual_entry_count
-            count -= actual_entry_count
-
-            for i in range(actual_entry_count):
-                
-                questions.append(self.__create_question(entry=untested_candidates[i], undo_op=undo_op))
-            
-            # all for-practice entries have been tested, reset was_practiced flags
+            # all candidates have been tested, reset their flags, except for the ones already selected
             if count:
-                # entries = LexicalEntry.select().where(for_practice == True)
-                LexicalEntry.update({field:False}).where(field == True)
+                LexicalEntry.update({field: False}).where((field == True) & LexicalEntry.id.not_in(selected_ids)).execute()
                 undo_op = 'set'
 
-                # for entry in entries:
-                #     entry.was_practiced = False
-        
-                # LexicalEntry.bulk_update(entries)
-            
-        # print(questions)    
         return questions
 
-        # number_of_tests -= expected_entry_count
 
-        # entries.clear()
 
+    def __get_practice_questions(self, count: int, selected_ids: List[int], is_reversed: bool = False):
+        """
+            Draws for-practice entries without replacement, each with probability proportional to its weight,
+            i.e. to its difficulty and time since it was tested last, see __practice_sampler().
+        """
+
+        ids = self.__practice_sampler().sample(count=count, exclude=selected_ids)
+
+        if len(ids) < count:
+            raise ContraintViolationError(message="Required test amount exceeds the number of entries for practice in database.")
+
+        if not ids:
+            return []
+
+        # practiced entries are still flagged, so the number of entries practiced since the last reset stays known
+        LexicalEntry.update({LexicalEntry.was_practiced: True}).where(LexicalEntry.id.in_(ids)).execute()
+
+        entries = {entry_id: entry for entry_id, *entry in (LexicalEntry.select(LexicalEntry.id, LexicalEntry.definition, Lexeme.string, Definition.definition, LexicalEntry.sentence)
+                                                                         .join(Lexeme).switch(LexicalEntry)
+                                                                         .join(Definition)
+                                                                         .where(LexicalEntry.id.in_(ids))
+                                                                         .tuples())}
+        selected_ids.extend(ids)
 
+        return [self.__create_question(entry_id=entry_id, definition_id=definition_id, lexeme=lexeme, definition=definition, sentence=sentence,
+                                       mode='for_practice', is_reversed=is_reversed, undo_op='clear')
+                for entry_id, (definition_id, lexeme, definition, sentence) in ((entry_id, entries[entry_id]) for entry_id in ids)]
 
-    def test_vocabulary(self, number_of_tests: int, for_practice: int = 0, practice_mode: Literal['number', 'percentage'] = 'number'):
+
+
+    @bound
+    def test_vocabulary(self, number_of_tests: int, for_practice: int = 0, practice_mode: Literal['number', 'percentage'] = 'number', choice_count: int = 0,
+                        reverse: bool = False):
+        """
+            Returns new questions. If choice_count is provided, each question offers that many distractors besides the expected lexeme.
+            Reverse questions ask for definitions of lexemes, answers are scored by similarity of their words with the definition.
+            For-practice entries are drawn at random, weighted by how badly they are known and how long ago they were tested.
+        """
 
         
 
@@ -340,8 +427,11 @@ class Tester():
         
         if number_of_tests > self.MAX_QUESTION_BUFFER_SIZE:
             raise IllegalTesterState(message=f"Number of tests exceeds maximum limit ({self.MAX_QUESTION_BUFFER_SIZE})!")
+
+        if choice_count and reverse:
+            raise IllegalTesterState(message="Reverse tests cannot be multiple-choice ones!")
         
-        with self.vocabulary.database().atomic() as transaction:
+        with self.vocabulary.atomic() as transaction:
             try:
                 total_entry_count = self.vocabulary.lexical_entry_count()
 
@@ -354,13 +444,16 @@ class Tester():
                     raise IllegalTesterState(message=f"Number of tests exceeds the total number of entries in database ({total_entry_count})")
 
                 new_questions: List[TestQuestion] = []
+                selected_ids: List[int] = [] # an entry is never asked twice in a single test
                 # entries: List[LexicalEntry] = []
 
                 if for_practice:
-                    new_questions.extend(self.__get_questions(count=int((number_of_tests / 100) * for_practice) if practice_mode == 'percentage' else for_practice, field_name='was_practiced'))
+                    new_questions.extend(self.__get_practice_questions(count=int((number_of_tests / 100) * for_practice) if practice_mode == 'percentage' else for_practice,
+                                                                       selected_ids=selected_ids, is_reversed=reverse))
                     number_of_tests -= len(new_questions)
 
-                new_questions.extend(self.__get_questions(count=number_of_tests, field_name='was_tested'))
+                if number_of_tests:
+                    new_questions.extend(self.__get_questions(count=number_of_tests, field_name='was_tested', selected_ids=selected_ids, is_reversed=reverse))
                     # expected_entry_count = int((number_of_tests / 100) * for_practice) if practice_mode == 'percentage' else for_practice
 
 
@@ -449,11 +542,77 @@ class Tester():
 
                     # number_of_tests -= 1
 
+            if choice_count:
+                self.__set_choices(questions=new_questions, choice_count=choice_count)
+
+            if reverse:
+                self.__update_definition_vectors()
+
             return new_questions
 
 
     ############## PRIVATE API ################
 
+    def __update_definition_vectors(self):
+        if self.__definition_vectors is None:
+            try:
+                from definition_vectors import DefinitionVectors
+            except ImportError:
+                raise ImportError("Reverse tests require the numpy library!")
+
+            self.__definition_vectors = DefinitionVectors(db_file_path=self.vocabulary.db_file_path)
+
+        self.__definition_vectors.update()
+
+
+    def __set_choices(self, questions: List[TestQuestion], choice_count: int):
+        if self.__distractor_index is None:
+            try:
+                from distractors import DistractorIndex
+            except ImportError:
+                raise ImportError("Multiple-choice tests require the numpy library!")
+
+            self.__distractor_index = DistractorIndex(db_file_path=self.vocabulary.db_file_path)
+
+        self.__distractor_index.update()
+        distractors = self.__distractor_index.distractors(entry_ids=[question.get_entry_id() for question in questions], count=choice_count,
+                                                          snapshot=self.vocabulary.lookup_snapshot())
+
+        for question in questions:
+            question.set_choices(distractors=distractors[question.get_entry_id()])
+
+    def __practice_weight(self):
+        # difficulty is the missing part of the average match ratio, untested entries are the most difficult
+        difficulty = fn.MAX(self.PRACTICE_MIN_WEIGHT, Case(None, [(LexicalEntry.test_count > 0, 1 - LexicalEntry.match_sum / LexicalEntry.test_count)], 1.0))
+        days_untested = fn.MIN(self.PRACTICE_RECENCY_DAYS, fn.COALESCE(fn.julianday('now', 'localtime') - fn.julianday(LexicalEntry.tested_at),
+                                                                       self.PRACTICE_RECENCY_DAYS))
+
+        return difficulty * (1 + days_untested / self.PRACTICE_RECENCY_DAYS)
+
+    def __practice_sampler(self):
+        # rebuilt whenever test results or for-practice flags were changed by someone else, see __update_practice_sampler()
+        practice_version = self.vocabulary.practice_version()
+        sampler = self.__sampler
+
+        if sampler is None or sampler.version != practice_version or time.monotonic() - sampler.built_at > self.PRACTICE_REBUILD_AGE:
+            # rows of the raw cursor, weights of a million entries are loaded without constructing a peewee row for each
+            weights = self.vocabulary.database().execute(LexicalEntry.select(LexicalEntry.id, self.__practice_weight()).where(LexicalEntry.for_practice == True))
+            sampler = WeightedSampler(weights=weights.fetchall(), version=practice_version)
+            self.__sampler = sampler
+
+        return sampler
+
+    def __update_practice_sampler(self, entry_ids: List[int], practice_version: int):
+        # must run within the transaction which changed the entries, practice_version is the one from before the changes
+        if self.__sampler is None or self.__sampler.version != practice_version:
+            return
+
+        self.__sampler.set_weights(weights=LexicalEntry.select(LexicalEntry.id, self.__practice_weight())
+                                                       .where((LexicalEntry.for_practice == True) & LexicalEntry.id.in_(entry_ids))
+                                                       .tuples())
+        self.__sampler.version = self.vocabulary.practice_version()
+
+    @bound
     def __clear_was_tested_flag(self):
 
         entry_count = LexicalEntry.select().where(LexicalEntry.was_tested == True).count()
@@ -461,7 +620,7 @@ class Tester():
         # self.vocabulary.lexical_entry_count()
 
         if entry_count == self.vocabulary.lexical_entry_count():
-            with _transaction(db=self.vocabulary.database()):
+            with self.vocabulary.atomic():
 
                 LexicalEntry.update(was_tested=False).execute()
 
@@ -470,7 +629,7 @@ class Tester():
         # self.vocabulary.lexical_entry_count()
 
         if entry_count == LexicalEntry.select().where(LexicalEntry.for_practice == True).count():
-            with _transaction(db=self.vocabulary.database()):
+            with self.vocabulary.atomic():
 
                 LexicalEntry.update(was_practiced=False).execute()
 
@@ -489,41 +648,4 @@ class Tester():
         # if count_tested == total_rows and total_rows > 0:
         #     # Reset all rows to tested = 0
         #     self.__cursor.execute("UPDATE lexical_entries SET was_tested = 0")
-        #     self.conn.commit()        
-
-    
-
-    def __extract_questions(self, lexical_entries: List[LexicalEntry], question_no: int):
-        random.shuffle(lexical_entries)
-
-    
-
-        questions: List[TestQuestion] = []
-
-        for entry in lexical_entries:
-            question = TestQuestion(meaning=entry.definition.definition, lexeme=entry.lexeme.string)
-            
-            # question = TestQuestion(LexicalEntry(string=self.vocabulary.get_definition(ID=int(instance[2])),
-            #                                       lexical_category=self.vocabulary.get_lexical_category(ID=int(instance[3])),
-            #                                     collocate=self.vocabulary.get_collocate(ID=int(instance[4])) if instance[4] else None,
-            #                                     sentence=instance[5],
-            #                                     id=instance[0],
-            #                                     test_count=int(instance[6]),
-            #                                     was_tested=bool(instance[7]),
-            #                                     total_match_ratio=float(instance[8])))
-            
-            self.__question_buffer[question] = entry
-            # self.__question_buffer.append(question)
-            # self.__pending_questions[question] = (self.vocabulary.get_lexeme(ID=int(instance[1])), instance[5])
-
-            questions.append(question)
-
-            question_no -= 1
-
-            if not question_no:
-                return questions
-        
-        return questions
-
-
-    
\ No newline at end of file
+        #     self.conn.commit()
@@ -0,0 +1,237 @@
+"""
+    This module provides vectorization of short texts and a nearest-neighbor index of such vectors (numpy library).
+
+    Texts are turned into hashed n-gram count vectors, so a vector of a text never depends on other texts
+    and indexes built from them can be updated incrementally.
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+__all__ = ['DEF_DIMENSION', 'word_tokens', 'char_ngrams', 'count_vectors', 'normalize_rows', 'idf_weights', 'NeighborIndex']
+
+# --- SYSTEM LIBS ---
+
+from typing import Iterable, List, Dict
+import os
+import re
+import zlib
+
+# --- EXTERNAL LIBS ---
+
+import numpy as np
+
+
+DEF_DIMENSION = 256
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+
+def word_tokens(text: str):
+    return WORD_PATTERN.findall(text.lower())
+
+
+def char_ngrams(text: str, n: int = 3):
+    padded = f' {text.lower()} '
+    return [padded[i:i + n] for i in range(len(padded) - n + 1)]
+
+
+def count_vectors(documents: Iterable[Iterable[str]], dimension: int = DEF_DIMENSION):
+    """
+        Returns a float32 matrix with one row per document, features are hashed into the provided number of columns.
+        The hash is stable across processes (unlike built-in hash()), so stored vectors stay comparable with new ones.
+    """
+
+    documents = list(documents)
+    rows: List[int] = []
+    columns: List[int] = []
+
+    for row, features in enumerate(documents):
+        for feature in features:
+            rows.append(row)
+            columns.append(zlib.crc32(feature.encode('utf-8')) % dimension)
+
+    matrix = np.zeros((len(documents), dimension), dtype=np.float32)
+    np.add.at(matrix, (rows, columns), 1)
+
+    return matrix
+
+
+def normalize_rows(matrix: np.ndarray):
+    """
+        Scales rows to unit length in place, so dot products of rows are their cosine similarities. Zero rows are kept.
+    """
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    matrix /= norms
+
+    return matrix
+
+
+def idf_weights(document_frequencies: np.ndarray, document_count: int):
+    """
+        Returns smoothed inverse document frequencies of hashed features, rare features weigh more.
+    """
+
+    return (np.log((1 + document_count) / (1 + document_frequencies)) + 1).astype(np.float32)
+
+
+
+class NeighborIndex():
+    """
+        Keeps keys of the most similar vectors of each indexed vector, only vectors of the same group are compared.
+
+        Vectors must be normalized, similarity is their dot product. New vectors are compared with all indexed ones
+        block by block, neighbor lists of already indexed vectors are merged with the new candidates, so
+        the index is built only once and each update costs time proportional to the number of new vectors.
+    """
+
+    DEF_NEIGHBOR_COUNT = 16
+    DEF_BLOCK_SIZE = 256
+
+    def __init__(self, dimension: int = DEF_DIMENSION, neighbor_count: int = DEF_NEIGHBOR_COUNT, block_size: int = DEF_BLOCK_SIZE) -> None:
+        self.dimension = dimension
+        self.neighbor_count = neighbor_count
+        self.block_size = block_size
+        self.attributes: Dict[str, str] = {}
+
+        self.keys = np.empty(0, dtype=np.int64)
+        self.groups = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, dimension), dtype=np.float32)
+        self.neighbors = np.empty((0, neighbor_count), dtype=np.int64) # keys of neighbors, -1 if missing
+        self.scores = np.empty((0, neighbor_count), dtype=np.float32) # similarities in descending order, -inf if missing
+
+        self.__rows: Dict[int, int] = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key: int):
+        return key in self.__row_map()
+
+
+    def neighbors_of(self, key: int):
+        """
+            Returns keys of the most similar vectors, the most similar first.
+        """
+
+        row = self.__row_map().get(key)
+
+        if row is None:
+            return []
+
+        return [int(neighbor) for neighbor in self.neighbors[row] if neighbor >= 0]
+
+
+    def add(self, keys: Iterable[int], groups: Iterable[int], vectors: np.ndarray):
+        start = len(self)
+
+        self.keys = np.concatenate([self.keys, np.asarray(keys, dtype=np.int64)])
+        self.groups = np.concatenate([self.groups, np.asarray(groups, dtype=np.int64)])
+        self.vectors = np.concatenate([self.vectors, np.asarray(vectors, dtype=np.float32)])
+        self.neighbors = np.concatenate([self.neighbors, np.full((len(self) - start, self.neighbor_count), -1, dtype=np.int64)])
+        self.scores = np.concatenate([self.scores, np.full((len(self) - start, self.neighbor_count), -np.inf, dtype=np.float32)])
+        self.__rows = None
+
+        for block_start in range(start, len(self), self.block_size):
+            block = np.arange(block_start, min(block_start + self.block_size, len(self)))
+            similarities = self.__similarities(rows=block)
+
+            # new rows get complete neighbor lists, old rows only merge the new candidates
+            self.__set_neighbors(rows=block, similarities=similarities)
+            self.__merge_neighbors(rows=np.arange(start), candidates=block, similarities=similarities[:, :start].T)
+
+
+    def remove(self, keys: Iterable[int]):
+        removed = np.isin(self.keys, np.asarray(list(keys), dtype=np.int64))
+
+        if not removed.any():
+            return
+
+        removed_keys = self.keys[removed]
+        kept = ~removed
+
+        self.keys, self.groups, self.vectors = self.keys[kept], self.groups[kept], self.vectors[kept]
+        self.neighbors, self.scores = self.neighbors[kept], self.scores[kept]
+        self.__rows = None
+
+        # rows which lost a neighbor are recomputed, the others are still complete
+        affected = np.flatnonzero(np.isin(self.neighbors, removed_keys).any(axis=1))
+
+        for block_start in range(0, len(affected), self.block_size):
+            block = affected[block_start:block_start + self.block_size]
+            self.__set_neighbors(rows=block, similarities=self.__similarities(rows=block))
+
+
+    def save(self, f_path: str):
+        # the file is replaced only when complete, readers never see a torn index
+        tmp_path = f_path + '.tmp'
+
+        with open(tmp_path, 'wb') as index_file:
+            np.savez(index_file, keys=self.keys, groups=self.groups, vectors=self.vectors, neighbors=self.neighbors, scores=self.scores,
+                     attribute_names=np.array(list(self.attributes.keys()), dtype=str), attribute_values=np.array(list(self.attributes.values()), dtype=str))
+
+        os.replace(tmp_path, f_path)
+
+    @classmethod
+    def load(cls, f_path: str, block_size: int = DEF_BLOCK_SIZE):
+        with np.load(f_path) as data:
+            index = cls(dimension=data['vectors'].shape[1], neighbor_count=data['neighbors'].shape[1], block_size=block_size)
+
+            index.keys, index.groups, index.vectors = data['keys'], data['groups'], data['vectors']
+            index.neighbors, index.scores = data['neighbors'], data['scores']
+            index.attributes = dict(zip(data['attribute_names'].tolist(), data['attribute_values'].tolist()))
+
+        return index
+
+
+    def __row_map(self):
+        if self.__rows is None:
+            self.__rows = {int(key): row for row, key in enumerate(self.keys)}
+
+        return self.__rows
+
+    def __similarities(self, rows: np.ndarray):
+        similarities = self.vectors[rows] @ self.vectors.T
+        similarities[self.groups[rows, None] != self.groups[None, :]] = -np.inf
+        similarities[np.arange(len(rows)), rows] = -np.inf
+
+        return similarities
+
+    def __set_neighbors(self, rows: np.ndarray, similarities: np.ndarray):
+        k = min(self.neighbor_count, similarities.shape[1])
+
+        if not k:
+            return
+
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        self.__store(rows=rows, keys=self.keys[top], scores=np.take_along_axis(similarities, top, axis=1))
+
+    def __merge_neighbors(self, rows: np.ndarray, candidates: np.ndarray, similarities: np.ndarray):
+        if not len(rows):
+            return
+
+        # only rows for which some candidate beats their weakest neighbor are touched
+        improved = similarities.max(axis=1) > self.scores[rows, -1]
+        rows, similarities = rows[improved], similarities[improved]
+
+        if not len(rows):
+            return
+
+        keys = np.concatenate([self.neighbors[rows], np.broadcast_to(self.keys[candidates], similarities.shape)], axis=1)
+        scores = np.concatenate([self.scores[rows], similarities], axis=1)
+
+        top = np.argpartition(-scores, self.neighbor_count - 1, axis=1)[:, :self.neighbor_count]
+        self.__store(rows=rows, keys=np.take_along_axis(keys, top, axis=1), scores=np.take_along_axis(scores, top, axis=1))
+
+    def __store(self, rows: np.ndarray, keys: np.ndarray, scores: np.ndarray):
+        order = np.argsort(-scores, axis=1, kind='stable')
+        keys, scores = np.take_along_axis(keys, order, axis=1), np.take_along_axis(scores, order, axis=1)
+        keys[np.isneginf(scores)] = -1
+
+        k = keys.shape[1]
+        self.neighbors[rows] = -1
+        self.scores[rows] = -np.inf
+        self.neighbors[rows, :k] = keys
+        self.scores[rows, :k] = scores
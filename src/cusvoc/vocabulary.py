@@ -2,8 +2,11 @@
 
 from typing import List, Literal, Iterable
 from dataclasses import dataclass
+from functools import wraps
+from datetime import date, timedelta
 
 import os
+import threading
 import time
 
 from sqlite3 import IntegrityError
@@ -15,7 +18,7 @@ from peewee import *
 
 # --- PACKAGE LIBS ---
 
-from language import GrammaticalCategory, LanguageSyntaxError, is_sentence, UsageLabel
+from language import GrammaticalCategory, LanguageSyntaxError, is_sentence, normalize_lexeme, UsageLabel, COLLOCATES
 
 from seeds.collocates import seed_collocates
 from seeds.lexical_categories import seed_lexical_categories
@@ -28,6 +31,19 @@ from models.lexical_category import LexicalCategoryModel
 from models.lexical_entry import LexicalEntry
 from models.usage_label import UsageLabelModel
 from models.entry_label import EntryLabel
+from models.lexeme_stats import LexemeStats
+from models.vocabulary_state import VocabularyState
+from models.test_attempt import TestAttempt
+from models.daily_attempt_stats import DailyAttemptStats
+from models.schema_migration import SchemaMigration
+from models.imported_file import ImportedFile
+from models.pronunciation_clip import PronunciationClip
+from models.dynamic_model import DATABASE_ROUTER
+
+from refcache import ReferenceCache, LRUCache
+from concurrency import RetryPolicy, write_transaction
+from migrations import MigrationRunner
+from lookup_snapshot import LookupSnapshot
 
 
 
@@ -50,6 +66,23 @@ class LexicalEntryNotFound(Exception):
 
 
 
+def bound(method):
+    """
+        Decorator which runs the method with all models bound to the database of the related Vocabulary.
+        The decorated method must belong either to a Vocabulary or to an object with a vocabulary attribute.
+    """
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        vocabulary: Vocabulary = self if isinstance(self, Vocabulary) else self.vocabulary
+
+        with vocabulary.bind():
+            return method(self, *args, **kwargs)
+    
+    return wrapper
+
+
+
 class Vocabulary():
     """
         Vocabulary represents a public API available for users which provides all CRUD operations for an effective maintenance of a Personal Vocabulary.
@@ -58,11 +91,14 @@ class Vocabulary():
     """
 
     MAX_SENTENCE_CHAR_COUNT = 100
+    DELETE_BATCH_SIZE = 500 # keeps the number of bound IN (...) parameters below sqlite limit
+    ID_CACHE_SIZE = 4096 # recently used lexeme and definition IDs kept in memory, mainly during imports
     PUBLIC_DICTIONARY_API_URL = "https://api.dictionaryapi.dev/api/v2/entries/en/" # append a word here to get its data
+    DEF_BUSY_TIMEOUT = 5.0 # seconds a connection waits for the lock of another writer before failing
 
 
 
-    def __init__(self, db_file_path: str) -> None:
+    def __init__(self, db_file_path: str, busy_timeout: float = DEF_BUSY_TIMEOUT, retry_policy: RetryPolicy = None, migration_progress=None) -> None:
 
         """
             Initializes a new Vocabulary Instance dependent on the provided sqlite3 Connection Instance and with the provided name.
@@ -70,15 +106,26 @@ class Vocabulary():
             A new Vocabulary Instance automatically reserves a new Cursor Instance from the Connection Instance.
             Predefined Database Schema for CusVoc Application is also automatically imported if not present.
             Tables lexeme_types and collocates are automatically seeded if not present.
+
+            The database is opened in WAL mode, so readers don't block the writer and vice versa. Writers of other
+            threads or processes are waited for busy_timeout seconds, then taking the lock is retried as per retry_policy.
+
+            Pending migrations of an existing database are applied first, see migrations package. Progress of their backfills
+            is reported to the migration_progress callback.
         """
         
         # --- CONFIGURING DATABASE --- #
         self.name = os.path.basename(db_file_path)
 
         self.db_file_path = db_file_path
-        self.__database = SqliteDatabase(db_file_path)
+        self.__retry_policy = retry_policy or RetryPolicy()
+        self.__database = SqliteDatabase(db_file_path, timeout=busy_timeout, pragmas={'auto_vacuum': 'incremental', # takes effect only in new files, see backup.compact()
+                                                                                      'journal_mode': 'wal',
+                                                                                      'synchronous': 'normal', # durable enough in WAL mode, a commit doesn't wait for fsync
+                                                                                      'busy_timeout': int(busy_timeout * 1000)})
         
         # --- IMPORTING MODELS --- #
+        # models are shared by all vocabularies, each vocabulary binds them to its database per thread, see bind()
         Lexeme.connect_db(db=self.__database, table_name='lexemes')
         Collocate.connect_db(db=self.__database, table_name='collocates')        
         Definition.connect_db(db=self.__database, table_name='definitions')
@@ -86,17 +133,65 @@ class Vocabulary():
         LexicalEntry.connect_db(db=self.__database, table_name='lexical_entries')
         UsageLabelModel.connect_db(db=self.__database, table_name='usage_labels')
         EntryLabel.connect_db(db=self.__database, table_name='entry_labels')
+        LexemeStats.connect_db(db=self.__database, table_name='lexeme_stats')
+        VocabularyState.connect_db(db=self.__database, table_name='vocabulary_state')
+        TestAttempt.connect_db(db=self.__database, table_name='test_attempts')
+        DailyAttemptStats.connect_db(db=self.__database, table_name='daily_attempt_stats')
+        SchemaMigration.connect_db(db=self.__database, table_name='schema_migrations')
+        ImportedFile.connect_db(db=self.__database, table_name='imported_files')
+        PronunciationClip.connect_db(db=self.__database, table_name='pronunciation_clips')
+
+
+        with self.bind():
+            self.__database.connect()
+
+            # vocabularies created before lexeme_stats existed need the table filled from their entries
+            stats_missing: bool = not LexemeStats.table_exists()
 
+            # migrations bring older tables up to date before indexes of the current models are created on them,
+            # a new database gets the current schema right away
+            created: bool = not LexicalEntry.table_exists()
+            migration_runner = MigrationRunner(database=self.__database, retry_policy=self.__retry_policy, progress=migration_progress)
 
-        self.__database.connect()
-        self.__database.create_tables([Lexeme, Collocate, Definition, LexicalCategoryModel, LexicalEntry, UsageLabelModel, EntryLabel])
+            if not created:
+                migration_runner.migrate()
 
+            self.__database.create_tables([Lexeme, Collocate, Definition, LexicalCategoryModel, LexicalEntry, UsageLabelModel, EntryLabel, LexemeStats, VocabularyState,
+                                         TestAttempt, DailyAttemptStats, ImportedFile, PronunciationClip])
+            LexemeStats.create_triggers()
+            DailyAttemptStats.create_triggers()
+            VocabularyState.create_data_version_triggers(watched_columns={Lexeme._meta.table_name: [Lexeme.string.column_name],
+                                                                          Definition._meta.table_name: [Definition.definition.column_name],
+                                                                          LexicalEntry._meta.table_name: [LexicalEntry.lexeme.column_name,
+                                                                                                          LexicalEntry.definition.column_name,
+                                                                                                          LexicalEntry.lexical_category.column_name]})
+            VocabularyState.create_data_version_triggers(watched_columns={LexicalEntry._meta.table_name: [LexicalEntry.for_practice.column_name,
+                                                                                                          LexicalEntry.test_count.column_name,
+                                                                                                          LexicalEntry.match_sum.column_name,
+                                                                                                          LexicalEntry.tested_at.column_name]},
+                                                         key=VocabularyState.PRACTICE_VERSION_KEY)
 
-        # --- SEEDING DATA --- #
+            if created:
+                migration_runner.mark_applied()
 
-        seed_lexical_categories()
-        seed_collocates()
-        seed_usage_labels()
+            if stats_missing:
+                LexemeStats.rebuild()
+
+
+            # --- SEEDING DATA --- #
+
+            seed_lexical_categories()
+            seed_collocates()
+            seed_usage_labels()
+
+
+        # --- CACHES --- #
+
+        self.__references = ReferenceCache()
+        self.__lexeme_ids = LRUCache(max_size=self.ID_CACHE_SIZE)
+        self.__definition_ids = LRUCache(max_size=self.ID_CACHE_SIZE)
+        self.__lookup_snapshot: LookupSnapshot = None
+        self.__lookup_snapshot_lock = threading.Lock()
         
 
 
@@ -105,6 +200,7 @@ class Vocabulary():
         return f'Vocabulary::Name={self.name}, Lexemes={self.lexeme_count()}, Lexical Entries={self.lexical_entry_count()}'
 
 
+    @bound
     def __labels__(self, to_list: bool = False):
 
         entry_buffer: PrettyTable | List[UsageLabelModel] = PrettyTable(field_names=['No.', 'Label']) if not to_list else []
@@ -121,6 +217,7 @@ class Vocabulary():
 
 
 
+    @bound
     def create_lexical_entry(self, lexeme: str, definition: str, category: GrammaticalCategory, usage_labels:  UsageLabel | Iterable[UsageLabel] = None, collocate: str = None, sentence: str = None, for_practice: bool = False):
         """_summary_
 
@@ -137,91 +234,210 @@ class Vocabulary():
             ContraintViolationError: Provided argument exceeds the maximum limit of sentence characters. Check _MAX_SENTENCE_CHAR_COUNT_ variable.
             IntegrityError: 
         """
-        # try:
-        if not is_sentence(string=sentence):
-            raise LanguageSyntaxError(message="Argument 'sentence' is not a sentence!")
-        
-        
-        if sentence and len(sentence) > self.MAX_SENTENCE_CHAR_COUNT:
-            raise ContraintViolationError(message="Provided sentence exceeds maximum limit of characters.")
+        self.__validate_sentence(sentence=sentence)
 
+        if usage_labels is not None:
+            if isinstance(usage_labels, UsageLabel):
+                usage_labels = [usage_labels]
+            elif not isinstance(usage_labels, Iterable):
+                raise TypeError("Argument usage_labels must be an iterable!")
 
-        with self.__database.atomic() as transaction:
+        created_flags: List[bool] = []
+
+        with self.atomic() as transaction:
             try:
-                lexeme_model: Lexeme = Lexeme.get_or_none(Lexeme.string == lexeme)
-                found_lexeme_flag: bool = False
-
-                if lexeme_model is None:
-                    lexeme_model = Lexeme.create(string=lexeme, example_sentence=None, PAC_file_path=None)
-                    lexeme_model.save()
-                else:
-                    found_lexeme_flag = True
-
-                definition_model: Definition = Definition.get_or_none(Definition.definition == definition)
-
-                if definition_model is None:
-                    definition_model = Definition.create(definition=definition)
-                    definition_model.save()
-                elif found_lexeme_flag and LexicalEntry.get_or_none(LexicalEntry.lexeme.id == lexeme_model.get_id() and
-                                                                    LexicalEntry.definition == definition_model.get_id()) is not None:
+                lexeme_id, created = self.__lexeme_id(lexeme=lexeme)
+                created_flags.append(created)
+                found_lexeme_flag: bool = not created
+
+                definition_id, created = self.__definition_id(definition=definition)
+                created_flags.append(created)
+
+                if found_lexeme_flag and not created and LexicalEntry.select().where((LexicalEntry.lexeme == lexeme_id) &
+                                                                                     (LexicalEntry.definition == definition_id)).exists():
                         
                         raise IntegrityError("Instance with same lexeme and definition already in database!")
                     
+                collocate_id, created = self.__collocate_id(collocate=collocate)
+                created_flags.append(created)
 
-                
-                lexical_category_model: LexicalCategoryModel = LexicalCategoryModel.get(LexicalCategoryModel.category == category.name)
 
+                lexical_entry: LexicalEntry = LexicalEntry.create(lexeme=lexeme_id,
+                                                                  definition=definition_id,
+                                                                  lexical_category=self.__references.category_id(category.name),
+                                                                  collocate=collocate_id,
+                                                                  
+                                                                  sentence=sentence,
+                                                                  test_count=0,
+                                                                  was_tested=False,
+                                                                  match_sum=0,
+                                                                  for_practice=for_practice)
 
 
-                if collocate:
-                    collocate_model: Collocate = Collocate.get_or_none(Collocate.collocate == collocate)
+                if usage_labels is not None:
+                    label_rows = [{'entry': lexical_entry.get_id(), 'label': self.__references.label_id(label.name)} for label in usage_labels]
 
-                    if collocate_model is None:
-                        collocate_model = Collocate.create(collocate=collocate)
-                        collocate_model.save()
+                    if label_rows:
+                        EntryLabel.insert_many(label_rows).execute()
 
+            except Exception as e:
+                transaction.rollback()
 
-                lexical_entry: LexicalEntry = LexicalEntry.create(lexeme=lexeme_model.get_id(),
-                                                                    definition=definition_model.get_id(),
-                                                                    lexical_category=lexical_category_model.get_id(),
-                                                                    collocate=collocate_model.get_id() if collocate else None,
-                                                                    
-                                                                    sentence=sentence,
-                                                                    test_count=0,
-                                                                    was_tested=False,
-                                                                    match_sum=0,
-                                                                    for_practice=for_practice)
+                # IDs of rolled back rows must not stay cached
+                if any(created_flags):
+                    self.clear_caches()
+                raise e
+
+        return lexical_entry
 
-                lexical_entry.save()
 
+    @bound
+    def update_lexical_entry(self, ID: int, lexeme: str, definition: str, category: GrammaticalCategory, collocate: str = None, sentence: str = None, for_practice: bool = False):
+        """
+            Replaces lexeme, definition, category, collocate, sentence and for-practice flag of an existing Lexical Entry.
+            Test statistics and usage labels of the entry are kept.
 
+        Raises:
+            LexicalEntryNotFound: No Lexical Entry with provided ID exists.
+            IntegrityError: Another entry with same lexeme and definition already exists.
+        """
+        self.__validate_sentence(sentence=sentence)
 
-                if usage_labels is not None:
-                    if isinstance(usage_labels, UsageLabel):
-                        usage_labels = list(usage_labels)
-                    
-                    if isinstance(usage_labels, Iterable):
-                        for label in usage_labels:
-                            # usage_label = UsageLabelModel.get_by_id(label.value)
-                            EntryLabel.create(entry=lexical_entry, label=UsageLabelModel.get_by_id(label.value)).save()
-                        
+        created_flags: List[bool] = []
+
+        with self.atomic() as transaction:
+            try:
+                lexical_entry: LexicalEntry = LexicalEntry.get_or_none(LexicalEntry.id == ID)
+
+                if lexical_entry is None:
+                    raise LexicalEntryNotFound(f"Lexical Entry with ID '{ID}' not found.")
+
+                lexeme_id, created = self.__lexeme_id(lexeme=lexeme)
+                created_flags.append(created)
+
+                definition_id, created = self.__definition_id(definition=definition)
+                created_flags.append(created)
+
+                if LexicalEntry.select().where((LexicalEntry.lexeme == lexeme_id) & (LexicalEntry.definition == definition_id) & (LexicalEntry.id != ID)).exists():
+                    raise IntegrityError("Instance with same lexeme and definition already in database!")
+
+                collocate_id, created = self.__collocate_id(collocate=collocate)
+                created_flags.append(created)
+
+                lexical_entry.lexeme = lexeme_id
+                lexical_entry.definition = definition_id
+                lexical_entry.lexical_category = self.__references.category_id(category.name)
+                lexical_entry.collocate = collocate_id
+                lexical_entry.sentence = sentence
+                lexical_entry.for_practice = for_practice
+
+                lexical_entry.save()
 
-                    else:
-                        raise TypeError("Argument usage_labels must be an iterable!")
             except Exception as e:
                 transaction.rollback()
+
+                if any(created_flags):
+                    self.clear_caches()
                 raise e
 
-                
+        return lexical_entry
 
 
+    def __validate_sentence(self, sentence: str | None):
+        if sentence is not None and not is_sentence(string=sentence):
+            raise LanguageSyntaxError(message="Argument 'sentence' is not a sentence!")
+        
+        if sentence and len(sentence) > self.MAX_SENTENCE_CHAR_COUNT:
+            raise ContraintViolationError(message="Provided sentence exceeds maximum limit of characters.")
+
+
+    # The following methods return an ID of the row with provided value, creating the row if it doesn't exist yet,
+    # and a flag indicating whether it was created. Callers must clear caches if the creation is rolled back.
+
+    def __lexeme_id(self, lexeme: str):
+        # spellings differing only in case, spacing or a leading article share the lexeme created first
+        lookup_key: str = normalize_lexeme(lexeme)
+        lexeme_id: int = self.__lexeme_ids.get(lookup_key)
+
+        if lexeme_id is None:
+            lexeme_id = Lexeme.select(Lexeme.id).where(Lexeme.lookup_key == lookup_key).scalar()
+
+        created: bool = lexeme_id is None
+
+        if created:
+            lexeme_id = Lexeme.create(string=lexeme, example_sentence=None, PAC_file_path=None).get_id()
+
+        self.__lexeme_ids.put(lookup_key, lexeme_id)
+        return lexeme_id, created
+
+    def __definition_id(self, definition: str):
+        definition_id: int = self.__definition_ids.get(definition)
+
+        if definition_id is None:
+            definition_id = Definition.select(Definition.id).where(Definition.definition == definition).scalar()
+
+        created: bool = definition_id is None
+
+        if created:
+            definition_id = Definition.create(definition=definition).get_id()
+
+        self.__definition_ids.put(definition, definition_id)
+        return definition_id, created
+
+    def __collocate_id(self, collocate: str | None):
+        if not collocate:
+            return None, False
+
+        collocate_id: int = self.__references.collocate_id(collocate)
+        created: bool = collocate_id is None
+
+        if created:
+            collocate_id = Collocate.create(collocate=collocate).get_id()
+            self.__references.add_collocate(collocate, collocate_id)
+
+        return collocate_id, created
+
+                
         
     def database(self):
         return self.__database
 
+    def atomic(self):
+        """
+            Returns a context manager of a write transaction, which takes the write lock right away (BEGIN IMMEDIATE).
+            Nested calls create savepoints. See concurrency.write_transaction().
+        """
+
+        return write_transaction(database=self.__database, policy=self.__retry_policy)
+
+    def bind(self):
+        """
+            Returns a context manager which binds all models to the database of this vocabulary in the current thread.
+            Each thread uses its own connection to the database.
+        """
+
+        return DATABASE_ROUTER.bind(self.__database)
+
+    def close(self):
+        """
+            Closes the connection of the current thread, if open, and the lookup snapshot. Snapshots returned before
+            must not be used afterwards.
+        """
+
+        if not self.__database.is_closed():
+            self.__database.close()
+
+        with self.__lookup_snapshot_lock:
+            snapshot, self.__lookup_snapshot = self.__lookup_snapshot, None
+
+        if snapshot is not None:
+            snapshot.close()
+
+    @bound
     def lexeme_count(self):
         return Lexeme.select().count()
 
+    @bound
     def lexical_entry_count(self):
         """
             Returns a total count of Lexical Entries present in the current database.
@@ -229,6 +445,112 @@ class Vocabulary():
 
         return LexicalEntry.select().count()
 
+    def clear_caches(self):
+        """
+            Drops all cached IDs. Must be called whenever lexemes, definitions or reference tables are modified
+            outside of this Vocabulary instance.
+        """
+
+        self.__references.invalidate()
+        self.__lexeme_ids.clear()
+        self.__definition_ids.clear()
+
+    @bound
+    def data_version(self):
+        """
+            Returns number of changes of lexemes, definitions and Lexical Entries made so far (test results don't count).
+        """
+
+        return int(VocabularyState.get_value(key=VocabularyState.DATA_VERSION_KEY, default=0))
+
+    @bound
+    def practice_version(self):
+        """
+            Returns number of changes of for-practice flags and test results of Lexical Entries made so far.
+        """
+
+        return int(VocabularyState.get_value(key=VocabularyState.PRACTICE_VERSION_KEY, default=0))
+
+    @bound
+    def build_lookup_snapshot(self):
+        """
+            Writes the memory-mapped lookup snapshot of this vocabulary next to its database file, see lookup_snapshot module.
+        """
+
+        # a plain (deferred) transaction only reads, yet the data and their version come from the same database state
+        with self.__database.atomic():
+            return LookupSnapshot.build(db_file_path=self.db_file_path, data_version=self.data_version())
+
+    def lookup_snapshot(self):
+        """
+            Returns the lookup snapshot of this vocabulary if it was built and is up to date, otherwise None.
+        """
+
+        data_version = self.data_version()
+
+        with self.__lookup_snapshot_lock:
+            snapshot = self.__lookup_snapshot
+
+            if snapshot is None or snapshot.data_version != data_version:
+                # a stale snapshot isn't closed, other threads may still read it, its mapping is released once it isn't referenced
+                # the file may have been rebuilt meanwhile, e.g. by another process
+                snapshot = LookupSnapshot.open(db_file_path=self.db_file_path)
+
+                if snapshot is not None and snapshot.data_version != data_version:
+                    snapshot.close()
+                    snapshot = None
+
+                self.__lookup_snapshot = snapshot
+
+        return snapshot
+
+    @bound
+    def rebuild_lexeme_stats(self):
+        """
+            Recomputes the lexeme_stats table, which is otherwise maintained by triggers.
+        """
+
+        with self.atomic():
+            LexemeStats.rebuild()
+
+    @bound
+    def rebuild_attempt_stats(self):
+        """
+            Recomputes the daily_attempt_stats table, which is otherwise maintained by a trigger.
+        """
+
+        with self.atomic():
+            DailyAttemptStats.rebuild()
+
+    @bound
+    def learning_curve(self, entry_id: int = None, to_list: bool = False):
+        """
+            Returns number of test attempts and their average score per day, either of the whole vocabulary or of a single Lexical Entry.
+            Rows are read from daily rollups, so the answer history itself is never scanned.
+        """
+
+        query = (DailyAttemptStats
+                 .select(DailyAttemptStats.day,
+                         fn.SUM(DailyAttemptStats.attempt_count).alias('attempt_count'),
+                         fn.SUM(DailyAttemptStats.score_sum).alias('score_sum'))
+                 .group_by(DailyAttemptStats.day)
+                 .order_by(DailyAttemptStats.day))
+
+        if entry_id is not None:
+            query = query.where(DailyAttemptStats.entry == entry_id)
+
+        curve = [(date(1970, 1, 1) + timedelta(days=day), attempt_count, score_sum / attempt_count) for day, attempt_count, score_sum in query.tuples()]
+
+        if to_list:
+            return curve
+
+        table = PrettyTable(field_names=['Day', 'Attempts', 'Average Match Rate'])
+
+        for day, attempt_count, average in curve:
+            table.add_row([day.isoformat(), attempt_count, f"{round(average * 100, 2)}%"])
+
+        return f"\n{table}\n"
+
 
     
 
@@ -271,19 +593,14 @@ class Vocabulary():
         field: Literal['string', 'PAC_saved', 'entry_count']
 
 
+    @bound
     def __lexeme__(self, filter: LexemeFilter = None):
         """
         This method pretty-prints a word and its attributes to the console.
         """
 
         table = PrettyTable(field_names=['No.', 'ID', 'Lexeme', 'Entry Count', 'PAC_saved'])
-        query = (Lexeme.select(Lexeme, fn.COUNT(LexicalEntry.id).alias('entry_count'))
-                    .join(LexicalEntry, JOIN.LEFT_OUTER)
-                    .group_by(Lexeme))
-        
-        if filter is not None:
-            if filter.field != 'entry_count':
-                query = query.where(self.compare(val_1=getattr(Lexeme, filter.field), operator=filter.operator, val_2=self.parse_value(filter.value)))
+        query = self.__lexeme_query(Lexeme.id, Lexeme.string, Lexeme.PAC_file_path, LexemeStats.entry_count, filter=filter).objects()
         
         lexemes = query.execute()
 
@@ -296,30 +613,47 @@ class Vocabulary():
      
 
 
-    def __lexemes__(self):
+    def __lexeme_query(self, *fields, filter: LexemeFilter = None):
+        query = Lexeme.select(*fields).join(LexemeStats, JOIN.LEFT_OUTER, on=(LexemeStats.lexeme == Lexeme.id))
+
+        if filter is not None:
+            value = self.parse_value(filter.value)
+
+            if filter.field == 'string' and filter.operator == '==' and isinstance(value, str):
+                # equality of strings uses the indexed lookup key, so 'Apple' finds 'apple'
+                query = query.where(Lexeme.lookup_key == normalize_lexeme(value))
+            else:
+                field = LexemeStats.entry_count if filter.field == 'entry_count' else getattr(Lexeme, filter.field)
+                query = query.where(self.compare(val_1=field, operator=filter.operator, val_2=value))
+
+        return query
+     
 
-        lexemes: List[Lexeme] = Lexeme.select()
+
+    @bound
+    def __lexemes__(self):
 
         table = PrettyTable()
         table.field_names = ['No.', 'Lexeme', 'Lexical Entries', 'Total Tests', 'Total Match Sum', 'Average Match Rate']
 
+        # statistics are maintained by triggers, so no aggregation is needed here
         query = (
             Lexeme
             .select(
-                Lexeme, 
-                fn.COUNT(LexicalEntry.id).alias('le_count'), 
-                fn.SUM(LexicalEntry.test_count).alias('total_test_count'),
-                fn.SUM(LexicalEntry.match_sum).alias('match_sum'),
+                Lexeme.string,
+                LexemeStats.entry_count.alias('le_count'),
+                LexemeStats.total_test_count,
+                LexemeStats.match_sum,
                 Case(
-                    None,  # No specific field, we're working with aggregates
+                    None,
                     (
-                        (fn.SUM(LexicalEntry.test_count) == 0, '---'),  # If test_count is 0, return '---'
+                        (LexemeStats.total_test_count == 0, '---'),  # If test_count is 0, return '---'
                     ),
-                    (fn.SUM(LexicalEntry.match_sum) / fn.SUM(LexicalEntry.test_count))  # Else calculate average
+                    (LexemeStats.match_sum / LexemeStats.total_test_count)  # Else calculate average
                 ).alias('average_match_rate')
             )
-            .join(LexicalEntry, JOIN.LEFT_OUTER)
-            .group_by(Lexeme)
+            .join(LexemeStats, on=(LexemeStats.lexeme == Lexeme.id))
+            .objects()
         )
 
         for index, lexeme_metadata in enumerate(query):
@@ -411,22 +745,20 @@ class Vocabulary():
         
 
 
-    def __lexical_entry__(self, filter: EntryFilter = None, to_list: bool = False):
-        # start = time.time()
-        
-        
+    def __lexical_entry_query(self, *fields, filter: EntryFilter = None):
+        query = (LexicalEntry.select(*fields)
+                    .join(Lexeme).switch(LexicalEntry)
+                    .join(Definition).switch(LexicalEntry)
+                    .join(LexicalCategoryModel).switch(LexicalEntry)
+                    .join(Collocate, JOIN.LEFT_OUTER))
 
-        if to_list:
-            entry_list: List[LexicalEntry] = []
-        else:
-            # print(Vocabulary.EntryFilter.FIELDS)
-            table = PrettyTable(field_names=['No.'] + Vocabulary.EntryFilter.FIELDS)
-        
+        lexeme = self.parse_value(filter.value) if filter is not None and filter.field == 'lexeme' and isinstance(filter.value, str) else None
 
-        # Construct the query
-        query = LexicalEntry.select().join(Lexeme).switch(LexicalEntry).join(Definition).switch(LexicalEntry).join(LexicalCategoryModel)
+        if isinstance(lexeme, str) and filter.operator == '==':
+            # equality of lexemes uses the indexed lookup key, so 'Apple' finds 'apple'
+            query = query.where(Lexeme.lookup_key == normalize_lexeme(lexeme))
 
-        if filter is not None:
+        elif filter is not None:
             if filter.field == 'lexeme':
                 related_field = Lexeme.string
             elif filter.field == 'definition':
@@ -441,6 +773,26 @@ class Vocabulary():
             # Apply the filter using the compare function
             query = query.where(self.compare(val_1=related_field, val_2=filter.value, operator=filter.operator))
 
+        return query
+
+
+    @bound
+    def __lexical_entry__(self, filter: EntryFilter = None, to_list: bool = False):
+        # start = time.time()
+        
+        
+
+        if to_list:
+            entry_list: List[LexicalEntry] = []
+        else:
+            # print(Vocabulary.EntryFilter.FIELDS)
+            table = PrettyTable(field_names=['No.'] + Vocabulary.EntryFilter.FIELDS)
+        
+
+        # Construct the query
+        # related models are selected as well, so reading them from entries doesn't query the database again
+        query = self.__lexical_entry_query(LexicalEntry, Lexeme, Definition, LexicalCategoryModel, Collocate, filter=filter)
+
         # Execute the query and iterate over the results
         entries = query.execute()
 
@@ -463,25 +815,154 @@ class Vocabulary():
 
 
 
+    @bound
     def delete_lexeme(self, string: str):
-        self.__cursor.execute('DELETE FROM lexemes WHERE string == (?)', (string, ))
 
         # user cannot remove multiple words
-        assert(self.__cursor.rowcount <= 1)
-
-        print("Lexeme removed successfully!\n") if self.__cursor.rowcount == 1 else print("Lexeme not found!\n")
+        deleted_count = self.delete_lexemes(filter=Vocabulary.LexemeFilter(field='string', operator='==', value=f'"{string}"'))
 
-
-        self.__conn.commit()
+        print("Lexeme removed successfully!\n") if deleted_count == 1 else print("Lexeme not found!\n")
 
     
+    @bound
     def delete_definition(self, ID: int):
-        self.__cursor.execute('DELETE FROM definitions WHERE id = ?', (ID, ))
 
-        # user cannot remove multiple definitions
-        assert(self.__cursor.rowcount <= 1)
+        with self.atomic():
+            self.delete_lexical_entries(ids=[entry.id for entry in LexicalEntry.select(LexicalEntry.id).where(LexicalEntry.definition == ID)])
+            deleted_count = Definition.delete().where(Definition.id == ID).execute()
+
+        self.clear_caches()
+
+        print("Definition removed successfully!\n") if deleted_count == 1 else print("Definition not found!\n")
+
+
+
+    @bound
+    def delete_lexemes(self, ids: Iterable[int] = None, filter: LexemeFilter = None):
+        """
+            Removes all lexemes matching either the provided IDs or the filter, together with their Lexical Entries,
+            in a single transaction. Pronunciation Clips of removed lexemes are deleted from disk after commit.
+
+            Returns the number of removed lexemes.
+        """
+
+        if ids is None and filter is None:
+            raise ValueError("Either ids or filter must be provided!")
+
+        lexeme_ids = list(ids) if ids is not None else [lexeme.id for lexeme in self.__lexeme_query(Lexeme.id, filter=filter)]
+
+        if not lexeme_ids:
+            return 0
+
+        PAC_file_paths: List[str] = []
+        deleted_count = 0
+
+        with self.atomic():
+            for batch in chunked(lexeme_ids, self.DELETE_BATCH_SIZE):
+                batch_PAC_file_paths = [lexeme.PAC_file_path for lexeme in Lexeme.select(Lexeme.PAC_file_path)
+                                                                                 .where(Lexeme.id.in_(batch) & Lexeme.PAC_file_path.is_null(False))]
+                PAC_file_paths.extend(batch_PAC_file_paths)
 
-        print("Definition removed successfully!\n") if self.__cursor.rowcount == 1 else print("Definition not found!\n")
+                entry_ids = LexicalEntry.select(LexicalEntry.id).where(LexicalEntry.lexeme.in_(batch))
+                definition_ids = [entry.definition_id for entry in LexicalEntry.select(LexicalEntry.definition).where(LexicalEntry.lexeme.in_(batch))]
+                
+                EntryLabel.delete().where(EntryLabel.entry.in_(entry_ids)).execute()
+                TestAttempt.delete().where(TestAttempt.entry.in_(entry_ids)).execute()
+                DailyAttemptStats.delete().where(DailyAttemptStats.entry.in_(entry_ids)).execute()
+                LexicalEntry.delete().where(LexicalEntry.lexeme.in_(batch)).execute()
+                deleted_count += Lexeme.delete().where(Lexeme.id.in_(batch)).execute()
+
+                # clips stored in the database are removed along with their lexemes
+                clip_ids = [clip_id for clip_id in map(PronunciationClip.id_of, batch_PAC_file_paths) if clip_id is not None]
+
+                if clip_ids:
+                    PronunciationClip.delete().where(PronunciationClip.id.in_(clip_ids)).execute()
+
+                self.__delete_unused_definitions(ids=definition_ids)
 
-        self.__conn.commit()
+        self.clear_caches()
+
+        for path in PAC_file_paths:
+            if PronunciationClip.id_of(path) is None and os.path.exists(path):
+                os.remove(path)
+
+        return deleted_count
     
+
+    @bound
+    def delete_lexical_entries(self, ids: Iterable[int] = None, filter: EntryFilter = None):
+        """
+            Removes all Lexical Entries matching either the provided IDs or the filter in a single transaction.
+            Usage labels of removed entries and definitions no longer used by any entry are removed as well.
+
+            Returns the number of removed entries.
+        """
+
+        if ids is None and filter is None:
+            raise ValueError("Either ids or filter must be provided!")
+
+        entry_ids = list(ids) if ids is not None else [entry.id for entry in self.__lexical_entry_query(LexicalEntry.id, filter=filter)]
+        deleted_count = 0
+
+        with self.atomic():
+            for batch in chunked(entry_ids, self.DELETE_BATCH_SIZE):
+                definition_ids = [entry.definition_id for entry in LexicalEntry.select(LexicalEntry.definition).where(LexicalEntry.id.in_(batch))]
+
+                EntryLabel.delete().where(EntryLabel.entry.in_(batch)).execute()
+                TestAttempt.delete().where(TestAttempt.entry.in_(batch)).execute()
+                DailyAttemptStats.delete().where(DailyAttemptStats.entry.in_(batch)).execute()
+                deleted_count += LexicalEntry.delete().where(LexicalEntry.id.in_(batch)).execute()
+
+                self.__delete_unused_definitions(ids=definition_ids)
+
+        self.clear_caches()
+
+        return deleted_count
+
+
+    def __delete_unused_definitions(self, ids: List[int]):
+        if ids:
+            Definition.delete().where(Definition.id.in_(ids) &
+                                      ~fn.EXISTS(LexicalEntry.select(LexicalEntry.id).where(LexicalEntry.definition == Definition.id))).execute()
+
+
+    @bound
+    def collect_garbage(self, batch_size: int = None):
+        """
+            Sweeps definitions and collocates not used by any Lexical Entry, usage labels and test attempts of nonexistent entries
+            and Pronunciation Clips stored in the database which no lexeme refers to.
+            Rows are deleted in batches, each batch in its own transaction, so the database is never locked for long.
+            Seeded collocates are always kept.
+
+            Returns the number of removed rows per table.
+        """
+
+        batch_size = batch_size or self.DELETE_BATCH_SIZE
+
+        orphans = {
+            Definition: ~fn.EXISTS(LexicalEntry.select(LexicalEntry.id).where(LexicalEntry.definition == Definition.id)),
+            Collocate: ~fn.EXISTS(LexicalEntry.select(LexicalEntry.id).where(LexicalEntry.collocate == Collocate.id)) & Collocate.collocate.not_in(COLLOCATES),
+            EntryLabel: ~fn.EXISTS(LexicalEntry.select(LexicalEntry.id).where(LexicalEntry.id == EntryLabel.entry)),
+            TestAttempt: ~fn.EXISTS(LexicalEntry.select(LexicalEntry.id).where(LexicalEntry.id == TestAttempt.entry)),
+            DailyAttemptStats: ~fn.EXISTS(LexicalEntry.select(LexicalEntry.id).where(LexicalEntry.id == DailyAttemptStats.entry)),
+            PronunciationClip: ~fn.EXISTS(Lexeme.select(Lexeme.id).where(Lexeme.PAC_file_path == PronunciationClip.marker_expression())),
+        }
+
+        deleted_counts = {}
+
+        for model, condition in orphans.items():
+            deleted_counts[model._meta.table_name] = 0
+
+            while True:
+                with self.atomic():
+                    batch = model.select(model.id).where(condition).limit(batch_size)
+                    deleted_count = model.delete().where(model.id.in_(batch)).execute()
+
+                deleted_counts[model._meta.table_name] += deleted_count
+
+                if deleted_count < batch_size:
+                    break
+
+        self.clear_caches()
+
+        return deleted_counts
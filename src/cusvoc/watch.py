@@ -0,0 +1,321 @@
+"""
+    This module provides continuous ingestion of Entry Files dropped or appended into a watched directory.
+
+    Changes of the directory are reported by inotify (Linux, through ctypes), other systems fall back to polling
+    sizes and modification times. For each file the byte offset of the last ingested line is stored in the vocabulary
+    (see models.imported_file) in the same transaction as the entries of the line, so only rows appended since
+    are parsed and a row is never ingested twice. A trailing line without a line break is left for the next change,
+    it is probably still being written. A file whose ingested part changed (its fingerprint doesn't match) is ingested again.
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+__all__ = ['DEF_POLL_INTERVAL', 'WATCHED_EXTENSIONS', 'InotifyWatcher', 'PollingWatcher', 'directory_watcher', 'ImportWatcher']
+
+# --- SYSTEM LIBS ---
+
+from datetime import datetime
+from typing import BinaryIO, Callable, Dict, Iterable, Set, Tuple
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import select
+import struct
+import threading
+import time
+
+# --- PACKAGE LIBS ---
+
+from vocabulary import Vocabulary
+from models.imported_file import ImportedFile
+from importers.pipeline import RejectFile, ImportSummary, write_batches
+from importers.tsv import DEF_RANGE_SIZE, split_byte_ranges, parse_byte_range
+
+
+DEF_POLL_INTERVAL = 1.0 # seconds between scans of the polling watcher, and between checks of the stop event
+DEF_SETTLE_DELAY = 0.1 # events arriving within this delay are coalesced
+WATCHED_EXTENSIONS = ('.tsv', '.csv', '.txt')
+FINGERPRINT_SIZE = 4096 # bytes at both ends of the ingested part which are hashed
+
+# inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct('iIII') # watch descriptor, mask, cookie, length of the name
+
+
+
+class InotifyWatcher():
+    """
+        Reports names of files created, written or moved into the directory, using inotify API of Linux kernel.
+    """
+
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, directory: str) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+        self.__fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+
+        if self.__fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+        if libc.inotify_add_watch(self.__fd, os.fsencode(directory), self.MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.__fd)
+            raise OSError(errno, os.strerror(errno), directory)
+
+    def wait(self, timeout: float) -> Set[str] | None:
+        """
+            Returns names of changed files, an empty set if nothing changed within the timeout,
+            or None if some events were lost and the whole directory has to be scanned.
+        """
+
+        names: Set[str] = set()
+        overflow = False
+
+        while select.select([self.__fd], [], [], timeout)[0]:
+            data = os.read(self.__fd, 1 << 16)
+            position = 0
+
+            while position < len(data):
+                _, mask, _, length = INOTIFY_EVENT.unpack_from(data, position)
+                position += INOTIFY_EVENT.size
+                name = data[position:position + length].rstrip(b'\0')
+                position += length
+
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                elif name:
+                    names.add(os.fsdecode(name))
+
+            # a single write is reported by several events, the following ones are collected as well
+            timeout = DEF_SETTLE_DELAY
+
+        return None if overflow else names
+
+    def close(self):
+        os.close(self.__fd)
+
+
+
+class PollingWatcher():
+    """
+        Reports names of files whose size or modification time changed, by scanning the directory periodically.
+    """
+
+    def __init__(self, directory: str, poll_interval: float = DEF_POLL_INTERVAL) -> None:
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.__stats = self.__scan()
+
+    def wait(self, timeout: float) -> Set[str]:
+        time.sleep(min(timeout, self.poll_interval))
+
+        stats = self.__scan()
+        names = {name for name, stat in stats.items() if self.__stats.get(name) != stat}
+        self.__stats = stats
+
+        return names
+
+    def close(self):
+        pass
+
+    def __scan(self) -> Dict[str, Tuple[int, int, int]]:
+        stats: Dict[str, Tuple[int, int, int]] = {}
+
+        for entry in os.scandir(self.directory):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+
+            stats[entry.name] = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+        return stats
+
+
+
+def directory_watcher(directory: str, poll_interval: float = DEF_POLL_INTERVAL):
+    """
+        Returns an inotify watcher of the directory, or a polling one where inotify isn't available.
+    """
+
+    try:
+        return InotifyWatcher(directory=directory)
+    except (OSError, AttributeError, TypeError):
+        # AttributeError: libc without inotify, TypeError: no libc found (e.g. Windows)
+        return PollingWatcher(directory=directory, poll_interval=poll_interval)
+
+
+
+class ImportWatcher():
+    """
+        Ingests new rows of Entry Files in the directory into the vocabulary, see watch module.
+        Rejected rows of a file are appended to the file with the reject_suffix appended to its name, such files aren't watched.
+    """
+
+    def __init__(self, vocabulary: Vocabulary, directory: str, delimiter: str, reject_suffix: str, audio_manager = None,
+                 poll_interval: float = DEF_POLL_INTERVAL, range_size: int = DEF_RANGE_SIZE) -> None:
+        self.vocabulary = vocabulary
+        self.directory = os.path.abspath(directory)
+        self.delimiter = delimiter
+        self.reject_suffix = reject_suffix
+        self.audio_manager = audio_manager
+        self.poll_interval = poll_interval
+        self.range_size = range_size
+
+
+    def watches(self, name: str):
+        return name.lower().endswith(WATCHED_EXTENSIONS) and not name.endswith(self.reject_suffix) and not name.startswith('.')
+
+
+    def ingest(self, f_path: str) -> ImportSummary | None:
+        """
+            Ingests complete rows of the file which weren't ingested yet. Returns None if there were none.
+        """
+
+        f_path = os.path.abspath(f_path)
+        source = os.path.basename(f_path)
+
+        with self.vocabulary.bind():
+            state: ImportedFile = ImportedFile.get_or_none(ImportedFile.path == f_path)
+
+        try:
+            src_file = open(f_path, 'rb')
+        except FileNotFoundError:
+            return None
+
+        with src_file:
+            size = os.fstat(src_file.fileno()).st_size
+
+            if state is not None and state.offset <= size and _fingerprint(src_file, state.offset) == state.fingerprint:
+                offset, line = state.offset, state.line
+            else:
+                # a new file, or the ingested part was replaced, starts with the header line
+                src_file.seek(0)
+                header = src_file.readline()
+
+                if not header.endswith(b'\n'):
+                    return None
+
+                offset, line = len(header), 1
+
+            end = _complete_end(src_file, offset, size)
+
+            if end <= offset:
+                return None
+
+            progress = [offset, line]
+
+            def save_progress():
+                # runs within the transaction of the batch, see write_batches()
+                ImportedFile.insert(path=f_path, offset=progress[0], line=progress[1], fingerprint=_fingerprint(src_file, progress[0]),
+                                    ingested_at=datetime.now()).on_conflict_replace().execute()
+
+            with RejectFile(f_path=f_path + self.reject_suffix, append=True) as reject_file:
+                parse_rejections = 0
+
+                def batches():
+                    nonlocal parse_rejections
+
+                    for start, range_end in split_byte_ranges(f_path=f_path, range_size=self.range_size, start=offset, end=end):
+                        rows, rejections, line_count = parse_byte_range(f_path, start, range_end, self.delimiter, self.vocabulary.MAX_SENTENCE_CHAR_COUNT)
+                        first_line = progress[1] + 1
+
+                        for rejected_line, reason, row in rejections:
+                            reject_file.reject(source=source, line=rejected_line + first_line, reason=reason, row=row)
+
+                        parse_rejections += len(rejections)
+                        progress[0], progress[1] = range_end, progress[1] + line_count
+
+                        yield [row._replace(line=row.line + first_line) for row in rows]
+
+                summary = write_batches(vocabulary=self.vocabulary, batches=batches(), reject_file=reject_file, source=source,
+                                        audio_manager=self.audio_manager, on_batch=save_progress, delimiter=self.delimiter)
+
+        summary.rejected += parse_rejections
+
+        return summary
+
+
+    def run(self, on_ingest: Callable[[str, ImportSummary], None] = None, stop: threading.Event = None,
+            on_error: Callable[[str, Exception], None] = None):
+        """
+            Ingests files already in the directory, then keeps ingesting changed files until the stop event is set
+            (or forever). Each ingested file is reported to the on_ingest callback.
+
+            A file which fails to be ingested (e.g. the database stays locked by another writer) is reported to the on_error
+            callback and retried after the next wait, its stored offset makes the retry safe.
+        """
+
+        watcher = directory_watcher(directory=self.directory, poll_interval=self.poll_interval)
+
+        try:
+            names: Iterable[str] | None = None
+            failed_names: Set[str] = set()
+
+            while stop is None or not stop.is_set():
+                if names is None:
+                    names = [entry.name for entry in os.scandir(self.directory) if entry.is_file()]
+
+                for name in sorted(set(names) | failed_names):
+                    if not self.watches(name):
+                        continue
+
+                    try:
+                        summary = self.ingest(os.path.join(self.directory, name))
+                    except Exception as e:
+                        failed_names.add(name)
+
+                        if on_error is not None:
+                            on_error(name, e)
+
+                        continue
+
+                    failed_names.discard(name)
+
+                    if summary is not None and on_ingest is not None:
+                        on_ingest(name, summary)
+
+                names = watcher.wait(timeout=self.poll_interval)
+        finally:
+            watcher.close()
+
+
+
+def _complete_end(src_file: BinaryIO, start: int, size: int, block_size: int = 1 << 16):
+    """
+        Returns the position after the last line break between start and size, or start if there is none.
+    """
+
+    end = size
+
+    while end > start:
+        block_start = max(start, end - block_size)
+        src_file.seek(block_start)
+        position = src_file.read(end - block_start).rfind(b'\n')
+
+        if position >= 0:
+            return block_start + position + 1
+
+        end = block_start
+
+    return start
+
+
+def _fingerprint(src_file: BinaryIO, offset: int):
+    # both ends of the ingested part, the header and the last ingested rows, must stay the same
+    src_file.seek(0)
+    head = src_file.read(min(offset, FINGERPRINT_SIZE))
+    src_file.seek(max(0, offset - FINGERPRINT_SIZE))
+    tail = src_file.read(offset - max(0, offset - FINGERPRINT_SIZE))
+
+    return hashlib.sha256(head + tail).hexdigest()
@@ -0,0 +1,131 @@
+"""
+    This module provides weighted random sampling of keys (e.g. IDs of Lexical Entries) without replacement.
+
+    Weights are kept in a Fenwick tree (binary indexed tree) over an array of keys, so a single key is drawn by a descent
+    from the root in O(log n) steps and the weight of a key is changed in O(log n) as well. Drawing a few questions
+    out of a million candidates takes microseconds and results of a test are applied without rebuilding the tree.
+    Keys without a weight (or with zero weight) are never drawn.
+
+    Author: fimo_IT
+    Version: 0.2.0
+"""
+
+__all__ = ['WeightedSampler']
+
+# --- SYSTEM LIBS ---
+
+from typing import Dict, Hashable, Iterable, List, Tuple
+import random
+import time
+
+
+
+class WeightedSampler():
+    """
+        Draws keys with probability proportional to their weights. The keys are fixed when built, only their weights change.
+    """
+
+    def __init__(self, weights: Iterable[Tuple[Hashable, float]] = (), version: int = None) -> None:
+        self.version = version
+        self.built_at = time.monotonic()
+
+        pairs = list(weights)
+
+        self.__keys: List[Hashable] = [key for key, _ in pairs]
+        self.__positions: Dict[Hashable, int] = {key: position for position, key in enumerate(self.__keys)}
+        self.__weights: List[float] = [weight if weight > 0 else 0.0 for _, weight in pairs]
+
+        # tree[i] holds the sum of weights of positions (i - lowbit(i), i], built in linear time
+        self.__tree = [0.0, *self.__weights]
+
+        for i in range(1, len(self.__tree)):
+            parent = i + (i & -i)
+
+            if parent < len(self.__tree):
+                self.__tree[parent] += self.__tree[i]
+
+    def __len__(self):
+        return len(self.__positions)
+
+    def set_weights(self, weights: Iterable[Tuple[Hashable, float]]):
+        for key, weight in weights:
+            position = self.__positions[key]
+            self.__add(position=position, delta=(weight if weight > 0 else 0.0) - self.__weights[position])
+
+    def sample(self, count: int, exclude: Iterable[Hashable] = ()) -> List[Hashable]:
+        """
+            Returns up to count distinct keys, fewer only if there aren't enough keys with a weight left.
+        """
+
+        # drawn and excluded keys get zero weight for the rest of the draw, their weights are restored afterwards
+        removed: List[Tuple[int, float]] = []
+        drawn: List[Hashable] = []
+        miss_count = 0
+
+        for key in exclude:
+            position = self.__positions.get(key)
+
+            if position is not None and self.__weights[position] > 0:
+                removed.append((position, self.__weights[position]))
+                self.__add(position=position, delta=-self.__weights[position])
+
+        try:
+            while len(drawn) < count:
+                total = self.__prefix_sum(len(self.__weights))
+
+                if total <= 0:
+                    break
+
+                position = self.__find(random.random() * total)
+
+                if position is None:
+                    # rounding errors of the sums, unless they are all that's left
+                    miss_count += 1
+
+                    if miss_count > 8:
+                        break
+
+                    continue
+
+                removed.append((position, self.__weights[position]))
+                self.__add(position=position, delta=-self.__weights[position])
+                drawn.append(self.__keys[position])
+        finally:
+            for position, weight in removed:
+                self.__add(position=position, delta=weight)
+
+        return drawn
+
+    def __add(self, position: int, delta: float):
+        self.__weights[position] += delta
+        i = position + 1
+
+        while i < len(self.__tree):
+            self.__tree[i] += delta
+            i += i & -i
+
+    def __prefix_sum(self, length: int):
+        total = 0.0
+
+        while length > 0:
+            total += self.__tree[length]
+            length -= length & -length
+
+        return total
+
+    def __find(self, target: float):
+        # descends to the first position whose prefix sum exceeds the target
+        i = 0
+        step = 1 << (len(self.__tree) - 1).bit_length()
+
+        while step:
+            if i + step < len(self.__tree) and self.__tree[i + step] <= target:
+                i += step
+                target -= self.__tree[i]
+
+            step >>= 1
+
+        if i >= len(self.__weights) or self.__weights[i] <= 0:
+            return None
+
+        return i